@@ -28,7 +28,7 @@ _requirements = [
     'dropbox',
     'click', 
     'python-dotenv',
-    'flask-caching', 
+    'pyarrow',
     'nbdime', 
     'jupyter_contrib_nbextensions', 
     'ipywidgets'
@@ -0,0 +1,374 @@
+""" Benchmarks for the build machinery itself: the parsers, the compression codecs, file 
+discovery, an end to end update_entrypoint, the fetch_data cache and how long the package 
+and its commands take to import. Synthetic data is generated into a scratch folder
+with a fixed seed and the results are written as json so runs on different commits can be
+compared with --compare. Run them from the project folder with python -m tests.benchmarks.
+"""
+from {{cookiecutter.package_name}}._build import pathutils
+from {{cookiecutter.package_name}}._build import compress
+from {{cookiecutter.package_name}}._build.config import CACHE_DIR
+from {{cookiecutter.package_name}}._build.parsers import JsonParser, PandasCSVParser, ParquetParser, FeatherParser, PickleParser
+from {{cookiecutter.package_name}}._build.data import _DataManager, _fetch, _fetch_cache
+
+import click
+import collections
+import contextlib
+import datetime
+import gc
+import io
+import json
+import os
+import pathlib
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = CACHE_DIR / 'benchmarks'
+BENCHMARKS = ('parsers', 'compression', 'subpaths', 'entrypoint', 'fetch', 'imports')
+SHAPES = ('narrow', 'wide')
+MAX_JSON_BYTES = 256 * 1024 ** 2  # json records of bigger tables take minutes and gigabytes to parse
+PACKAGE = pathutils.__name__.split('.')[0]
+IMPORT_MODULES = (f'{PACKAGE}.registry', f'{PACKAGE}._build.data', f'{PACKAGE}._build.dropbox_api', f'{PACKAGE}._build.reports')
+HEAVY_MODULES = ('pandas', 'numpy', 'sklearn', 'joblib', 'pyarrow', 'dropbox', 'requests', 'flask_caching')
+COMPRESSION_LEVELS = {'gz': (1, 6), 'lz4': (0, 9), 'zst': (1, 3, 9)}  # level 19 takes minutes on 100MB
+
+_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def parse_size(size):
+    """ parse a size like 10MB or 5GB into bytes.
+    """
+    size = size.strip().upper()
+    for unit, n in _UNITS.items():
+        if size.endswith(unit):
+            return int(float(size[:-len(unit)]) * n)
+    return int(size)
+
+
+def _frame(rows, shape, seed=0):
+    rng = np.random.default_rng(seed)
+    if shape == 'narrow':
+        return pd.DataFrame({
+            'id': np.arange(rows, dtype='int64'),
+            'value': rng.normal(size=rows).round(6),
+            'category': rng.choice([f'category_{i}' for i in range(16)], size=rows),
+            'ts': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 10 ** 8, size=rows), unit='s')
+        })
+    elif shape == 'wide':
+        return pd.DataFrame(rng.normal(size=(rows, 100)).round(6), columns=[f'c{i}' for i in range(100)])
+    raise ValueError(f'Unknown shape: {shape}. Use any of {SHAPES}')
+
+
+def synthetic_frame(nbytes, shape='narrow', seed=0):
+    """ Return a DataFrame that takes roughly nbytes as csv. The same arguments always give
+    the same data.
+    """
+    sample = _frame(1000, shape, seed)
+    per_row = len(sample.to_csv(index=False).encode()) / len(sample)
+    return _frame(max(int(nbytes / per_row), 1), shape, seed)
+
+
+def _records(df):
+    """ the json parser writes plain python objects so tables are benchmarked as a list of records
+    """
+    return df.astype({c: str for c in df.select_dtypes('datetime').columns}).to_dict('records')
+
+
+def _quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def _time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+class BenchmarkRun(object):
+    """ Runs benchmarks in a scratch folder and collects their timings.
+    """
+
+    def __init__(self, workdir, repeat=3):
+        self.workdir = pathlib.Path(workdir)
+        self.repeat = repeat
+        self.results = []
+
+
+    def measure(self, name, fn, **params):
+        """ time fn repeat times and record it under name and params.
+        """
+        times = _time(fn, self.repeat)
+        result = collections.OrderedDict(name=name, **params)
+        result.update(min_s=min(times), median_s=statistics.median(times), times_s=times)
+        self.results.append(result)
+        label = ' '.join(f'{k}={v}' for k, v in params.items())
+        print(f'{name:<28} {label:<48} median {result["median_s"]:.4f}s  min {result["min_s"]:.4f}s')
+        return result
+
+
+    def parsers(self, sizes, shapes):
+        parsers = [('csv', PandasCSVParser()), ('parquet', ParquetParser()), ('feather', FeatherParser()),
+            ('data.pkl', PickleParser()), ('json', JsonParser())]
+        folder = self.workdir / 'parsers'
+        for shape in shapes:
+            for size in sizes:
+                df = synthetic_frame(parse_size(size), shape)
+                for suffix, parser in parsers:
+                    if suffix == 'json' and parse_size(size) > MAX_JSON_BYTES:
+                        print(f'skipping json at {size}, larger than {MAX_JSON_BYTES // 1024 ** 2}MB')
+                        continue
+                    data = _records(df) if suffix == 'json' else df
+                    fpath = folder / f'{shape}-{size}.{suffix}'
+                    params = dict(parser=type(parser).__name__, size=size, shape=shape, rows=len(df))
+                    self.measure('write', lambda: parser.write(fpath, data), **params)
+                    params['bytes'] = os.path.getsize(fpath)
+                    self.measure('read', lambda: parser.read(fpath), **params)
+                    del data
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+    def compression(self, sizes, shapes):
+        """ time writing and reading csv and data.pkl files with each codec at a few levels and 
+        record the compression ratio. Codecs whose library isn't installed are skipped.
+        """
+        parsers = [('csv', PandasCSVParser()), ('data.pkl', PickleParser())]
+        folder = self.workdir / 'compression'
+        for shape in shapes:
+            for size in sizes:
+                df = synthetic_frame(parse_size(size), shape)
+                for suffix, parser in parsers:
+                    plain = folder / f'{shape}-{size}.{suffix}'
+                    parser.write(plain, df)
+                    nbytes = os.path.getsize(plain)
+                    for codec, levels in COMPRESSION_LEVELS.items():
+                        try:
+                            compress.open_file(folder / f'probe.{codec}', 'wb').close()
+                        except ImportError as e:
+                            print(f'skipping {codec}: {e}')
+                            continue
+                        for level in levels:
+                            fpath = folder / f'{shape}-{size}.{suffix}.{codec}'
+                            params = dict(parser=type(parser).__name__, codec=codec, level=level, size=size, shape=shape)
+                            self.measure('compressed_write', lambda: parser.write(fpath, df, compression_level=level), **params)
+                            params['ratio'] = round(nbytes / os.path.getsize(fpath), 2)
+                            self.measure('compressed_read', lambda: parser.read(fpath), **params)
+                del df
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+    def subpaths(self, nfiles, patterns):
+        """ time discovery on a tree of nfiles empty files spread over folders of 1000.
+        """
+        folder = self.workdir / 'tree'
+        suffixes = ['csv', 'json', 'parquet', 'txt']
+        for i in range(nfiles):
+            d = folder / f'd{i // 1000}'
+            if i % 1000 == 0:
+                d.mkdir(parents=True, exist_ok=True)
+            (d / f'f{i}.{suffixes[i % len(suffixes)]}').touch()
+        self.measure('build_subpaths', lambda: pathutils.build_subpaths(folder, accept=patterns), files=nfiles)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+    def entrypoint(self, sizes):
+        """ time update_entrypoint end to end on a narrow csv at each size, once forced and once
+        as a no-op rebuild.
+        """
+        for size in sizes:
+            root = self.workdir / f'project-{size}'
+            raw = root / 'raw'
+            raw.mkdir(parents=True, exist_ok=True)
+            synthetic_frame(parse_size(size), 'narrow').to_csv(raw / 'events.csv', index=False)
+            synthetic_frame(parse_size('1MB'), 'narrow', seed=1).to_csv(raw / 'copied.csv', index=False)
+
+            manager = _BenchManager(raw_folder=raw, entrypoint_folder=root / 'bench-entrypoint',
+                models_folder=root / 'bench-models')
+            manager.clean(['events.csv'], ['positive.parquet', 'daily.csv'])(_bench_clean)
+            for force, name in ((True, 'update_entrypoint'), (False, 'update_entrypoint_noop')):
+                self.measure(name, lambda: _quiet(manager.update_entrypoint, force=force), size=size)
+            shutil.rmtree(root, ignore_errors=True)
+
+
+    def fetch(self, sizes, shapes):
+        """ time a fetch through the fetch_data cache with the cache cleared (cold) and again with
+        the value cached (warm).
+        """
+        folder = self.workdir / 'fetch'
+        parser = ParquetParser()
+        for shape in shapes:
+            for size in sizes:
+                fpath = folder / f'{shape}-{size}.parquet'
+                parser.write(fpath, synthetic_frame(parse_size(size), shape))
+
+                def _cold():
+                    _fetch_cache.clear()
+                    _fetch(fpath, parser)
+
+                self.measure('fetch_data_cold', _cold, size=size, shape=shape)
+                self.measure('fetch_data_warm', lambda: _fetch(fpath, parser), size=size, shape=shape)
+                _fetch_cache.clear()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+    def imports(self, modules):
+        """ time starting a fresh interpreter and importing each module, which is what every 
+        console script and notebook kernel pays. The module's own cumulative import time from 
+        python -X importtime and the heavy libraries it pulled in are recorded with it.
+        """
+        for module in modules:
+            code = f'import sys, {module}; print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+            out = {}
+
+            def _import():
+                proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], 
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+                out['stdout'], out['stderr'] = proc.stdout.decode(), proc.stderr.decode()
+
+            result = self.measure('import', _import, module=module)
+            result['import_s'] = _importtime(out['stderr'], module)
+            result['loaded'] = [m for m in out['stdout'].strip().split(',') if m]
+            print(f'{"":<28} {module} import {result["import_s"]:.4f}s loads {result["loaded"] or "nothing heavy"}')
+
+
+def _importtime(stderr, module):
+    """ the cumulative seconds of module from python -X importtime output
+    """
+    for line in stderr.splitlines():
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1e6
+    return None
+
+
+class _BenchManager(_DataManager):
+    """ a data manager with its own registries so the project's registered methods are not run.
+    """
+    _processor_registry = collections.OrderedDict()
+    _modeler_registry = collections.OrderedDict()
+
+
+def _bench_clean(events):
+    events['day'] = pd.to_datetime(events['ts']).dt.floor('D')
+    daily = events.groupby(['day', 'category'], as_index=False)['value'].sum()
+    return events[events['value'] > 0], daily
+
+
+def _commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, check=True)
+        return out.stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment():
+    import pyarrow
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'pyarrow': pyarrow.__version__
+    }
+
+
+def _key(result):
+    return tuple((k, v) for k, v in result.items() if k not in ('min_s', 'median_s', 'times_s', 'bytes', 'rows', 'ratio', 'import_s', 'loaded'))
+
+
+def compare(before, after, threshold=0.1):
+    """ Return a report of the median times of two result files. Benchmarks that got more than
+    threshold slower are flagged.
+    """
+    previous = {_key(r): r for r in before['results']}
+    lines = [f'{before.get("commit")} -> {after.get("commit")}']
+    for r in after['results']:
+        old = previous.get(_key(r))
+        if old is None:
+            continue
+        ratio = r['median_s'] / max(old['median_s'], 1e-9)
+        flag = '  SLOWER' if ratio > 1 + threshold else ('  faster' if ratio < 1 - threshold else '')
+        label = ' '.join(f'{v}' for k, v in _key(r))
+        lines.append(f'{label:<72} {old["median_s"]:.4f}s -> {r["median_s"]:.4f}s  x{ratio:.2f}{flag}')
+    return '\n'.join(lines)
+
+
+@click.command()
+@click.option('--sizes', default='1MB,10MB,100MB', show_default=True,
+    help='Comma separated sizes (as csv) of the synthetic tables, ex. 1MB,100MB,5GB.')
+@click.option('--shapes', default=','.join(SHAPES), show_default=True,
+    help='narrow (4 mixed columns) and/or wide (100 float columns) tables.')
+@click.option('--only', default=','.join(BENCHMARKS), show_default=True, help='Comma separated benchmarks to run.')
+@click.option('--files', type=click.INT, default=100000, show_default=True, help='Number of files for the subpaths benchmark.')
+@click.option('-r', '--repeat', type=click.INT, default=3, show_default=True, help='Number of times to run each benchmark.')
+@click.option('--workdir', type=click.Path(file_okay=False), default=None,
+    help='Scratch folder for the synthetic data. Defaults to a temporary folder.')
+@click.option('-o', '--output', type=click.Path(dir_okay=False), default=None,
+    help='Where to write the results. Defaults to data/.localcache/benchmarks/<time>-<commit>.json')
+@click.option('--compare', 'compare_to', type=click.Path(exists=True, dir_okay=False), default=None,
+    help='A previous results file to compare this run with.')
+def benchmark_build(sizes, shapes, only, files, repeat, workdir, output, compare_to):
+    """ Benchmark the parsers, compression codecs, file discovery, update_entrypoint and fetch_data 
+    on synthetic data and the import time of the package.
+    """
+    sizes = [s.strip().upper() for s in sizes.split(',') if s.strip()]
+    shapes = [s.strip() for s in shapes.split(',') if s.strip()]
+    only = [b.strip() for b in only.split(',') if b.strip()]
+    unknown = set(only) - set(BENCHMARKS)
+    if unknown:
+        raise click.BadParameter(f'Unknown benchmarks {sorted(unknown)}. Use any of {BENCHMARKS}')
+
+    scratch = tempfile.mkdtemp(prefix='benchmark-build-', dir=workdir)
+    run = BenchmarkRun(scratch, repeat=repeat)
+    try:
+        if 'parsers' in only:
+            run.parsers(sizes, shapes)
+        if 'compression' in only:
+            run.compression(sizes, shapes)
+        if 'subpaths' in only:
+            run.subpaths(files, _DataManager._parsers.patterns('raw'))
+        if 'entrypoint' in only:
+            run.entrypoint(sizes)
+        if 'fetch' in only:
+            run.fetch(sizes, shapes)
+        if 'imports' in only:
+            run.imports(IMPORT_MODULES)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    results = {
+        'commit': _commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'environment': _environment(),
+        'repeat': repeat,
+        'results': run.results
+    }
+    if output is None:
+        BENCHMARKS_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+        output = BENCHMARKS_DIR / f'{stamp}-{results["commit"] or "nocommit"}.json'
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {output}')
+
+    if compare_to is not None:
+        with open(compare_to, 'r') as f:
+            print(compare(json.load(f), results))
+
+
+if __name__ == '__main__':
+    benchmark_build()
@@ -0,0 +1,35 @@
+from {{cookiecutter.package_name}}._build import data
+
+import collections
+import pathlib
+
+import pytest
+
+
+class Project(object):
+    """ a data manager over scratch raw/ entrypoint/ and models/ folders with its own registries 
+    so the project's registered methods are never run.
+    """
+
+    def __init__(self, root):
+        self.root = pathlib.Path(root)
+        self.raw = self.root / 'raw'
+        self.entrypoint = self.root / 'entrypoint'
+        self.models = self.root / 'models'
+        for folder in (self.raw, self.entrypoint, self.models):
+            folder.mkdir(parents=True)
+        self.manager = data._DataManager(self.raw, self.entrypoint, self.models)
+        self.manager._processor_registry = collections.OrderedDict()
+        self.manager._modeler_registry = collections.OrderedDict()
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    cache = tmp_path / '.localcache'
+    monkeypatch.setattr(data, 'BUILD_STATS_DIR', cache / 'build-stats')
+    monkeypatch.setattr(data, 'MODEL_STORE_DIR', cache / 'model-store')
+    monkeypatch.setattr(data, 'SAMPLE_ENTRYPOINT_DIR', cache / 'sample-entrypoint')
+    monkeypatch.setattr(data, 'SAMPLE_MODELS_DIR', cache / 'sample-models')
+    data._fetch_cache.clear()
+    yield Project(tmp_path / 'project')
+    data._fetch_cache.clear()
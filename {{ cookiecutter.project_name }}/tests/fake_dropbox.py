@@ -0,0 +1,126 @@
+""" An in memory stand in for dropbox.Dropbox with the endpoints DropboxAPI uses. Files are 
+kept in a dict of path -> bytes, every call is recorded in calls and errors queued with 
+fail(method, *errors) are raised by the next calls to that method.
+"""
+import collections
+import datetime
+import hashlib
+import types
+import uuid
+
+from dropbox import files
+from dropbox.exceptions import ApiError
+
+BLOCKSIZE = 4 * 1024 * 1024
+MODIFIED = datetime.datetime(2020, 1, 1)
+
+
+def content_hash(data):
+    h = hashlib.sha256()
+    for i in range(0, len(data), BLOCKSIZE):
+        h.update(hashlib.sha256(data[i:i + BLOCKSIZE]).digest())
+    return h.hexdigest()
+
+
+class FakeDropbox(object):
+
+    def __init__(self, page_size=1000):
+        self.files = {}
+        self.sessions = {}
+        self.calls = []
+        self.page_size = page_size
+        self._errors = collections.defaultdict(list)
+        self._pages = {}
+
+
+    def fail(self, method, *errors):
+        self._errors[method].extend(errors)
+
+
+    def _call(self, method, *args):
+        self.calls.append((method,) + args)
+        if self._errors[method]:
+            raise self._errors[method].pop(0)
+
+
+    def count(self, method):
+        return sum(1 for c in self.calls if c[0] == method)
+
+
+    def _entries(self, path):
+        prefix = path.lower() + '/'
+        folders, entries = set(), []
+        for p, data in sorted(self.files.items()):
+            if not p.lower().startswith(prefix):
+                continue
+            parts = p.split('/')
+            folders.update('/'.join(parts[:i]) for i in range(len(path.split('/')) + 1, len(parts)))
+            entries.append(files.FileMetadata(name=parts[-1], id='id:' + p, client_modified=MODIFIED, 
+                server_modified=MODIFIED, rev='0123456789', size=len(data), path_lower=p.lower(), 
+                path_display=p, content_hash=content_hash(data)))
+        folders = [files.FolderMetadata(name=f.rsplit('/', 1)[-1], id='id:' + f, path_lower=f.lower(), 
+            path_display=f) for f in sorted(folders)]
+        return folders + entries
+
+
+    def _page(self, cursor):
+        entries = self._pages[cursor]
+        page, rest = entries[:self.page_size], entries[self.page_size:]
+        following = uuid.uuid4().hex
+        self._pages[following] = rest
+        return types.SimpleNamespace(entries=page, has_more=bool(rest), cursor=following)
+
+
+    def files_list_folder(self, path, recursive=False):
+        self._call('files_list_folder', path)
+        entries = self._entries(path)
+        if not entries:
+            raise ApiError('request-id', files.ListFolderError.path(files.LookupError.not_found), 
+                'not found', 'en')
+        cursor = uuid.uuid4().hex
+        self._pages[cursor] = entries
+        return self._page(cursor)
+
+
+    def files_list_folder_continue(self, cursor):
+        self._call('files_list_folder_continue', cursor)
+        return self._page(cursor)
+
+
+    def files_upload(self, data, path, mode=None):
+        self._call('files_upload', path)
+        self.files[path] = data
+
+
+    def files_upload_session_start(self, data):
+        self._call('files_upload_session_start')
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = data
+        return types.SimpleNamespace(session_id=session_id)
+
+
+    def _check_offset(self, cursor):
+        received = len(self.sessions[cursor.session_id])
+        if cursor.offset != received:
+            error = files.UploadSessionLookupError.incorrect_offset(
+                files.UploadSessionOffsetError(correct_offset=received))
+            raise ApiError('request-id', error, 'incorrect offset', 'en')
+
+
+    def files_upload_session_append_v2(self, data, cursor):
+        self._call('files_upload_session_append_v2', cursor.offset)
+        self._check_offset(cursor)
+        self.sessions[cursor.session_id] += data
+
+
+    def files_upload_session_finish(self, data, cursor, commit):
+        self._call('files_upload_session_finish', cursor.offset)
+        self._check_offset(cursor)
+        self.files[commit.path] = self.sessions.pop(cursor.session_id) + data
+
+
+    def files_download_to_file(self, download_path, path):
+        self._call('files_download_to_file', path)
+        data = next(d for p, d in self.files.items() if p.lower() == path)
+        with open(download_path, 'wb') as f:
+            f.write(data)
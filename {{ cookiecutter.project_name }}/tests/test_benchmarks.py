@@ -0,0 +1,28 @@
+from {{cookiecutter.package_name}}._build import data
+from . import benchmarks
+
+import json
+
+from click.testing import CliRunner
+
+
+def test_benchmarks_run_and_compare(tmp_path, monkeypatch):
+    monkeypatch.setattr(data, 'BUILD_STATS_DIR', tmp_path / 'build-stats')
+    output = tmp_path / 'results.json'
+    args = ['--sizes', '10KB', '--shapes', 'narrow', '--only', 'parsers,entrypoint,fetch', '-r', '1', 
+        '--workdir', str(tmp_path), '-o', str(output)]
+    result = CliRunner().invoke(benchmarks.benchmark_build, args)
+    assert result.exit_code == 0, result.output
+
+    results = json.loads(output.read_text())
+    names = {r['name'] for r in results['results']}
+    assert {'read', 'write', 'update_entrypoint', 'update_entrypoint_noop', 'fetch_data_warm'} <= names
+    report = benchmarks.compare(results, results).splitlines()
+    assert len(report) == len(results['results']) + 1
+    assert not any('SLOWER' in line for line in report)
+
+
+def test_unknown_benchmarks_are_rejected():
+    result = CliRunner().invoke(benchmarks.benchmark_build, ['--only', 'parsers,nope'])
+    assert result.exit_code != 0
+    assert 'nope' in result.output
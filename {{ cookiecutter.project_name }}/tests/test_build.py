@@ -0,0 +1,179 @@
+from {{cookiecutter.package_name}}._build import data
+from {{cookiecutter.package_name}}._build import scheduler
+from {{cookiecutter.package_name}}._build.scheduler import BuildError
+
+import pandas as pd
+import pytest
+
+
+def _write_csv(path, **columns):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(columns).to_csv(path, index=False)
+
+
+def _build(project, **kwargs):
+    project.manager.update_entrypoint(jobs=1, **kwargs)
+
+
+def test_unchanged_steps_are_skipped(project):
+    _write_csv(project.raw / 'a.csv', x=[1, 2, 3])
+    calls = []
+
+    @project.manager.clean(['a.csv'], ['b.csv'])
+    def double(a):
+        calls.append('double')
+        return a * 2
+
+    _build(project)
+    _build(project)
+    assert calls == ['double']
+    assert pd.read_csv(project.entrypoint / 'b.csv')['x'].tolist() == [2, 4, 6]
+
+    _build(project, force=True)
+    assert calls == ['double'] * 2
+
+
+def test_changed_inputs_and_outputs_rerun(project):
+    _write_csv(project.raw / 'a.csv', x=[1, 2, 3])
+    calls = []
+
+    @project.manager.clean(['a.csv'], ['b.csv'])
+    def double(a):
+        calls.append('double')
+        return a * 2
+
+    _build(project)
+    _write_csv(project.raw / 'a.csv', x=[5])
+    _build(project)
+    assert len(calls) == 2
+    assert pd.read_csv(project.entrypoint / 'b.csv')['x'].tolist() == [10]
+
+    (project.entrypoint / 'b.csv').unlink()
+    _build(project)
+    assert len(calls) == 3
+    assert (project.entrypoint / 'b.csv').exists()
+
+
+def test_downstream_steps_read_upstream_outputs(project):
+    _write_csv(project.raw / 'a.csv', x=[1, 2])
+
+    @project.manager.clean(['b.csv'], ['c.csv'])
+    def plus_one(b):
+        return b + 1
+
+    @project.manager.clean(['a.csv'], ['b.csv'])
+    def double(a):
+        return a * 2
+
+    steps = scheduler.build_graph(project.manager._processor_registry, project.raw, project.entrypoint)
+    assert steps['test_downstream_steps_read_upstream_outputs.<locals>.plus_one'].deps == \
+        {'test_downstream_steps_read_upstream_outputs.<locals>.double'}
+
+    _build(project)
+    assert pd.read_csv(project.entrypoint / 'c.csv')['x'].tolist() == [3, 5]
+
+
+def test_a_failed_step_keeps_its_last_outputs(project):
+    _write_csv(project.raw / 'a.csv', x=[1])
+    _write_csv(project.raw / 'b.csv', x=[1])
+
+    @project.manager.clean(['a.csv'], ['a_out.csv'])
+    def ok(a):
+        return a
+
+    @project.manager.clean(['b.csv'], ['b_out.csv', 'b_more.csv'])
+    def fails_on_negatives(b):
+        if (b['x'] < 0).any():
+            raise ValueError('negative x')
+        return b, b
+
+    _build(project)
+    _write_csv(project.raw / 'a.csv', x=[2])
+    _write_csv(project.raw / 'b.csv', x=[-1])
+    with pytest.raises(BuildError) as err:
+        _build(project)
+
+    assert [k.rsplit('.', 1)[-1] for k in err.value.failures] == ['fails_on_negatives']
+    assert pd.read_csv(project.entrypoint / 'a_out.csv')['x'].tolist() == [2]
+    assert pd.read_csv(project.entrypoint / 'b_out.csv')['x'].tolist() == [1]
+    assert pd.read_csv(project.entrypoint / 'b_more.csv')['x'].tolist() == [1]
+    assert not (project.root / '.staging-entrypoint').exists()
+
+
+def test_a_failure_only_blocks_downstream_steps(project):
+    _write_csv(project.raw / 'a.csv', x=[1])
+    _write_csv(project.raw / 'b.csv', x=[1])
+
+    @project.manager.clean(['a.csv'], ['a_out.csv'])
+    def broken(a):
+        raise ValueError('broken')
+
+    @project.manager.clean(['a_out.csv'], ['downstream.csv'])
+    def downstream(a_out):
+        return a_out
+
+    @project.manager.clean(['b.csv'], ['b_out.csv'])
+    def independent(b):
+        return b
+
+    with pytest.raises(BuildError) as err:
+        _build(project)
+
+    assert [k.rsplit('.', 1)[-1] for k in err.value.failures] == ['broken']
+    assert [k.rsplit('.', 1)[-1] for k in err.value.blocked] == ['downstream']
+    assert (project.entrypoint / 'b_out.csv').exists()
+    assert not (project.entrypoint / 'downstream.csv').exists()
+
+
+def test_only_new_partitions_are_cleaned(project):
+    _write_csv(project.raw / 'events' / 'date=2020-01-01' / 'part.csv', x=[1, 2])
+    cleaned = []
+
+    @project.manager.clean(['events/date=*/'], ['events/date=*/out.csv'])
+    def by_day(events):
+        cleaned.append(events['date'].iloc[0])
+        return events
+
+    _build(project)
+    _write_csv(project.raw / 'events' / 'date=2020-01-02' / 'part.csv', x=[3])
+    _build(project)
+
+    assert cleaned == ['2020-01-01', '2020-01-02']
+    out = pd.read_csv(project.entrypoint / 'events' / 'date=2020-01-02' / 'out.csv')
+    assert out['x'].tolist() == [3]
+
+
+def test_sampled_builds_leave_entrypoint_alone(project):
+    _write_csv(project.raw / 'a.csv', x=list(range(100)))
+
+    @project.manager.clean(['a.csv'], ['b.csv'])
+    def copy(a):
+        return a
+
+    _build(project, sample=10)
+    _build(project, sample=10)
+    first = pd.read_csv(data.SAMPLE_ENTRYPOINT_DIR / 'b.csv')['x'].tolist()
+    assert len(first) == 10 and first == sorted(first)
+    assert not (project.entrypoint / 'b.csv').exists()
+
+    _build(project, sample=10)
+    assert pd.read_csv(data.SAMPLE_ENTRYPOINT_DIR / 'b.csv')['x'].tolist() == first
+
+
+def test_a_missing_model_input_fails_its_step(project):
+    _write_csv(project.entrypoint / 'a.csv', x=[1])
+
+    @project.manager.model(['a.csv'], ['a.data.pkl'])
+    def fit(a):
+        return a['x'].sum()
+
+    @project.manager.model(['missing.csv'], ['b.data.pkl'])
+    def fit_missing(missing):
+        return 0
+
+    with pytest.raises(BuildError) as err:
+        project.manager.update_models(jobs=1)
+
+    assert [k.rsplit('.', 1)[-1] for k in err.value.failures] == ['fit_missing']
+    assert isinstance(list(err.value.failures.values())[0], FileNotFoundError)
+    assert (project.models / 'a.data.pkl').exists()
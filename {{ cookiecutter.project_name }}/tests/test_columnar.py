@@ -0,0 +1,54 @@
+from {{cookiecutter.package_name}}._build import parsers
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({'a': [1, 2, 3, 4], 'b': ['w', 'x', 'y', 'z'], 'c': [0.5, 1.5, 2.5, 3.5]})
+
+
+@pytest.mark.parametrize('filename', ['t.parquet', 't.feather', 't.arrow'])
+def test_columnar_round_trip(tmp_path, frame, filename):
+    parser = parsers.create_parser_registry().lookup(filename)
+    parser.write(tmp_path / filename, frame)
+    pd.testing.assert_frame_equal(parser.read(tmp_path / filename), frame)
+
+
+@pytest.mark.parametrize('filename', ['t.parquet', 't.feather'])
+def test_columns_and_filters_are_pushed_down(tmp_path, frame, filename):
+    parser = parsers.create_parser_registry().lookup(filename)
+    parser.write(tmp_path / filename, frame)
+
+    read = parser.read(tmp_path / filename, columns=['a', 'c'], filters=[('a', '>', 2)])
+    assert list(read.columns) == ['a', 'c']
+    assert read['a'].tolist() == [3, 4]
+    assert read['c'].tolist() == [2.5, 3.5]
+
+
+def test_parser_read_options_are_defaults(tmp_path, frame):
+    parser = parsers.ParquetParser(read_options={'columns': ['b']})
+    parser.write(tmp_path / 't.parquet', frame)
+    assert list(parser.read(tmp_path / 't.parquet').columns) == ['b']
+    assert list(parser.read(tmp_path / 't.parquet', columns=['a', 'b']).columns) == ['a', 'b']
+
+
+def test_step_read_options_reach_the_parser(project, frame):
+    frame.to_parquet(project.raw / 'a.parquet', index=False)
+    seen = []
+
+    @project.manager.clean(['a.parquet'], ['b.parquet'],
+        read_options={'a.parquet': {'columns': ['a'], 'filters': [('b', 'in', ['x', 'z'])]}})
+    def select(a):
+        seen.append(list(a.columns))
+        return a
+
+    project.manager.update_entrypoint(jobs=1)
+    assert seen == [['a']]
+    assert pd.read_parquet(project.entrypoint / 'b.parquet')['a'].tolist() == [2, 4]
+
+
+def test_read_options_must_name_an_input(project):
+    with pytest.raises(ValueError):
+        project.manager.clean(['a.parquet'], ['b.parquet'], read_options={'c.parquet': {'columns': ['a']}})
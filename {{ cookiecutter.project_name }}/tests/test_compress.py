@@ -0,0 +1,75 @@
+from {{cookiecutter.package_name}}._build import compress
+from {{cookiecutter.package_name}}._build import parsers
+
+import numpy as np
+import pandas as pd
+import pytest
+
+MAGIC = {'zst': b'\x28\xb5\x2f\xfd', 'lz4': b'\x04\x22\x4d\x18', 'gz': b'\x1f\x8b'}
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({'a': np.arange(200), 'b': ['text'] * 200})
+
+
+def _assert_compressed(path, codec):
+    with open(path, 'rb') as f:
+        assert f.read(len(MAGIC[codec])) == MAGIC[codec]
+
+
+@pytest.mark.parametrize('codec', compress.CODECS)
+@pytest.mark.parametrize('suffix', ['csv', 'jsonl', 'data.pkl'])
+def test_tabular_files_round_trip_compressed(tmp_path, frame, codec, suffix):
+    path = tmp_path / f'a.{suffix}.{codec}'
+    parser = parsers.create_parser_registry().lookup(path.name)
+    parser.write(path, frame)
+    _assert_compressed(path, codec)
+    pd.testing.assert_frame_equal(parser.read(path), frame)
+
+
+@pytest.mark.parametrize('codec', compress.CODECS)
+def test_json_and_models_round_trip_compressed(tmp_path, codec):
+    registry = parsers.create_parser_registry()
+    document = {'a': [1, 2], 'b': {'c': 'd'}}
+    registry.lookup(f'a.json.{codec}').write(tmp_path / f'a.json.{codec}', document)
+    _assert_compressed(tmp_path / f'a.json.{codec}', codec)
+    assert registry.lookup(f'a.json.{codec}').read(tmp_path / f'a.json.{codec}') == document
+
+    model = {'coef': np.arange(10.0)}
+    registry.lookup(f'm.model.pkl.{codec}').write(tmp_path / f'm.model.pkl.{codec}', model)
+    loaded = registry.lookup(f'm.model.pkl.{codec}').read(tmp_path / f'm.model.pkl.{codec}')
+    assert not isinstance(loaded['coef'], np.memmap)
+    np.testing.assert_array_equal(loaded['coef'], model['coef'])
+    assert (tmp_path / 'm.metadata.json').exists()
+
+
+@pytest.mark.parametrize('codec', compress.CODECS)
+def test_chunks_are_written_compressed(tmp_path, frame, codec):
+    path = tmp_path / f'a.csv.{codec}'
+    parser = parsers.PandasCSVParser()
+    with parser.chunk_writer(path) as writer:
+        writer.write(frame[:100])
+        writer.write(frame[100:])
+    _assert_compressed(path, codec)
+    assert [len(c) for c in parser.read_chunks(path, 150)] == [150, 50]
+
+
+def test_compression_level_is_a_write_option(tmp_path):
+    frame = pd.DataFrame({'a': np.random.RandomState(0).randint(0, 10, 20000)})
+    parser = parsers.PandasCSVParser()
+    parser.write(tmp_path / 'fast.csv.gz', frame, compression_level=1)
+    parser.write(tmp_path / 'small.csv.gz', frame, compression_level=9)
+    assert (tmp_path / 'small.csv.gz').stat().st_size < (tmp_path / 'fast.csv.gz').stat().st_size
+    pd.testing.assert_frame_equal(parser.read(tmp_path / 'small.csv.gz'), frame)
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('a.csv.zst', ('a.csv', 'zst')),
+    ('dir/a.model.pkl.GZ', ('dir/a.model.pkl', 'gz')),
+    ('a.csv', ('a.csv', None)),
+    ('a.tar', ('a.tar', None)),
+])
+def test_split(filename, expected):
+    assert compress.split(filename) == expected
+    assert compress.codec_of(filename) == expected[1]
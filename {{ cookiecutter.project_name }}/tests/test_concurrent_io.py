@@ -0,0 +1,50 @@
+from {{cookiecutter.package_name}}._build import data
+
+import json
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+
+def test_map_io_keeps_the_order_of_its_items():
+    def slow_first(i):
+        time.sleep(0.05 if i == 0 else 0)
+        return i * 10
+
+    assert data._map_io(slow_first, [0, 1, 2, 3], io_jobs=4) == [0, 10, 20, 30]
+    assert data._map_io(slow_first, [0, 1, 2, 3], io_jobs=1) == [0, 10, 20, 30]
+    assert data._map_io(slow_first, [], io_jobs=4) == []
+
+
+def test_map_io_runs_items_at_the_same_time():
+    barrier = threading.Barrier(3, timeout=5)  # breaks unless all three run at once
+    assert data._map_io(lambda i: barrier.wait() is not None, [0, 1, 2], io_jobs=3) == [True] * 3
+
+
+def test_map_io_raises_the_first_error():
+    def fails_on_two(i):
+        if i == 2:
+            raise ValueError('two')
+        return i
+
+    with pytest.raises(ValueError):
+        data._map_io(fails_on_two, [0, 1, 2, 3], io_jobs=2)
+
+
+@pytest.mark.parametrize('io_jobs', [1, 4])
+def test_steps_read_and_write_many_files_in_order(project, io_jobs):
+    for i, name in enumerate(['a.csv', 'b.parquet', 'c.jsonl']):
+        project.manager.get_parser(name).write(project.raw / name, pd.DataFrame({'x': [i]}))
+
+    @project.manager.clean(['a.csv', 'b.parquet', 'c.jsonl'], ['sum.csv', 'first.parquet', 'last.jsonl'])
+    def combine(a, b, c):
+        return a + b + c, a, c
+
+    project.manager.update_entrypoint(jobs=1, io_jobs=io_jobs)
+    read = {name: project.manager.get_parser(name).read(project.entrypoint / name)['x'].tolist()
+        for name in ('sum.csv', 'first.parquet', 'last.jsonl')}
+    assert read == {'sum.csv': [3], 'first.parquet': [0], 'last.jsonl': [2]}
+    stats = json.loads((data.BUILD_STATS_DIR / 'entrypoint.jsonl').read_text())
+    assert sorted(stats['read_s']) == ['a.csv', 'b.parquet', 'c.jsonl']
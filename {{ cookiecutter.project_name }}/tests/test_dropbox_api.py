@@ -0,0 +1,173 @@
+from {{cookiecutter.package_name}}._build import dropbox_api
+from {{cookiecutter.package_name}}._build.dropbox_api import DropboxAPI
+from .fake_dropbox import FakeDropbox, content_hash, BLOCKSIZE
+
+import json
+import os
+
+import pytest
+import requests
+from dropbox.exceptions import InternalServerError, RateLimitError
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    folder = tmp_path / 'data'
+    (folder / 'raw').mkdir(parents=True)
+    (folder / 'models').mkdir()
+    return folder
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waits = []
+    monkeypatch.setattr(dropbox_api.time, 'sleep', waits.append)
+    return waits
+
+
+def _api(data_dir, dbx, **kwargs):
+    return DropboxAPI('project', root_data_dir=data_dir, raw_data_dir=data_dir / 'raw', 
+        models_dir=data_dir / 'models', dbx=dbx, sessions_file=data_dir.parent / 'sessions.json', 
+        jobs=2, **kwargs)
+
+
+def _sessions(data_dir):
+    with open(data_dir.parent / 'sessions.json', 'r') as f:
+        return json.load(f)
+
+
+def test_content_hash_matches_dropbox(tmp_path):
+    for size in (0, 10, BLOCKSIZE, 2 * BLOCKSIZE + 1):
+        data = bytes(range(256)) * (size // 256) + b'x' * (size % 256)
+        (tmp_path / 'a').write_bytes(data)
+        assert dropbox_api.content_hash(tmp_path / 'a') == content_hash(data)
+
+
+def test_push_only_uploads_changed_files(data_dir):
+    dbx = FakeDropbox()
+    (data_dir / 'raw' / 'a.csv').write_bytes(b'a')
+    (data_dir / 'raw' / 'b.csv').write_bytes(b'b')
+    api = _api(data_dir, dbx)
+
+    assert api.upload_data().files_transferred == 2
+    (data_dir / 'raw' / 'b.csv').write_bytes(b'changed')
+    stats = api.upload_data()
+
+    assert (stats.files_transferred, stats.files_skipped) == (1, 1)
+    assert dbx.files['/project/raw/b.csv'] == b'changed'
+    assert dbx.count('files_upload') == 3
+
+
+def test_pull_only_downloads_changed_files(data_dir):
+    dbx = FakeDropbox()
+    dbx.files.update({'/project/raw/a.csv': b'a', '/project/raw/sub/B.csv': b'b', '/project/models/m.pkl': b'm'})
+    api = _api(data_dir, dbx)
+
+    assert api.download_data().files_transferred == 3
+    assert (data_dir / 'raw' / 'sub' / 'B.csv').read_bytes() == b'b'
+    dbx.files['/project/raw/a.csv'] = b'new'
+    stats = api.download_data()
+
+    assert (stats.files_transferred, stats.files_skipped) == (1, 2)
+    assert (data_dir / 'raw' / 'a.csv').read_bytes() == b'new'
+    assert not list(data_dir.rglob('*.part'))
+
+
+def test_list_folder_follows_the_cursor(data_dir):
+    dbx = FakeDropbox(page_size=3)
+    dbx.files.update({f'/project/raw/{i}.csv': b'x' for i in range(10)})
+    api = _api(data_dir, dbx)
+
+    names = [e.name for e in api.list_folder('/project/raw')]
+    assert sorted(names) == sorted(f'{i}.csv' for i in range(10))
+    assert dbx.count('files_list_folder_continue') == 3
+    assert list(api.list_folder('/project/missing', missing_ok=True)) == []
+
+
+def test_an_interrupted_upload_resumes_from_the_last_chunk(data_dir):
+    dbx = FakeDropbox()
+    data = bytes(range(256)) * 4
+    (data_dir / 'raw' / 'big.data.pkl').write_bytes(data)
+    api = _api(data_dir, dbx, chunksize=256)
+
+    dbx.fail('files_upload_session_append_v2', ValueError('connection lost'))
+    stats = api.upload_data()
+    assert len(stats.failures) == 1
+    assert [s['offset'] for s in _sessions(data_dir).values()] == [256]
+
+    stats = api.upload_data()
+    assert stats.files_transferred == 1 and not stats.failures
+    assert dbx.files['/project/raw/big.data.pkl'] == data
+    assert dbx.count('files_upload_session_start') == 1
+    assert [c[1] for c in dbx.calls if c[0] == 'files_upload_session_append_v2'] == [256, 256, 512]
+    assert _sessions(data_dir) == {}
+
+
+def test_a_resumed_upload_skips_chunks_the_server_already_has(data_dir):
+    dbx = FakeDropbox()
+    data = bytes(range(256)) * 4
+    (data_dir / 'raw' / 'big.data.pkl').write_bytes(data)
+    api = _api(data_dir, dbx, chunksize=256)
+    dbx.fail('files_upload_session_append_v2', ValueError('connection lost'))
+    api.upload_data()
+
+    session_id = list(_sessions(data_dir).values())[0]['session_id']
+    dbx.sessions[session_id] += data[256:512]  # appended but the offset was never saved
+    assert not api.upload_data().failures
+    assert dbx.files['/project/raw/big.data.pkl'] == data
+
+
+def test_a_changed_file_starts_a_new_upload_session(data_dir):
+    dbx = FakeDropbox()
+    path = data_dir / 'raw' / 'big.data.pkl'
+    path.write_bytes(b'a' * 1024)
+    api = _api(data_dir, dbx, chunksize=256)
+    dbx.fail('files_upload_session_append_v2', ValueError('connection lost'))
+    api.upload_data()
+
+    path.write_bytes(b'b' * 1024)
+    assert not api.upload_data().failures
+    assert dbx.files['/project/raw/big.data.pkl'] == b'b' * 1024
+    assert dbx.count('files_upload_session_start') == 2
+
+
+def test_transient_errors_are_retried_with_backoff(data_dir, sleeps):
+    dbx = FakeDropbox()
+    (data_dir / 'raw' / 'a.csv').write_bytes(b'a')
+    dbx.fail('files_upload', InternalServerError('request-id', 503, 'unavailable'), 
+        RateLimitError('request-id', backoff=7), requests.exceptions.ConnectionError('reset'))
+
+    stats = _api(data_dir, dbx).upload_data()
+    assert stats.files_transferred == 1 and not stats.failures
+    assert sleeps == [1, 7, 4]
+    assert dbx.count('files_upload') == 4
+
+
+def test_an_upload_fails_once_the_retries_run_out(data_dir, sleeps):
+    dbx = FakeDropbox()
+    (data_dir / 'raw' / 'a.csv').write_bytes(b'a')
+    dbx.fail('files_upload', *[InternalServerError('request-id', 500, 'error') for _ in range(3)])
+
+    stats = _api(data_dir, dbx, retries=2).upload_data()
+    assert [type(err) for path, err in stats.failures] == [InternalServerError]
+    assert dbx.count('files_upload') == 3
+    assert '/project/raw/a.csv' not in dbx.files
+
+
+def test_push_only_hashes_files_that_can_match(data_dir, monkeypatch):
+    dbx = FakeDropbox()
+    dbx.files.update({'/project/raw/same.csv': b'same', '/project/raw/resized.csv': b'old'})
+    for name, data in (('same.csv', b'same'), ('resized.csv', b'longer'), ('new.csv', b'new')):
+        (data_dir / 'raw' / name).write_bytes(data)
+    hashed = []
+    original = dropbox_api.content_hash
+
+    def _content_hash(filepath):
+        hashed.append(os.path.basename(filepath))
+        return original(filepath)
+
+    monkeypatch.setattr(dropbox_api, 'content_hash', _content_hash)
+
+    stats = _api(data_dir, dbx).upload_data()
+    assert (stats.files_transferred, stats.files_skipped) == (2, 1)
+    assert hashed == ['same.csv']
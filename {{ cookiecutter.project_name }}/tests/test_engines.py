@@ -0,0 +1,89 @@
+from {{cookiecutter.package_name}}._build.engines import get_engine
+from {{cookiecutter.package_name}}._build.parsers import create_parser_registry
+
+import pandas as pd
+import pytest
+
+
+def _write_csv(path, **columns):
+    pd.DataFrame(columns).to_csv(path, index=False)
+
+
+def test_unknown_engines_are_rejected(project):
+    assert get_engine(None).name == 'pandas'
+    with pytest.raises(ValueError):
+        get_engine('spark')
+    with pytest.raises(ValueError):
+        project.manager.clean(['a.csv'], ['b.csv'], engine='spark')
+
+
+def test_polars_lazy_steps_get_lazyframes(project):
+    pl = pytest.importorskip('polars')
+    _write_csv(project.raw / 'a.csv', x=[1, -2, 3], y=['a', 'b', 'c'])
+    received = []
+
+    @project.manager.clean(['a.csv'], ['positive.parquet', 'positive.data.pkl'], engine='polars-lazy')
+    def positive(a):
+        received.append(type(a))
+        kept = a.filter(pl.col('x') > 0)
+        return kept, kept
+
+    project.manager.update_entrypoint(jobs=1)
+    assert received == [pl.LazyFrame]
+    assert pd.read_parquet(project.entrypoint / 'positive.parquet')['x'].tolist() == [1, 3]
+    pickled = project.entrypoint / 'positive.data.pkl'
+    assert create_parser_registry().lookup(pickled).read(pickled)['y'].tolist() == ['a', 'c']
+
+
+def test_dask_steps_get_dask_dataframes(project):
+    dd = pytest.importorskip('dask.dataframe')
+    _write_csv(project.raw / 'a.csv', x=[1, -2, 3])
+    received = []
+
+    @project.manager.clean(['a.csv'], ['positive.csv', 'positive.parquet'], engine='dask')
+    def positive(a):
+        received.append(isinstance(a, dd.DataFrame))
+        kept = a[a['x'] > 0]
+        return kept, kept
+
+    project.manager.update_entrypoint(jobs=1)
+    assert received == [True]
+    assert pd.read_csv(project.entrypoint / 'positive.csv')['x'].tolist() == [1, 3]
+    assert pd.read_parquet(project.entrypoint / 'positive.parquet')['x'].tolist() == [1, 3]
+
+
+@pytest.mark.parametrize('suffix', ['csv', 'parquet'])
+def test_dask_outputs_are_computed_once(tmp_path, suffix):
+    dd = pytest.importorskip('dask.dataframe')
+    frame = pd.DataFrame({'x': range(800), 'y': range(800)})
+    reads = []
+
+    def _read(df):
+        reads.append(len(df))
+        return df
+
+    data = dd.from_pandas(frame, npartitions=8).map_partitions(_read, meta=frame.iloc[:0]).shuffle('y')
+    get_engine('dask').write(create_parser_registry(), tmp_path / f'out.{suffix}', data)
+
+    assert len(reads) == 8
+    out = pd.read_csv(tmp_path / 'out.csv') if suffix == 'csv' else pd.read_parquet(tmp_path / 'out.parquet')
+    assert sorted(out['x']) == list(range(800))
+
+
+@pytest.mark.parametrize('engine', ['polars-lazy', 'dask'])
+def test_lazy_samples_stay_lazy_and_are_exact(tmp_path, engine):
+    pytest.importorskip('polars' if engine == 'polars-lazy' else 'dask.dataframe')
+    pd.DataFrame({'x': range(5000)}).to_csv(tmp_path / 'a.csv', index=False)
+    options = {'blocksize': 10000} if engine == 'dask' else {}  # several partitions
+    parsers = create_parser_registry()
+
+    def _sample(sample):
+        data = get_engine(engine).read_sample(parsers, tmp_path / 'a.csv', sample, **options)
+        assert not isinstance(data, pd.DataFrame)
+        return (data.collect().to_pandas() if engine == 'polars-lazy' else data.compute())['x'].tolist()
+
+    rows = _sample(100)
+    assert len(rows) == 100 and rows == sorted(rows)
+    assert rows == _sample(100)
+    assert 25 <= len(_sample(0.01)) <= 75
+    assert _sample(10000) == list(range(5000))
@@ -0,0 +1,93 @@
+from {{cookiecutter.package_name}}._build import data
+from {{cookiecutter.package_name}}._build.memcache import MemoryCache
+from {{cookiecutter.package_name}}._build.parsers import JsonParser, PandasCSVParser, PickleParser
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class CountingParser(object):
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.reads = 0
+
+    def read(self, filepath, **options):
+        self.reads += 1
+        return self.parser.read(filepath, **options)
+
+
+@pytest.fixture(autouse=True)
+def fetch_cache():
+    data._fetch_cache.clear()
+    yield
+    data._fetch_cache.clear()
+
+
+def test_fetches_are_cached_until_the_file_changes(tmp_path):
+    path = tmp_path / 'a.csv'
+    pd.DataFrame({'x': [1, 2]}).to_csv(path, index=False)
+    parser = CountingParser(PandasCSVParser())
+
+    data._fetch(path, parser)
+    data._fetch(path, parser)
+    assert parser.reads == 1
+
+    data._fetch(path, parser, usecols=['x'])  # other read_options are cached separately
+    assert parser.reads == 2
+
+    pd.DataFrame({'x': [1, 2, 3]}).to_csv(path, index=False)
+    assert data._fetch(path, parser)['x'].tolist() == [1, 2, 3]
+    assert parser.reads == 3
+
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    data._fetch(path, parser)
+    assert parser.reads == 4
+
+    data._fetch(path, parser, use_cache=False)
+    assert parser.reads == 5
+
+
+def test_cached_values_are_protected(tmp_path):
+    path = tmp_path / 'a.csv'
+    pd.DataFrame({'x': [1, 2]}).to_csv(path, index=False)
+    fetched = data._fetch(path, PandasCSVParser())
+    fetched.loc[0, 'x'] = 100
+    assert data._fetch(path, PandasCSVParser())['x'].tolist() == [1, 2]
+
+    path = tmp_path / 'a.data.pkl'
+    PickleParser().write(path, np.arange(3))
+    array = data._fetch(path, PickleParser())
+    with pytest.raises(ValueError):
+        array[0] = 100
+
+
+def test_json_documents_are_parsed_on_every_fetch(tmp_path):
+    path = tmp_path / 'a.json'
+    JsonParser().write(path, {'a': [1, 2]})
+    parser = CountingParser(JsonParser())
+
+    fetched = data._fetch(path, parser)
+    fetched['a'].append(3)
+    assert data._fetch(path, parser) == {'a': [1, 2]}
+    assert parser.reads == 2
+    assert data._fetch_cache.info().entries == 0
+
+
+def test_the_memory_cache_evicts_least_recently_used_values():
+    cache = MemoryCache(maxbytes=100)
+    cache.set('a', 'a', 'a.csv', 40)
+    cache.set('b', 'b', 'b.csv', 40)
+    cache.get('a')
+    cache.set('c', 'c', 'c.csv', 40)
+    assert cache.get('b') is None and cache.get('a') == 'a'
+
+    cache.set('big', 'big', 'big.csv', 101)
+    assert cache.get('big') is None
+    cache.invalidate('a.csv')
+    assert cache.get('a') is None
+    assert cache.info().currbytes == 40
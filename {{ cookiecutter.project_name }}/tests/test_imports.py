@@ -0,0 +1,22 @@
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+PACKAGE = '{{cookiecutter.package_name}}'
+HEAVY_MODULES = ('pandas', 'sklearn', 'joblib', 'pyarrow', 'dropbox')
+PROJECT_DIR = pathlib.Path(__file__).resolve().parents[1]
+
+
+def _loaded(module):
+    code = f'import sys, {module}; print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    proc = subprocess.run([sys.executable, '-c', code], cwd=str(PROJECT_DIR), 
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return [m for m in proc.stdout.decode().strip().split(',') if m]
+
+
+@pytest.mark.parametrize('module', [f'{PACKAGE}.registry', f'{PACKAGE}._build.data', 
+    f'{PACKAGE}._build.dropbox_api', f'{PACKAGE}._build.reports'])
+def test_importing_loads_no_heavy_libraries(module):
+    assert _loaded(module) == []
@@ -0,0 +1,94 @@
+from {{cookiecutter.package_name}}._build import data
+from {{cookiecutter.package_name}}._build import instrument
+
+import json
+import pstats
+
+import pandas as pd
+import pytest
+
+
+def test_step_stats_time_each_phase(tmp_path):
+    (tmp_path / 'in.csv').write_text('x\n1\n2\n')
+    stats = instrument.StepStats('step')
+    with stats.loading(), stats.reading('in.csv'):
+        df = pd.read_csv(tmp_path / 'in.csv')
+    stats.loaded('in.csv', df)
+    assert stats.call(lambda d: d * 2, df)['x'].tolist() == [2, 4]
+    with stats.writing():
+        df.to_csv(tmp_path / 'out.csv', index=False)
+
+    result = stats.finish({'in.csv': tmp_path / 'in.csv'}, {'out.csv': tmp_path / 'out.csv',
+        'missing.csv': tmp_path / 'missing.csv'})
+    assert result['step'] == 'step'
+    assert list(result['read_s']) == ['in.csv']
+    assert result['memory_bytes']['in.csv'] == df.memory_usage(index=True).sum()
+    assert result['bytes_read'] == (tmp_path / 'in.csv').stat().st_size
+    assert result['bytes_written'] == (tmp_path / 'out.csv').stat().st_size
+    assert result['wall_s'] >= result['read_wall_s'] + result['func_wall_s'] + result['write_s']
+    assert result['profile'] is None
+    json.dumps(result)
+
+
+def test_chunk_reads_are_timed_as_reading(tmp_path):
+    stats = instrument.StepStats('step')
+    assert list(stats.iter_reads('in.csv', iter([1, 2]))) == [1, 2]
+    assert list(stats.read_s) == ['in.csv']
+
+
+def test_a_failing_call_is_still_timed():
+    stats = instrument.StepStats('step')
+
+    def fails():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        stats.call(fails)
+    assert stats.func_wall_s > 0
+
+
+def test_build_report_writes_json_lines_slowest_first(tmp_path):
+    path = tmp_path / 'stats' / 'entrypoint.jsonl'
+    path.parent.mkdir()
+    path.write_text('from an old build\n')
+    report = instrument.BuildReport(path)
+    for key, wall in (('fast', 0.1), ('slow', 2.0)):
+        stats = instrument.StepStats(key).finish({}, {})
+        stats['wall_s'] = wall
+        report.add(stats)
+
+    assert [json.loads(l)['step'] for l in path.read_text().splitlines()] == ['fast', 'slow']
+    lines = report.summary().splitlines()
+    assert lines[0].startswith('step')
+    assert [l.split()[0] for l in lines[2:4]] == ['slow', 'fast']
+    assert lines[-1].endswith(str(path))
+    assert len(report.summary(limit=1).splitlines()) == 4
+
+
+def test_builds_record_every_step_that_ran(project):
+    pd.DataFrame({'x': [1, 2]}).to_csv(project.raw / 'a.csv', index=False)
+
+    @project.manager.clean(['a.csv'], ['b.csv'])
+    def copy(a):
+        return a
+
+    project.manager.update_entrypoint(jobs=1)
+    lines = (data.BUILD_STATS_DIR / 'entrypoint.jsonl').read_text().splitlines()
+    assert [json.loads(l)['step'].rsplit('.', 1)[-1] for l in lines] == ['copy']
+
+    project.manager.update_entrypoint(jobs=1)  # skipped steps are not reported
+    assert (data.BUILD_STATS_DIR / 'entrypoint.jsonl').read_text() == ''
+
+
+def test_profiled_builds_dump_a_profile_per_step(project):
+    pd.DataFrame({'x': [1, 2]}).to_csv(project.raw / 'a.csv', index=False)
+
+    @project.manager.clean(['a.csv'], ['b.csv'])
+    def copy(a):
+        return a
+
+    project.manager.update_entrypoint(jobs=1, profile=True)
+    stats = json.loads((data.BUILD_STATS_DIR / 'entrypoint.jsonl').read_text())
+    profiles = list((data.BUILD_STATS_DIR / 'profiles' / 'entrypoint').glob('*.prof'))
+    assert [str(p) for p in profiles] == [stats['profile']]
+    assert any(name == 'copy' for _, _, name in pstats.Stats(stats['profile']).stats)
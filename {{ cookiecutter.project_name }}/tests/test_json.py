@@ -0,0 +1,83 @@
+from {{cookiecutter.package_name}}._build import parsers
+from {{cookiecutter.package_name}}._build.parsers import JsonParser, JsonLinesParser
+
+import collections.abc
+import json
+import math
+import sys
+
+import pandas as pd
+import pytest
+
+RECORDS = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}, {'id': 3, 'name': 'c'}]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """ force a json backend, None is the standard library
+    """
+    def _use(name):
+        monkeypatch.setattr(parsers, 'JSON_BACKENDS', () if name is None else (name,))
+        parsers._json_loads.cache_clear()
+        if name is not None:
+            pytest.importorskip(name)
+    yield _use
+    parsers._json_loads.cache_clear()
+
+
+@pytest.mark.parametrize('name', ['orjson', 'ujson', None])
+def test_every_backend_reads_the_same_document(tmp_path, backend, name):
+    backend(name)
+    document = {'records': RECORDS, 'nested': {'x': 1.5, 'unicode': 'é'}}
+    JsonParser().write(tmp_path / 'a.json', document)
+    assert JsonParser().read(tmp_path / 'a.json') == document
+    assert parsers._json_loads() is (json.loads if name is None else sys.modules[name].loads)
+
+
+def test_a_missing_backend_falls_back_to_the_standard_library(tmp_path, backend, monkeypatch):
+    backend(None)
+    monkeypatch.setitem(sys.modules, 'orjson', None)  # makes importing it fail
+    monkeypatch.setattr(parsers, 'JSON_BACKENDS', ('orjson',))
+    assert parsers._json_loads() is json.loads
+    JsonParser().write(tmp_path / 'a.json', RECORDS)
+    assert JsonParser().read(tmp_path / 'a.json') == RECORDS
+
+
+def test_documents_the_fast_backends_reject_are_read(tmp_path, backend):
+    backend('orjson')
+    (tmp_path / 'a.json').write_text('{"x": NaN}')
+    assert math.isnan(JsonParser().read(tmp_path / 'a.json')['x'])
+    (tmp_path / 'b.json').write_text('{"x": 1.5}')
+    assert JsonParser().read(tmp_path / 'b.json', parse_float=str) == {'x': '1.5'}
+
+
+@pytest.mark.parametrize('suffix', ['jsonl', 'jsonl.gz'])
+def test_json_lines_records_are_streamed(tmp_path, suffix):
+    path = tmp_path / f'a.{suffix}'
+    JsonLinesParser().write(path, iter(RECORDS))
+    records = JsonLinesParser().read(path, records=True)
+    assert isinstance(records, collections.abc.Iterator)
+    assert list(records) == RECORDS
+
+    frame = JsonLinesParser().read(path)
+    assert frame.to_dict('records') == RECORDS
+    chunks = list(JsonLinesParser().read_chunks(path, 2, records=True))
+    assert [len(c) for c in chunks] == [2, 1]
+
+
+def test_json_lines_dataframes_round_trip(tmp_path):
+    frame = pd.DataFrame(RECORDS)
+    JsonLinesParser().write(tmp_path / 'a.jsonl', frame)
+    assert (tmp_path / 'a.jsonl').read_text().count('\n') == 3
+    pd.testing.assert_frame_equal(JsonLinesParser().read(tmp_path / 'a.jsonl'), frame)
+
+
+def test_steps_can_stream_json_lines_records(project):
+    JsonLinesParser().write(project.raw / 'events.jsonl', RECORDS)
+
+    @project.manager.clean(['events.jsonl'], ['names.csv'], read_options={'events.jsonl': {'records': True}})
+    def names(events):
+        return pd.DataFrame({'name': [e['name'] for e in events]})
+
+    project.manager.update_entrypoint(jobs=1)
+    assert pd.read_csv(project.entrypoint / 'names.csv')['name'].tolist() == ['a', 'b', 'c']
@@ -0,0 +1,70 @@
+from {{cookiecutter.package_name}}._build.localcache import LocalCache
+
+import time
+
+import pytest
+
+KB = 1024
+
+
+def _blob(n):
+    return bytes(bytearray([n])) * (4 * KB)  # pickles to a little over 4KB
+
+
+def _set(cache, *keys):
+    for k in keys:
+        cache.set(k, _blob(ord(k[-1])))
+        time.sleep(0.01)  # so every key gets its own access time
+
+
+def test_nothing_is_written_until_the_cache_is_used(tmp_path):
+    cache = LocalCache(tmp_path / 'cache')
+    assert not (tmp_path / 'cache').exists()
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+
+
+def test_least_recently_used_keys_are_evicted(tmp_path):
+    cache = LocalCache(tmp_path, maxbytes=10 * KB)
+    _set(cache, 'a', 'b')
+    assert cache.get('a') == _blob(ord('a'))  # b is now the least recently used
+    time.sleep(0.01)
+    _set(cache, 'c')
+
+    assert cache.has('a') and cache.has('c')
+    assert not cache.has('b')
+    assert len(list((tmp_path / 'blobs').iterdir())) == 2
+
+
+def test_least_frequently_used_keys_are_evicted(tmp_path):
+    cache = LocalCache(tmp_path, maxbytes=10 * KB, policy='lfu')
+    _set(cache, 'a', 'b')
+    for _ in range(3):
+        cache.get('b')
+    cache.get('a')
+    _set(cache, 'c')
+
+    assert cache.has('b') and cache.has('c')
+    assert not cache.has('a')
+
+
+def test_a_value_bigger_than_the_cache_is_kept(tmp_path):
+    cache = LocalCache(tmp_path, maxbytes=KB)
+    _set(cache, 'a', 'b')
+    assert cache.has('b')
+    assert not cache.has('a')
+
+
+def test_identical_values_share_a_blob(tmp_path):
+    cache = LocalCache(tmp_path, maxbytes=10 * KB)
+    cache.set('a', _blob(1))
+    cache.set('b', _blob(1))
+    cache.set('c', _blob(2))
+    assert len(list((tmp_path / 'blobs').iterdir())) == 2
+    cache.delete('a')
+    assert cache.get('b') == _blob(1)
+
+
+def test_unknown_policies_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        LocalCache(tmp_path, policy='fifo')
@@ -0,0 +1,81 @@
+from {{cookiecutter.package_name}}._build import parsers
+
+import json
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _is_mapped(a):
+    """ pandas hands out views so follow the bases down to the memory map
+    """
+    while isinstance(a, np.ndarray):
+        if isinstance(a, np.memmap):
+            return True
+        a = a.base
+    return False
+
+
+@pytest.fixture
+def array():
+    return np.arange(1000, dtype='float64')
+
+
+def test_data_pickles_are_read_onto_the_heap_by_default(tmp_path, array):
+    parser = parsers.PickleParser()
+    parser.write(tmp_path / 'a.data.pkl', {'x': array})
+    loaded = parser.read(tmp_path / 'a.data.pkl')['x']
+    assert not isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, array)
+
+
+def test_data_pickles_can_be_memory_mapped(tmp_path, array):
+    parser = parsers.PickleParser()
+    parser.write(tmp_path / 'a.data.pkl', {'x': array})
+    loaded = parser.read(tmp_path / 'a.data.pkl', mmap_mode='r')['x']
+    assert isinstance(loaded, np.memmap)
+    assert not loaded.flags.writeable
+    np.testing.assert_array_equal(loaded, array)
+
+
+def test_dataframe_blocks_are_memory_mapped(tmp_path):
+    df = pd.DataFrame({'a': np.arange(100), 'b': np.arange(100) * 0.5})
+    parser = parsers.PickleParser()
+    parser.write(tmp_path / 'a.data.pkl', df)
+    loaded = parser.read(tmp_path / 'a.data.pkl', mmap_mode='r')
+    assert _is_mapped(loaded['a'].to_numpy())
+    assert loaded.equals(df)
+
+
+def test_models_are_mapped_copy_on_write(tmp_path, array):
+    parser = parsers.SklearnPklParser()
+    path = tmp_path / 'm.model.pkl'
+    parser.write(path, {'coef': array})
+
+    coef = parser.read(path)['coef']
+    assert isinstance(coef, np.memmap)
+    coef[0] = -1.0  # only changes this process' copy
+    assert parser.read(path)['coef'][0] == 0.0
+
+    heap = parser.read(path, mmap_mode=None)['coef']
+    assert not isinstance(heap, np.memmap)
+    assert json.loads((tmp_path / 'm.metadata.json').read_text())['model-name'] == 'm.model.pkl'
+
+
+def test_rewriting_a_mapped_file_replaces_it(tmp_path, array):
+    parser = parsers.PickleParser()
+    path = tmp_path / 'a.data.pkl'
+    parser.write(path, array)
+    mapped = parser.read(path, mmap_mode='r')
+    parser.write(path, array * 2)
+    np.testing.assert_array_equal(mapped, array)
+    np.testing.assert_array_equal(parser.read(path), array * 2)
+    assert not (tmp_path / 'a.data.pkl.tmp').exists()
+
+
+def test_plain_pickles_can_still_be_read(tmp_path, array):
+    with open(tmp_path / 'a.data.pkl', 'wb') as f:
+        pickle.dump({'x': array}, f)
+    np.testing.assert_array_equal(parsers.PickleParser().read(tmp_path / 'a.data.pkl')['x'], array)
@@ -0,0 +1,53 @@
+from {{cookiecutter.package_name}}._build.modelstore import ModelStore
+
+import os
+import time
+
+KB = 1024
+
+
+def _put(store, folder, fingerprint, nbytes=KB):
+    (folder / f'{fingerprint}.data.pkl').write_bytes(b'x' * nbytes)
+    store.put(fingerprint, folder, [f'{fingerprint}.data.pkl'], step=fingerprint, training_s=1.0)
+    time.sleep(0.01)  # so every entry gets its own mtime
+
+
+def test_restore_links_the_stored_files(tmp_path):
+    models = tmp_path / 'models'
+    models.mkdir()
+    store = ModelStore(tmp_path / 'store')
+    _put(store, models, 'a')
+    os.remove(models / 'a.data.pkl')
+
+    assert store.restore('a', models, ['a.data.pkl'])['step'] == 'a'
+    assert (models / 'a.data.pkl').read_bytes() == b'x' * KB
+    assert store.restore('a', models, ['a.data.pkl', 'other.data.pkl']) is None
+    assert store.restore('missing', models, ['a.data.pkl']) is None
+
+
+def test_least_recently_used_entries_are_pruned(tmp_path):
+    models = tmp_path / 'models'
+    models.mkdir()
+    store = ModelStore(tmp_path / 'store', maxbytes=3.5 * KB)
+    _put(store, models, 'a')
+    _put(store, models, 'b')
+    store.restore('a', models, ['a.data.pkl'])  # b is now the least recently used
+    time.sleep(0.01)
+    _put(store, models, 'c', nbytes=2 * KB)
+
+    assert store.entry('a') is not None and store.entry('c') is not None
+    assert store.entry('b') is None
+    assert not (tmp_path / 'store' / 'b').exists()
+    assert (models / 'b.data.pkl').exists()  # the model itself is left alone
+
+
+def test_the_newest_entry_is_kept_even_if_it_is_over_budget(tmp_path):
+    models = tmp_path / 'models'
+    models.mkdir()
+    store = ModelStore(tmp_path / 'store', maxbytes=KB)
+    _put(store, models, 'a')
+    _put(store, models, 'b', nbytes=4 * KB)
+
+    assert store.entry('a') is None
+    assert store.entry('b') is not None
+    assert ModelStore(tmp_path / 'store').prune(0) == ['b']
@@ -0,0 +1,55 @@
+from {{cookiecutter.package_name}}._build import parsers
+
+import pytest
+
+
+@pytest.fixture
+def registry():
+    return parsers.create_parser_registry()
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('a.csv', parsers.PandasCSVParser),
+    ('A.CSV', parsers.PandasCSVParser),
+    ('sub/folder/a.parquet', parsers.ParquetParser),
+    ('a.jsonl', parsers.JsonLinesParser),
+    ('a.json', parsers.JsonParser),
+    ('a.arrow', parsers.FeatherParser),
+    ('a.data.pkl', parsers.PickleParser),
+    ('a.model.pkl', parsers.SklearnPklParser),
+    ('a.csv.zst', parsers.PandasCSVParser),
+    ('a.model.pkl.gz', parsers.SklearnPklParser),
+])
+def test_lookup_takes_the_longest_suffix(registry, filename, expected):
+    assert type(registry.lookup(filename)) is expected
+
+
+def test_lookup_of_an_unknown_suffix_raises(registry):
+    with pytest.raises(TypeError):
+        registry.lookup('a.xlsx')
+    assert registry.suffix('a.pkl') is None
+
+
+def test_codec_suffixes_need_a_compressible_parser(registry):
+    assert registry.suffix('a.csv.lz4') == 'csv'
+    assert registry.suffix('a.parquet.zst') is None
+
+
+def test_suffixes_are_only_accepted_in_their_folders(registry):
+    assert registry.accepts('a.csv', 'raw')
+    assert not registry.accepts('a.data.pkl', 'raw')
+    assert registry.accepts('a.data.pkl', 'entrypoint')
+    assert not registry.accepts('a.model.pkl', 'entrypoint')
+    assert registry.accepts('a.model.pkl', 'models')
+    assert '*.csv.zst' in registry.patterns('raw')
+    assert not any('pkl' in p for p in registry.patterns('raw'))
+
+
+def test_registering_replaces_a_suffix(registry):
+    parser = parsers.PickleParser()
+    registry.register('.csv', parser)
+    assert registry.lookup('a.csv') is parser
+    with pytest.raises(TypeError):
+        registry.register('txt', object())
+    with pytest.raises(ValueError):
+        registry.register('txt', parser, folders=('somewhere',))
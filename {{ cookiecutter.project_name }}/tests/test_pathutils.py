@@ -0,0 +1,59 @@
+from {{cookiecutter.package_name}}._build import pathutils
+
+import os
+
+import pytest
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for name in ('a.csv', 'B.CSV', 'notes.txt', 'sub/c.csv', 'sub/deeper/d.csv.zst', 'sub/deeper/e.json',
+            '.hidden/f.csv', 'sub/.g.csv'):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+    return tmp_path
+
+
+def _names(paths, root):
+    return sorted(p.relative_to(root).as_posix() for p in paths)
+
+
+def test_build_subpaths_finds_nested_and_hidden_files(tree):
+    assert _names(pathutils.build_subpaths(tree, ['*.csv']), tree) == [
+        '.hidden/f.csv', 'B.CSV', 'a.csv', 'sub/.g.csv', 'sub/c.csv']
+
+
+def test_patterns_match_compressed_suffixes(tree):
+    assert _names(pathutils.build_subpaths(tree, ['*.csv.zst', '*.json']), tree) == [
+        'sub/deeper/d.csv.zst', 'sub/deeper/e.json']
+    assert len(pathutils.build_subpaths(tree)) == 8
+
+
+def test_scan_returns_the_stat_info(tree):
+    scanned = {f.path.name: f for f in pathutils.scan(tree, ('*.txt',))}
+    st = os.stat(tree / 'notes.txt')
+    assert list(scanned) == ['notes.txt']
+    assert scanned['notes.txt'].size == st.st_size
+    assert scanned['notes.txt'].mtime_ns == st.st_mtime_ns
+
+
+def test_scan_does_not_follow_folder_symlinks(tree, tmp_path_factory):
+    outside = tmp_path_factory.mktemp('outside')
+    (outside / 'x.csv').write_text('x')
+    try:
+        os.symlink(outside, tree / 'link', target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pytest.skip('symlinks are not supported here')
+    assert 'x.csv' not in [p.name for p in pathutils.build_subpaths(tree, ['*.csv'])]
+
+
+def test_scanning_a_missing_folder_finds_nothing(tmp_path):
+    assert pathutils.build_subpaths(tmp_path / 'missing') == []
+
+
+def test_compiled_patterns_are_case_insensitive_and_cached():
+    match = pathutils.compile_patterns(('*.csv', '*.json'))
+    assert match is pathutils.compile_patterns(('*.csv', '*.json'))
+    assert match.match('X.CSV') and match.match('y.json')
+    assert not match.match('a.csv.zst')
@@ -0,0 +1,48 @@
+from {{cookiecutter.package_name}}._build import reports
+
+import json
+import os
+
+from click.testing import CliRunner
+
+
+def test_files_with_the_same_name_are_all_referenced(tmp_path, monkeypatch):
+    entrypoint, models = tmp_path / 'entrypoint', tmp_path / 'models'
+    for p in (entrypoint / 'x.csv', entrypoint / 'sub' / 'x.csv', models / 'x.csv', models / 'y.csv', 
+            models / '.hidden' / 'x.csv'):
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text('x')
+    monkeypatch.setattr(reports, 'ENTRYPOINT_DATA_DIR', entrypoint)
+    monkeypatch.setattr(reports, 'MODELS_DIR', models)
+
+    files = reports._data_files()
+    assert sorted(files) == ['entrypoint/sub/x.csv', 'entrypoint/x.csv', 'models/x.csv', 'models/y.csv']
+    cells = [('code', "df = fetch_data('x.csv', 'models')")]
+    assert sorted(reports._referenced_files(cells, files)) == ['entrypoint/sub/x.csv', 'entrypoint/x.csv', 
+        'models/x.csv']
+
+
+def test_unchanged_reports_are_skipped(tmp_path, monkeypatch):
+    notebooks, reports_dir = tmp_path / 'notebooks', tmp_path / 'reports'
+    notebooks.mkdir()
+    (notebooks / 'a.report.ipynb').write_text(json.dumps({'cells': [{'cell_type': 'code', 'source': '1 + 1'}]}))
+    for name, value in (('NOTEBOOKS_DIR', notebooks), ('REPORTS_DIR', reports_dir), 
+            ('REPORTS_MANIFEST_DIR', tmp_path / '.localcache' / 'reports'), 
+            ('ENTRYPOINT_DATA_DIR', tmp_path / 'entrypoint'), ('MODELS_DIR', tmp_path / 'models')):
+        monkeypatch.setattr(reports, name, value)
+    rendered = []
+
+    def _render(filepath, output_path):
+        rendered.append(os.path.basename(filepath))
+        with open(output_path, 'w') as f:
+            f.write('<html></html>')
+        return 0.0
+
+    monkeypatch.setattr(reports, '_render', _render)
+    for _ in range(2):
+        result = CliRunner().invoke(reports.persist_notebooks, ['--jobs', '1'])
+        assert result.exit_code == 0, result.output
+
+    assert rendered == ['a.report.ipynb']
+    assert os.listdir(reports_dir) == ['a.report.html']  # nothing machine specific lands in reports/
+    assert (tmp_path / '.localcache' / 'reports' / '.manifest').exists()
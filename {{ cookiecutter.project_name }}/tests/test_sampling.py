@@ -0,0 +1,34 @@
+from {{cookiecutter.package_name}}._build import sampling
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({'x': np.arange(1000)})
+
+
+def test_samples_are_deterministic_and_keep_the_file_order(frame):
+    first = sampling.sample_data(frame, 100)
+    assert len(first) == 100
+    assert first['x'].is_monotonic_increasing
+    assert first.equals(sampling.sample_data(frame, 100))
+
+
+def test_chunked_samples_match_whole_reads(frame):
+    chunks = [frame.iloc[i:i + 128] for i in range(0, len(frame), 128)]
+    assert sampling.sample_chunks(chunks, 100).equals(sampling.sample_data(frame, 100))
+    assert len(sampling.sample_chunks(iter(chunks), 5000)) == len(frame)
+
+
+def test_fractions_keep_about_that_share_of_rows(frame):
+    assert 50 <= len(sampling.sample_data(frame, 0.1)) <= 150
+    assert len(sampling.sample_data(list(range(1000)), 0.1)) == 100
+
+
+@pytest.mark.parametrize('sample', [0, -1, 0.0, 1.5, True, '10'])
+def test_invalid_samples_are_rejected(sample):
+    with pytest.raises(ValueError):
+        sampling.check_sample(sample)
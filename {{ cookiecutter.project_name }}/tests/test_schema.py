@@ -0,0 +1,90 @@
+from {{cookiecutter.package_name}}._build import instrument
+from {{cookiecutter.package_name}}._build import schema
+from {{cookiecutter.package_name}}._build.parsers import PandasCSVParser, ParquetParser, FeatherParser
+
+import pandas as pd
+import pytest
+
+SCHEMA = {'id': 'int32', 'kind': 'category', 'amount': 'float32', 'day': 'datetime'}
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({'id': [1, 2, 3], 'kind': ['a', 'b', 'a'], 'amount': [1.5, 2.5, 3.5], 
+        'day': ['2020-01-01', '2020-01-02', '2020-01-03'], 'note': ['x', 'y', 'z']})
+
+
+def _check_types(data):
+    assert list(data.columns) == ['id', 'kind', 'amount', 'day']
+    assert str(data['id'].dtype) == 'int32'
+    assert str(data['kind'].dtype) == 'category'
+    assert str(data['amount'].dtype) == 'float32'
+    assert pd.api.types.is_datetime64_any_dtype(data['day'])
+
+
+def test_csv_schemas_read_only_their_columns_with_their_types(tmp_path, frame):
+    frame.to_csv(tmp_path / 'a.csv', index=False)
+    _check_types(PandasCSVParser().read(tmp_path / 'a.csv', schema=SCHEMA))
+    chunks = list(PandasCSVParser().read_chunks(tmp_path / 'a.csv', 2, schema=SCHEMA))
+    assert len(chunks) == 2
+    _check_types(chunks[0])
+
+
+@pytest.mark.parametrize('parser, suffix', [(ParquetParser(), 'parquet'), (FeatherParser(), 'feather')])
+def test_columnar_schemas_are_cast_after_reading(tmp_path, frame, parser, suffix):
+    parser.write(tmp_path / f'a.{suffix}', frame)
+    _check_types(parser.read(tmp_path / f'a.{suffix}', schema=SCHEMA))
+
+
+def test_csv_schemas_use_the_pyarrow_engine_when_they_can():
+    pytest.importorskip('pyarrow')
+    options = schema.csv_options({'schema': SCHEMA, 'sep': ','})
+    assert options['engine'] == 'pyarrow'
+    assert options['usecols'] == list(SCHEMA)
+    assert options['dtype'] == {'id': 'int32', 'kind': 'category', 'amount': 'float32'}
+    assert 'engine' not in schema.csv_options({'schema': SCHEMA, 'skiprows': 1})  # not supported by pyarrow
+    assert 'engine' not in schema.csv_options({'sep': ','})  # untyped reads keep pandas' own inference
+
+
+def test_apply_leaves_matching_columns_alone(frame):
+    typed = schema.apply(frame, {'id': 'int64', 'day': 'datetime', 'missing': 'int8'})
+    assert typed['id'].dtype == frame['id'].dtype
+    assert pd.api.types.is_datetime64_any_dtype(typed['day'])
+    assert schema.apply(frame, None) is frame
+
+
+@pytest.mark.parametrize('bad', [{}, ['id'], {'id': int}, {1: 'int8'}])
+def test_invalid_schemas_are_rejected(bad):
+    with pytest.raises(TypeError):
+        schema.check_schema(bad)
+
+
+def test_schemas_are_checked_when_registering(project):
+    with pytest.raises(ValueError):
+        project.manager.clean(['a.csv'], ['b.csv'], schema={'other.csv': {'id': 'int8'}})
+    with pytest.raises(ValueError):
+        project.manager.clean(['a.json'], ['b.csv'], schema={'a.json': {'id': 'int8'}})
+    with pytest.raises(ValueError):
+        project.manager.clean(['a.csv'], ['b.csv'], engine='dask', schema={'a.csv': {'id': 'int8'}})
+
+
+def test_steps_get_typed_inputs(project, frame):
+    frame.to_csv(project.raw / 'a.csv', index=False)
+    received = []
+
+    @project.manager.clean(['a.csv'], ['b.parquet'], schema={'a.csv': SCHEMA})
+    def typed(a):
+        received.append(a)
+        return a
+
+    project.manager.update_entrypoint(jobs=1)
+    _check_types(received[0])
+
+
+def test_strings_are_only_measured_in_full_when_profiling(tmp_path):
+    frame = pd.DataFrame({'text': pd.Series(['a much longer string than a pointer'] * 1000, dtype=object)})
+    shallow = instrument.StepStats('step')
+    shallow.loaded('a.csv', frame)
+    deep = instrument.StepStats('step', profile_dir=tmp_path)
+    deep.loaded('a.csv', frame)
+    assert shallow.memory_bytes['a.csv'] < deep.memory_bytes['a.csv']
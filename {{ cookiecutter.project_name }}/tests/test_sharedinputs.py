@@ -0,0 +1,86 @@
+from {{cookiecutter.package_name}}._build import parsers
+from {{cookiecutter.package_name}}._build import sharedinputs
+from {{cookiecutter.package_name}}._build.scheduler import Step
+
+import collections
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _step(key, inputs, folder=pathlib.Path('/data'), **options):
+    paths = collections.OrderedDict((name, folder / name) for name in inputs)
+    return Step(key, 0, None, paths, {}, options)
+
+
+def test_only_inputs_read_whole_with_pandas_are_shareable():
+    assert sharedinputs.shareable(_step('a', ['x.csv']), 'x.csv')
+    assert sharedinputs.shareable(_step('a', ['x.csv'], read_options={'y.csv': {'sep': ';'}}), 'x.csv')
+    assert not sharedinputs.shareable(_step('a', ['x.csv'], read_options={'x.csv': {'sep': ';'}}), 'x.csv')
+    assert not sharedinputs.shareable(_step('a', ['x.csv'], engine='polars'), 'x.csv')
+    assert not sharedinputs.shareable(_step('a', ['x.csv'], chunksize=10), 'x.csv')
+
+
+def test_step_files_picks_the_published_inputs_a_step_can_use():
+    files = {'/data/x.csv': '/shm/0.arrow', '/data/y.csv': None}
+    assert sharedinputs.step_files(_step('a', ['x.csv', 'y.csv', 'z.csv']), files) == {'/data/x.csv': '/shm/0.arrow'}
+    assert sharedinputs.step_files(_step('a', ['x.csv'], engine='dask'), files) == {}
+
+
+def test_dump_and_load_round_trip(tmp_path):
+    df = pd.DataFrame({'a': np.arange(5), 'b': list('vwxyz'), 'c': np.linspace(0, 1, 5)})
+    assert sharedinputs.dump(df, tmp_path / 'df.arrow')
+    loaded = sharedinputs.load(tmp_path / 'df.arrow')
+    assert loaded.equals(df)
+    with pytest.raises(ValueError):
+        loaded['a'].to_numpy()[0] = 10  # shared inputs must be copied before changing them
+
+
+def test_dump_refuses_what_arrow_can_not_hold(tmp_path):
+    assert not sharedinputs.dump(pd.DataFrame({'a': [1, 'x', 2.5]}), tmp_path / 'mixed.arrow')
+
+
+def test_only_inputs_of_several_shareable_steps_are_published(tmp_path, monkeypatch):
+    monkeypatch.setattr(sharedinputs, 'SHM_DIR', str(tmp_path / 'shm'))
+    (tmp_path / 'shm').mkdir()
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    for name in ('x.csv', 'y.csv', 'z.csv'):
+        pd.DataFrame({'v': [1, 2]}).to_csv(data_dir / name, index=False)
+
+    steps = collections.OrderedDict((s.key, s) for s in [
+        _step('a', ['x.csv', 'y.csv'], data_dir), _step('b', ['x.csv', 'z.csv'], data_dir), 
+        _step('c', ['y.csv'], data_dir, engine='polars'), 
+        _step('d', ['z.csv'], data_dir, read_options={'z.csv': {'sep': ','}})])
+
+    with sharedinputs.SharedInputs(steps, parsers.create_parser_registry()) as shared:
+        for s in steps.values():
+            shared.publish(s)
+        assert list(shared.files) == [str(data_dir / 'x.csv')]
+        assert sharedinputs.load(shared.files[str(data_dir / 'x.csv')])['v'].tolist() == [1, 2]
+    assert list((tmp_path / 'shm').iterdir()) == []
+
+
+def fit_total(features):
+    return {'total': int(features['v'].sum())}
+
+
+def fit_count(features):
+    return {'count': len(features)}
+
+
+def test_models_train_on_shared_inputs(project, monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(sharedinputs, 'SHM_DIR', str(tmp_path / 'shm'))
+    (tmp_path / 'shm').mkdir()
+    pd.DataFrame({'v': [1, 2, 3]}).to_csv(project.entrypoint / 'features.csv', index=False)
+    project.manager.model(['features.csv'], ['total.model.pkl'])(fit_total)
+    project.manager.model(['features.csv'], ['count.model.pkl'])(fit_count)
+
+    project.manager.update_models(jobs=2, share_inputs=True, use_store=False)
+    read = parsers.SklearnPklParser().read
+    assert read(project.models / 'total.model.pkl') == {'total': 6}
+    assert read(project.models / 'count.model.pkl') == {'count': 3}
+    assert capsys.readouterr().out.count('Sharing features.csv') == 1
+    assert list((tmp_path / 'shm').iterdir()) == []
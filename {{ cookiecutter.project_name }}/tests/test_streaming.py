@@ -0,0 +1,61 @@
+from {{cookiecutter.package_name}}._build.scheduler import BuildError
+
+import pandas as pd
+import pytest
+
+
+def _write_csv(path, **columns):
+    pd.DataFrame(columns).to_csv(path, index=False)
+
+
+def test_the_first_input_is_streamed_in_chunks(project):
+    _write_csv(project.raw / 'big.csv', x=list(range(10)))
+    _write_csv(project.raw / 'lookup.csv', y=[100])
+    seen = []
+
+    @project.manager.clean(['big.csv', 'lookup.csv'], ['out.csv'], chunksize=4)
+    def add(big, lookup):
+        seen.append((len(big), len(lookup)))
+        return big + lookup['y'][0]
+
+    project.manager.update_entrypoint(jobs=1)
+    assert seen == [(4, 1), (4, 1), (2, 1)]
+    assert pd.read_csv(project.entrypoint / 'out.csv')['x'].tolist() == list(range(100, 110))
+
+
+@pytest.mark.parametrize('suffix', ['jsonl', 'parquet', 'feather'])
+def test_chunks_are_appended_to_every_output(project, suffix):
+    _write_csv(project.raw / 'big.csv', x=list(range(7)))
+
+    @project.manager.clean(['big.csv'], ['evens.csv', f'odds.{suffix}'], chunksize=3)
+    def split(big):
+        return big[big['x'] % 2 == 0], big[big['x'] % 2 == 1]
+
+    project.manager.update_entrypoint(jobs=1)
+    odds = project.manager.get_parser(f'odds.{suffix}').read(project.entrypoint / f'odds.{suffix}')
+    assert pd.read_csv(project.entrypoint / 'evens.csv')['x'].tolist() == [0, 2, 4, 6]
+    assert odds['x'].tolist() == [1, 3, 5]
+
+
+def test_an_empty_input_fails_the_step(project):
+    (project.raw / 'big.jsonl').write_text('')
+
+    @project.manager.clean(['big.jsonl'], ['out.csv'], chunksize=2)
+    def same(big):
+        return big
+
+    with pytest.raises(BuildError) as err:
+        project.manager.update_entrypoint(jobs=1)
+    error, = err.value.failures.values()
+    assert 'No chunks' in str(error)
+
+
+@pytest.mark.parametrize('chunksize, raw', [(0, ['a.csv']), (1.5, ['a.csv']), (10, [])])
+def test_chunksize_is_checked_when_registering(project, chunksize, raw):
+    with pytest.raises(ValueError):
+        project.manager.clean(raw, ['b.csv'], chunksize=chunksize)
+
+
+def test_chunksize_can_not_be_combined_with_an_engine(project):
+    with pytest.raises(ValueError):
+        project.manager.clean(['a.csv'], ['b.csv'], chunksize=10, engine='polars')
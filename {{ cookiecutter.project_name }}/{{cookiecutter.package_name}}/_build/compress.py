@@ -0,0 +1,73 @@
+""" Transparent compression for files in the data folder. A file whose name ends in a codec
+suffix (ex. x.csv.zst, x.json.gz or x.data.pkl.lz4) is compressed with that codec and the
+codec suffix is ignored when its parser is looked up.
+
+zstd at level 3 is the default to use. It decompresses about as fast as lz4 at a much better
+ratio and its decompression speed does not depend on the level, so higher levels only cost
+time when writing. gzip is there for files shared with tools that don't read zstd.
+"""
+import gzip
+import importlib
+import io
+import os
+
+CODECS = ('zst', 'lz4', 'gz')
+DEFAULT_LEVELS = {'zst': 3, 'lz4': 0, 'gz': 1}
+_REQUIREMENTS = {'zst': 'zstandard', 'lz4': 'lz4'}
+
+
+def _import(module, codec):
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        requirement = _REQUIREMENTS[codec]
+        raise ImportError(f'.{codec} files require {requirement}. Install it with pip install {requirement}') from None
+
+
+def split(filename):
+    """ Split a filename into its name without the codec suffix and the codec, which is None
+    if the file is not compressed.
+    """
+    filename = str(filename)
+    base, ext = os.path.splitext(filename)
+    codec = ext[1:].lower()
+    if codec in CODECS:
+        return base, codec
+    return filename, None
+
+
+def codec_of(filename):
+    return split(filename)[1]
+
+
+def _open_zstd(filepath, mode, level):
+    try:
+        from compression import zstd  # python >= 3.14
+    except ImportError:
+        zstandard = _import('zstandard', 'zst')
+        if 'w' in mode:
+            return zstandard.open(filepath, mode, cctx=zstandard.ZstdCompressor(level=level))
+        return io.BufferedReader(zstandard.open(filepath, mode))  # peek is needed by joblib
+    return zstd.open(filepath, mode, level=level if 'w' in mode else None)
+
+
+def open_file(filepath, mode='rb', level=None, codec=None, **text_options):
+    """ Open a file, compressed with codec or with the codec of its own suffix if codec is None.
+    level is the compression level when writing, DEFAULT_LEVELS if None. Text modes are
+    decoded with text_options (encoding, newline) as with open.
+    """
+    codec = codec or codec_of(filepath)
+    if codec is None:
+        return open(filepath, mode, **text_options)
+    binary = mode.replace('t', '') if 'b' in mode else mode.replace('t', '') + 'b'
+    level = DEFAULT_LEVELS[codec] if level is None else level
+    if codec == 'gz':
+        f = gzip.open(filepath, binary, compresslevel=level)
+    elif codec == 'lz4':
+        lz4_frame = _import('lz4.frame', 'lz4')
+        f = lz4_frame.open(filepath, binary, compression_level=level)
+    else:
+        f = _open_zstd(filepath, binary, level)
+    if 'b' in mode:
+        return f
+    return io.TextIOWrapper(f, **text_options)
@@ -21,3 +21,13 @@ dotenv.load_dotenv(ROOT_DIR / '.env', verbose=True)
 DROPBOX_ACCESS_TOKEN = os.environ.get('DROPBOX_ACCESS_TOKEN')
 DROPBOX_APP_KEY = os.environ.get('DROPBOX_APP_KEY')
 DROPBOX_APP_SECRET = os.environ.get('DROPBOX_APP_SECRET')
+
+# the max size in bytes of the in-memory cache used by fetch_data
+FETCH_CACHE_MAXBYTES = int(os.environ.get('FETCH_CACHE_MAXBYTES', 1024 ** 3))
+
+# the max size in bytes of data/.localcache and whether to evict least recently (lru) or least frequently (lfu) used keys
+CACHE_MAXBYTES = int(os.environ.get('CACHE_MAXBYTES', 5 * 1024 ** 3))
+CACHE_EVICTION_POLICY = os.environ.get('CACHE_EVICTION_POLICY', 'lru')
+
+# the max size in bytes of the trained models kept in data/.localcache/model-store
+MODEL_STORE_MAXBYTES = int(os.environ.get('MODEL_STORE_MAXBYTES', 10 * 1024 ** 3))
@@ -1,89 +1,40 @@
 """ Base classes to work with the data folder
 """
 from .config import RAW_DATA_DIR, ENTRYPOINT_DATA_DIR,\
-    CACHE_DIR, MODELS_DIR
+    CACHE_DIR, MODELS_DIR, FETCH_CACHE_MAXBYTES, CACHE_MAXBYTES, CACHE_EVICTION_POLICY, MODEL_STORE_MAXBYTES
 import pathlib
-from flask_caching import Cache
+from .localcache import LocalCache
 from . import pathutils
+from .parsers import FOLDERS, Parser, JsonParser, JsonLinesParser, PandasCSVParser, ParquetParser,\
+    FeatherParser, PickleParser, SklearnPklParser, create_parser_registry
+from .manifest import BuildManifest, code_hash
+from .memcache import MemoryCache, approximate_size, protect
+from . import scheduler
+from . import instrument
+from .engines import get_engine
+from . import modelstore
+from . import sharedinputs
+from . import schema as schemas
+from . import sampling
 
 import sys
 import collections
+import collections.abc
 import click 
 import functools 
 import inspect
 import os
-import json 
-import csv
 import shutil
-import pickle
-import joblib
+import concurrent.futures
+import contextlib
+import copy
 import datetime
-import pandas as pd 
-import sklearn
 
-
-class Parser(object):
-
-    def read(self, filepath):
-        raise NotImplementedError 
-
-    def write(self, filepath, data):
-        raise NotImplementedError
-
-
-class JsonParser(Parser):
-
-    def read(self, filepath):
-        with open(filepath, 'r') as f:
-            data = json.load(f)
-        return data 
-
-    def write(self, filepath, data):
-        pathutils.touch_filepath(filepath)
-        with open(filepath, 'w') as f:
-            json.dump(data, f)
-
-
-class PandasCSVParser(Parser):
-
-    def read(self, filepath):
-        return pd.read_csv(filepath)
-    
-    def write(self, filepath, data):
-        pathutils.touch_filepath(filepath)
-        if not isinstance(data, pd.DataFrame):
-            data = pd.DataFrame.from_records(data)
-        data.to_csv(filepath, index=False)
-
-
-class PickleParser(Parser):
-
-    def read(self, filepath):
-        return pickle.load(open(filepath, 'rb'))
-
-    def write(self, filepath, data):
-        pathutils.touch_filepath(filepath)
-        pickle.dump(data, open(filepath, 'wb'))
-
-
-class SklearnPklParser(Parser):
-
-    def read(self, filepath):
-        return joblib.load(open(filepath, 'rb'))
-
-    def write(self, filepath, model):
-        pathutils.touch_filepath(filepath)
-        joblib.dump(model, open(filepath, 'wb'))
-        # print(filepath)
-        # NOTE this metadata will only really work with sklearn built ins
-        # other parsers need to be implemented for other libraries. 
-        # This API should be extended and these classes globally registered...
-        fpath = str(filepath).replace('model.pkl', 'metadata.json')
-        with open(fpath, 'w') as f:
-            json.dump({
-                'sklearn-version': sklearn.__version__, 
-                'model-name': str(filepath).split('/')[-1]
-            }, f)
+BUILD_STATS_DIR = CACHE_DIR / 'build-stats'
+MODEL_STORE_DIR = CACHE_DIR / 'model-store'
+SAMPLE_ENTRYPOINT_DIR = CACHE_DIR / 'sample-entrypoint'
+SAMPLE_MODELS_DIR = CACHE_DIR / 'sample-models'
+IO_JOBS = 4
 
 
 class _DataManager(object):
@@ -92,12 +43,7 @@ class _DataManager(object):
     """
     _processor_registry = collections.OrderedDict()
     _modeler_registry = collections.OrderedDict()
-    _parsers = {
-        'json': JsonParser(), 
-        'csv': PandasCSVParser(), 
-        'model.pkl': SklearnPklParser(), 
-        'data.pkl': PickleParser()
-    }
+    _parsers = create_parser_registry()
     
     def __init__(self, raw_folder=None, entrypoint_folder=None, models_folder=None):
         self._raw_folder = raw_folder or RAW_DATA_DIR 
@@ -105,23 +51,59 @@ class _DataManager(object):
         self._models_folder = models_folder or MODELS_DIR 
 
 
-    def _load_data(self, filenames, folder):
-        """ loads the input data in filename order
+    def _load_data(self, inputs, read_options=None, stats=None, io_jobs=1, engine=None, shared=None, samples=None):
+        """ loads the input data in filename order. inputs maps each registered filename 
+        to its path and read_options maps a filename to extra kwargs for its parser. Up to 
+        io_jobs files are parsed at the same time on threads. engine names the engines.Engine 
+        that reads the files, None is pandas. shared maps input paths to the arrow files they 
+        were published to by a sharedinputs.SharedInputs, these are memory mapped instead. samples 
+        maps input filenames to a sample of rows (see sampling) to read instead of the whole file.
+        """
+        read_options = read_options or {}
+        shared = shared or {}
+        samples = samples or {}
+        stats = stats or instrument.StepStats(None)
+        engine = get_engine(engine)
+
+        def _read(item):
+            name, f = item
+            sample = samples.get(name)
+            with stats.reading(name):
+                if shared.get(str(f)):
+                    data = sharedinputs.load(shared[str(f)])
+                elif os.path.isdir(f):  # a folder partition
+                    data = _read_folder(f, self._parsers, 'raw', 
+                        lambda p, parser: parser.read(p, **read_options.get(name, {})))
+                    data = data if sample is None else sampling.sample_data(data, sample)
+                elif sample is not None:
+                    data = engine.read_sample(self._parsers, f, sample, **read_options.get(name, {}))
+                else:
+                    data = engine.read(self._parsers, f, **read_options.get(name, {}))
+            return data
+
+        with stats.loading():
+            loaded = _map_io(_read, list(inputs.items()), io_jobs)
+        for name, data in zip(inputs, loaded):  # measured outside the read times
+            stats.loaded(name, data)
+        return loaded
+
+
+    def _write_data(self, outputs, *data, write_options=None, stats=None, io_jobs=1, engine=None):
+        """ writes the cleaned data in filename order. outputs maps each registered filename to 
+        its path and write_options maps a filename to extra kwargs for its parser. Up to io_jobs 
+        files are written at the same time on threads. Lazy data from the engine is computed 
+        as it is written.
         """
-        data = []
-        for f in filenames:
-            parser = self.get_parser(f)
-            d = parser.read(folder / f)
-            data.append(d)
-        return data 
+        write_options = write_options or {}
+        stats = stats or instrument.StepStats(None)
+        engine = get_engine(engine)
 
+        def _write(item):
+            (name, f), d = item
+            engine.write(self._parsers, f, d, **write_options.get(name, {}))
 
-    def _write_data(self, filenames, folder, *data):
-        """ writes the cleaned data in filename order
-        """
-        for i, f in enumerate(filenames):
-            parser = self.get_parser(f)
-            parser.write(folder / f, data[i])
+        with stats.writing():
+            _map_io(_write, list(zip(outputs.items(), data)), io_jobs)
 
 
     def _check_output(self, data, filenames):
@@ -139,22 +121,221 @@ class _DataManager(object):
                     a tuple of length ({len(filenames)}) was expected''')
 
 
-    def _do_process(self, registry, source_folder, target_folder):
-        """ blows through a registry, pulls in material from source folder, does calcs and 
-        writes outputs to a target folder.
+    def _step_key(self, func):
+        """ a stable name for a registered function used to key the build manifest
+        """
+        return f'{func.__module__}.{func.__qualname__}'
+
+
+    def _run_step(self, step, profile_dir=None, staging_folder=None, target_folder=None, io_jobs=1, shared=None, 
+        sample=None):
+        """ loads the inputs of a single step, calls the registered function and writes
+        its outputs. This runs inside a worker when the build is parallel. Returns the 
+        step's instrumentation stats.
+
+        If a staging_folder is given the outputs are written below it and only moved into 
+        the target_folder once every output was written, so a failing step leaves the 
+        outputs of its last successful run in place. io_jobs is the number of inputs or 
+        outputs read or written at the same time. shared maps input paths to shared arrow files 
+        and sample is the sample of rows to read from each input. Inputs written by an upstream step 
+        to the target_folder were sampled already and are read whole.
+        """
+        stats = instrument.StepStats(step.key, profile_dir)
+        samples = {}
+        if sample is not None:
+            samples = {name: sample for name, p in step.inputs.items() 
+                if target_folder is None or p != pathlib.Path(target_folder) / name}
+        if staging_folder is None:
+            self._execute_step(step, stats, io_jobs, shared, samples)
+            return stats.finish(step.inputs, step.outputs)
+
+        stage = pathlib.Path(staging_folder) / step.key
+        shutil.rmtree(stage, ignore_errors=True)
+        staged = copy.copy(step)
+        staged.outputs = collections.OrderedDict((name, stage / name) for name in step.outputs)
+        try:
+            self._execute_step(staged, stats, io_jobs, shared, samples)
+            pathutils.commit_folder(stage, target_folder)
+        finally:
+            shutil.rmtree(stage, ignore_errors=True)
+        return stats.finish(step.inputs, step.outputs)
+
+
+    def _execute_step(self, step, stats, io_jobs=1, shared=None, samples=None):
+        if step.options.get('chunksize') and not samples:  # a sample is passed as a single chunk
+            return self._run_streaming_step(step, stats, io_jobs)
+
+        engine = step.options.get('engine')
+        shared = sharedinputs.step_files(step, shared or {})  # steps with their own read options read the file
+        input_data = self._load_data(step.inputs, step.options.get('read_options'), stats, io_jobs, engine, 
+            shared, samples)
+        if step.options.get('partition'):
+            input_data[0] = _with_partition_column(input_data[0], *step.options['partition'])
+        processed_data = stats.call(step.func, *input_data)
+        # print(processed_data)
+        self._check_output(processed_data, step.outputs)
+        if not isinstance(processed_data, tuple):
+            processed_data = (processed_data,)    
+        self._write_data(step.outputs, *processed_data, write_options=step.options.get('write_options'), 
+            stats=stats, io_jobs=io_jobs, engine=engine)
+
+
+    def _run_streaming_step(self, step, stats, io_jobs=1):
+        """ streams the first input of a step in chunks and calls the registered function once 
+        per chunk. Any other inputs are loaded whole and passed to every call. Each returned chunk 
+        is appended to its output so only one chunk is held in memory at a time.
         """
+        read_options = step.options.get('read_options', {})
+        items = list(step.inputs.items())
+        first, first_path = items[0]
+        others = collections.OrderedDict(items[1:])
+        chunks = self.get_parser(first_path).read_chunks(first_path, step.options['chunksize'], 
+            **read_options.get(first, {}))
+        other_data = self._load_data(others, read_options, stats, io_jobs)
+
+        with contextlib.ExitStack() as stack:
+            write_options = step.options.get('write_options', {})
+            writers = [stack.enter_context(self.get_parser(f).chunk_writer(f, **write_options.get(name, {}))) 
+                for name, f in step.outputs.items()]
+            for chunk in stats.iter_reads(first, chunks):
+                processed_data = stats.call(step.func, chunk, *other_data)
+                self._check_output(processed_data, step.outputs)
+                if not isinstance(processed_data, tuple):
+                    processed_data = (processed_data,)
+                with stats.writing():
+                    for writer, d in zip(writers, processed_data):
+                        writer.write(d)
+
+        if writers and writers[0].chunks == 0:
+            raise ValueError(f'No chunks were read from {first_path}')
+
+
+    def _do_process(self, registry, source_folder, target_folder, force=False, jobs=1, executor='process', 
+        profile=False, scanned=None, io_jobs=1, store=None, share_inputs=False, sample=None, only=None):
+        """ blows through a registry, pulls in material from source folder, does calcs and 
+        writes outputs to a target folder. Steps are run in dependency order on a pool of jobs 
+        workers. Steps whose code, inputs and outputs are unchanged since the last build are 
+        skipped unless force is set.
+
+        The timings of every step that ran are written as json lines to 
+        data/.localcache/build-stats/<target>.jsonl and summarized at the end. With profile 
+        each step is run under cProfile and its stats dumped to build-stats/profiles/<target>/. 
+        scanned is an optional list of ScannedFiles whose stat info the manifest can reuse. 
+        io_jobs limits how many inputs or outputs of a step are read or written at once. 
+
+        If a modelstore.ModelStore is given steps that are not fresh are looked up in it by the 
+        fingerprint of their code, input hashes and library versions and restored instead of run 
+        (unless force is set). Every step that runs is added to the store. 
 
-        for func, fnames in registry.items():
-            input_filenames, output_filenames = fnames  
-            input_data = self._load_data(input_filenames, source_folder)
-            processed_data = func(*input_data)
-            # print(processed_data)
-            self._check_output(processed_data, output_filenames)
-            if not isinstance(processed_data, tuple):
-                processed_data = (processed_data,)    
-            self._write_data(output_filenames, target_folder, *processed_data)
+        With share_inputs and a process pool an input read by several steps is parsed once here 
+        and memory mapped by the workers, see sharedinputs.
+
+        sample reads a sample of the rows of every source input, see sampling. only is a list of registered 
+        functions (see _select_steps) to run along with the steps they depend on.
+        """
+        manifest = BuildManifest(target_folder)
+        manifest.seed(scanned or [])
+        steps = scheduler.build_graph(registry, source_folder, target_folder, key=self._step_key)
+        if only:
+            steps = scheduler.upstream_of(steps, self._select_steps(steps, only))
+        name = pathlib.Path(target_folder).name
+        report = instrument.BuildReport(BUILD_STATS_DIR / f'{name}.jsonl')
+        profile_dir = BUILD_STATS_DIR / 'profiles' / name if profile else None
+        staging_folder = _staging_folder(target_folder)
+        shutil.rmtree(staging_folder, ignore_errors=True)  # left behind if a build was killed
+
+        def _code(step):
+            options = {k: v for k, v in step.options.items() if v}  # unset options don't change the hash
+            return code_hash(step.func, list(step.inputs), list(step.outputs), options)
+
+        versions = modelstore.library_versions() if store is not None else None
+        reused = []
+
+        def _fingerprint(step):
+            hashes = {name: manifest.fingerprint(p)['sha256'] for name, p in step.inputs.items()}
+            return modelstore.model_fingerprint(_code(step), hashes, versions)
+
+        def _metadata_files(step):
+            names = (self.get_parser(name).metadata_filename(name) for name in step.outputs)
+            return [n for n in names if n is not None]
+
+        def _committed(step):
+            for f in step.outputs.values():
+                _fetch_cache.invalidate(f)
+            manifest.record(step.key, _code(step), step.inputs, step.outputs)
+            manifest.save()  # save as we go so finished steps are kept if a later one fails
+
+        def _skip(step):
+            if not force and manifest.is_fresh(step.key, _code(step), step.inputs, step.outputs):
+                print(f'Skipping {step.key}... code, inputs and outputs are unchanged')
+                return True
+            if store is not None and not force:
+                try:
+                    entry = store.restore(_fingerprint(step), target_folder, step.outputs)
+                except FileNotFoundError:  # a missing input, the step is run and fails like any other
+                    entry = None
+                if entry is not None:
+                    print(f'Reusing {step.key} from the model store... saved {entry["training_s"]:.1f}s of training')
+                    for m in _metadata_files(step):
+                        modelstore.update_metadata(pathlib.Path(target_folder) / m, **{'reused-from-store': True,
+                            'reused-at': datetime.datetime.now().isoformat(timespec='seconds')})
+                    _committed(step)
+                    reused.append(entry['training_s'])
+                    return True
+            print(f'Running {step.key}...')
+            shared.publish(step)
+            return False
+
+        def _on_success(step, result):
+            if store is not None:
+                fingerprint = _fingerprint(step)
+                metadata = _metadata_files(step)
+                for m in metadata:
+                    modelstore.update_metadata(pathlib.Path(target_folder) / m, **{'fingerprint': fingerprint, 
+                        'training-duration-s': result['func_wall_s'], 'library-versions': versions, 
+                        'reused-from-store': False})
+                store.put(fingerprint, target_folder, list(step.outputs) + metadata, 
+                    step=step.key, training_s=result['func_wall_s'])
+            _committed(step)
+            report.add(result)
+
+        share_inputs = share_inputs and jobs > 1 and executor == 'process'  # threads already share memory
+        shared = sharedinputs.SharedInputs(steps if share_inputs else {}, self._parsers)
+        try:
+            # shared.files is filled in by _skip and sent along with each step as it is submitted
+            target = functools.partial(self._run_step, profile_dir=profile_dir, 
+                staging_folder=staging_folder, target_folder=target_folder, io_jobs=io_jobs, 
+                shared=shared.files, sample=sample)
+            scheduler.run(steps, target, jobs=jobs, executor=executor, skip=_skip, on_success=_on_success)
+        finally:
+            shared.close()
+            shutil.rmtree(staging_folder, ignore_errors=True)
+            if not only:  # steps that were left out are still registered
+                manifest.prune(steps)
+            manifest.save()
+            if report.steps:
+                print(report.summary())
+            if reused:
+                print(f'{len(reused)} models were reused from the model store, saving {sum(reused):.1f}s of training')
+            if profile_dir is not None and report.steps:
+                print(f'profiles are in {profile_dir}. View one with python -m pstats <file>')
             
 
+    def _select_steps(self, steps, only):
+        """ the keys of the steps of the registered functions named in only. A function can be given 
+        by its name, its full key (module.name) or a single partition of it (module.name[date=2020-01-01]).
+        """
+        only = [only] if isinstance(only, str) else list(only)
+        selected = []
+        for name in only:
+            matches = [k for k in steps if name in (k, k.split('[')[0], k.split('[')[0].rsplit('.', 1)[-1])]
+            if not matches:
+                names = sorted({k.split('[')[0] for k in steps})
+                raise ValueError(f'No registered method named {name}. Use any of {names}')
+            selected.extend(matches)
+        return selected
+
+
     def _check_argspec_conditions(self, func, filenames):
         """ helper that checks the argspec of a function and assures we only have 
         args and that 
@@ -176,66 +357,174 @@ class _DataManager(object):
     def available_entrypoints(self):
         """ Return a list of posix paths from the entrypoint folder.
         """
-        return pathutils.build_subpaths(self._entrypoint_folder, accept=['*.csv', '*.json', '.data.pkl'])
+        return pathutils.build_subpaths(self._entrypoint_folder, accept=self._parsers.patterns('entrypoint'))
         
     
     def available_models(self):
         """ Return a list of posix paths from the models folder
         """
-        return pathutils.build_subpaths(self._models_folder, accept=['*.csv', '*.json', '.data.pkl', '.model.pkl'])
+        return pathutils.build_subpaths(self._models_folder, accept=self._parsers.patterns('models'))
         
 
     def available_raw_data(self):
         """ Return a list of posix paths from the raw folder
         """
-        return pathutils.build_subpaths(self._raw_folder, accept=['*.csv', '*.json'])
+        return pathutils.build_subpaths(self._raw_folder, accept=self._parsers.patterns('raw'))
+
+
+    def _scan_raw_data(self):
+        """ map the path of each raw file relative to raw/ to the ScannedFile holding its stat info
+        """
+        files = pathutils.scan(self._raw_folder, accept=self._parsers.patterns('raw'))
+        return {f.path.relative_to(self._raw_folder).as_posix(): f for f in files}
     
 
     def get_parser(self, filename):
-        """ a helper to grab the parser by file extension.
+        """ a helper to grab the parser by file extension. The longest registered suffix wins.
         """
-        if str(filename).endswith('json'):
-            return self._parsers['json']
-        
-        elif str(filename).endswith('csv'):
-            return self._parsers['csv']
+        return self._parsers.lookup(filename)
 
-        elif str(filename).endswith('model.pkl'):
-            return self._parsers['model.pkl']
 
-        elif str(filename).endswith('data.pkl'):
-            return self._parsers['data.pkl']
-        
-        else:
-            raise TypeError('Parser extension not found')
+    def register_parser(self, suffix, parser, folders=FOLDERS):
+        """ Register a Parser instance for a file suffix (ex. 'tsv' or 'xgb.json') so it can be used 
+        as an input or output of registered methods and fetched with fetch_data. folders limits which 
+        of raw, entrypoint and models the suffix is discovered in. Registering an existing suffix 
+        replaces its parser. Default options for every read and write can be set on the parser, 
+        ex. PandasCSVParser(read_options={'sep': '\\t'}, write_options={'sep': '\\t'}) 
+        """
+        self._parsers.register(suffix, parser, folders=folders)
 
 
-    def clean(self, raw_filenames=[], cleaned_filenames=[]):
+    def _check_read_options(self, read_options, filenames):
+        """ read_options can only be given for registered input files
+        """
+        unknown = set(read_options or {}) - set(filenames)
+        if unknown:
+            raise ValueError(f'read_options given for files that are not inputs: {sorted(unknown)}')
+
+
+    def _check_write_options(self, write_options, filenames):
+        """ write_options can only be given for registered output files
+        """
+        unknown = set(write_options or {}) - set(filenames)
+        if unknown:
+            raise ValueError(f'write_options given for files that are not outputs: {sorted(unknown)}')
+
+
+    def _check_schema(self, schema, filenames, engine=None):
+        """ a schema can only be given for registered inputs read by a typed parser with pandas
+        """
+        if not schema:
+            return
+        unknown = set(schema) - set(filenames)
+        if unknown:
+            raise ValueError(f'schema given for files that are not inputs: {sorted(unknown)}')
+        if _engine_option(engine) is not None:
+            raise ValueError('schema is applied by the pandas parsers, pass the lazy engine its own types in read_options')
+        for f, s in schema.items():
+            if not str(f).endswith('/') and not self.get_parser(f).typed:  # folder partitions hold any files
+                raise ValueError(f'{f} has no parser that supports a schema, use csv, parquet or feather')
+            schemas.check_schema(s)
+
+
+    def _check_partitions(self, input_filenames, output_filenames, chunksize=None, engine=None):
+        """ only the first input can be partitioned and then every output must be partitioned too.
+        """
+        if any(pathutils.is_partitioned(f) for f in input_filenames[1:]):
+            raise ValueError('Only the first input of a registered method can be partitioned')
+        if not input_filenames or not pathutils.is_partitioned(input_filenames[0]):
+            if any(pathutils.is_partitioned(f) for f in output_filenames):
+                raise ValueError('Partitioned outputs require a partitioned first input')
+            return
+        unpartitioned = [f for f in output_filenames if not pathutils.is_partitioned(f)]
+        if unpartitioned:
+            raise ValueError(f'Every output of a partitioned method needs a * for the partition: {unpartitioned}')
+        for f in [input_filenames[0]] + list(output_filenames):
+            pathutils.check_partition_pattern(f)
+        if any(str(f).endswith('/') for f in output_filenames):
+            raise ValueError('Each partition of an output is a single file, ex. events/date=*/events.parquet')
+        if chunksize is not None or _engine_option(engine) is not None:
+            raise ValueError('Partitioned inputs are read whole with pandas and can not be combined with chunksize or engine')
+
+
+    def _check_engine(self, engine, chunksize=None):
+        get_engine(engine)  # raises a ValueError for unknown engines
+        if chunksize is not None and _engine_option(engine) is not None:
+            raise ValueError('chunksize streams pandas chunks and can not be combined with a lazy engine')
+
+
+    def clean(self, raw_filenames=[], cleaned_filenames=[], read_options=None, chunksize=None, engine=None, 
+        write_options=None, schema=None):
         """ registers a user defined cleaning method. When the process method 
         is executed on the data_manager it will read files in from raw data 
         and execute each method to create output data files in entrypoint to be 
-        used for analysis
+        used for analysis. read_options optionally maps an input filename to extra 
+        kwargs for its parser, ex. {'a.parquet': {'columns': ['x'], 'filters': [('x', '>', 0)]}}
+        and write_options does the same for outputs, ex. {'b.csv.zst': {'compression_level': 9}}
+
+        If chunksize is given the method is run in streaming mode. The first raw file is read 
+        chunksize rows at a time and the method is called once per chunk with any other raw files 
+        loaded whole. Each returned DataFrame is appended to its output file, so the method should 
+        only do row-wise work (filtering, parsing, joining a chunk to a small lookup table).
+        Streaming works for csv, parquet and feather files.
+
+        engine='polars-lazy' or engine='dask' passes tabular inputs as polars LazyFrames or dask 
+        DataFrames instead. Nothing is read until the returned frames are written, which is done 
+        out of core on all cores, so inputs don't have to fit in memory. read_options are then 
+        passed to the engine's reader (ex. polars.scan_csv or dask.dataframe.read_csv). 
+
+        The first raw file can be a partitioned dataset given as a hive style folder pattern 
+        (ex. 'events/date=*/', every file in a partition is read and concatenated) or a file glob 
+        (ex. 'events/*.csv'). The method is then run once per partition, with the partition 
+        value added as a column for hive style folders, and each output must have a * that is 
+        replaced by the partition (ex. 'events/date=*/events.parquet'). Each partition is 
+        tracked on its own so only new or changed partitions are cleaned on the next build.
+
+        schema optionally maps an input filename to the columns to read and their types, ex. 
+        {'a.csv': {'id': 'int32', 'kind': 'category', 'day': 'datetime'}}. Only those columns are 
+        read and they are parsed straight into these types, see the schema module.
         """
         assert len(raw_filenames) >= 1 or len(cleaned_filenames) >= 1, 'filenames must be >= 1'
+        self._check_read_options(read_options, raw_filenames)
+        self._check_write_options(write_options, cleaned_filenames)
+        self._check_schema(schema, raw_filenames, engine)
+        if chunksize is not None and (not isinstance(chunksize, int) or chunksize < 1 or len(raw_filenames) == 0):
+            raise ValueError('chunksize must be a positive int and requires at least one raw file')
+        self._check_engine(engine, chunksize)
+        self._check_partitions(raw_filenames, cleaned_filenames, chunksize, engine)
         def _wrapper(func):
             self._check_argspec_conditions(func, raw_filenames)
-            self._processor_registry[func] = (raw_filenames, cleaned_filenames)
+            self._processor_registry[func] = (raw_filenames, cleaned_filenames, 
+                {'read_options': _with_schema(read_options, schema), 'write_options': write_options or {}, 
+                'chunksize': chunksize, 'engine': _engine_option(engine)})
+            return func  # keep the module level name so the function can be sent to worker processes
         return _wrapper
 
 
-    def model(self, entrypoint_filenames=[], model_filenames=[]):
+    def model(self, entrypoint_filenames=[], model_filenames=[], read_options=None, engine=None, 
+        write_options=None, schema=None):
         """ registers a user defined modeling mdethod. When the method is executed 
         on the data manager it will read files from entrypoint/ and execute each method 
-        to create output data files. 
+        to create output data files. read_options, write_options, engine and schema work the same as for clean.
         """
         assert len(entrypoint_filenames) >= 1 or len(model_filenames) >= 1, 'filenames must be >= 1'
+        self._check_read_options(read_options, entrypoint_filenames)
+        self._check_write_options(write_options, model_filenames)
+        self._check_engine(engine)
+        self._check_schema(schema, entrypoint_filenames, engine)
+        if any(pathutils.is_partitioned(f) for f in list(entrypoint_filenames) + list(model_filenames)):
+            raise ValueError('Partitioned datasets can only be registered with clean')
         def _wrapper(func):
             self._check_argspec_conditions(func, entrypoint_filenames)
-            self._modeler_registry[func] = (entrypoint_filenames, model_filenames)
+            self._modeler_registry[func] = (entrypoint_filenames, model_filenames, 
+                {'read_options': _with_schema(read_options, schema), 'write_options': write_options or {}, 
+                'chunksize': None, 'engine': _engine_option(engine)})
+            return func
         return _wrapper
 
 
-    def update_entrypoint(self):
+    def update_entrypoint(self, force=False, jobs=1, executor='process', profile=False, io_jobs=IO_JOBS, 
+        sample=None, only=None):
         """ Create or update the entrypoint data by executing all the registered 
         cleaning methods. This is an update or create operation. 
 
@@ -245,8 +534,8 @@ class _DataManager(object):
         3. No kwargs... the script should be self contained 
 
         During an update if any files in raw/ are not included in the cleaning script
-        or no cleaning functions were registered then it simply copies the raw 
-        files into entrypoint. We assume in this case that the cleaning code is not registered
+        or no cleaning functions were registered then it simply links the raw 
+        files into entrypoint (hardlinks, or copies if the filesystem can't link them). We assume in this case that the cleaning code is not registered
         and only exists in the project notebook files and dynamically via the .localcache 
 
         For example... for raw/a.csv raw/b.csv raw/c.csv  
@@ -259,55 +548,101 @@ class _DataManager(object):
         
         For simplicity we only handle csv and json. Pretty much all data can be represented in either
         of these formats.
-        """
 
-        raw_list = self.available_raw_data()
-        if len(raw_list) == 0: # no files in raw data
+        A cleaning method is skipped if its source code, raw inputs and entrypoint outputs have not 
+        changed since the last build. Pass force=True to rerun everything.
+
+        If a cleaning method reads a file that is not in raw/ but is written by another cleaning method 
+        it reads that file from entrypoint/ after the other method has run. Methods that do not depend 
+        on each other are run concurrently on a pool of jobs workers and the inputs and outputs of each 
+        method are read and written io_jobs at a time on threads.
+
+        Each method writes its outputs to a staging folder and they are only moved into entrypoint 
+        once all of them were written. If a method fails the outputs of every other method are kept 
+        and the failed method's outputs from its last successful run are left untouched.
+
+        To try out a change quickly pass sample, a number of rows (ex. 10000) or a fraction of them 
+        (ex. 0.01). Every method is then run on a deterministic sample of its raw files and writes to 
+        data/.localcache/sample-entrypoint instead of entrypoint. only names registered methods to run 
+        (along with the methods they depend on) instead of all of them.
+        """
+        sampling.check_sample(sample)
+        raw_files = self._scan_raw_data()
+        if len(raw_files) == 0: # no files in raw data
             return 
 
+        if sample is not None:
+            if len(self._processor_registry) == 0:
+                print('No registered cleaning methods found... nothing to sample')
+                return
+            self._do_process(self._processor_registry, self._raw_folder, SAMPLE_ENTRYPOINT_DIR, force=True, 
+                jobs=jobs, executor=executor, profile=profile, scanned=raw_files.values(), io_jobs=io_jobs, 
+                sample=sample, only=only)
+            print(f'Sampled outputs are in {SAMPLE_ENTRYPOINT_DIR}')
+            return
+
         if len(self._processor_registry) == 0: # no registered cleaning methods - just move everything over
-            print('No registered cleaning methods found... copying over raw data')
-            shutil.rmtree(self._entrypoint_folder)   # flush and copy
-            shutil.copytree(self._raw_folder, self._entrypoint_folder)
-            gk = pathlib.Path(self._entrypoint_folder) / '.gitkeep'
-            gk.touch()
+            print('No registered cleaning methods found... linking over raw data')
+            self._link_raw_data(raw_files, raw_files, force)
+            for p in self.available_entrypoints():  # entrypoint mirrors raw so drop anything that was removed
+                if p.relative_to(self._entrypoint_folder).as_posix() not in raw_files:
+                    p.unlink()
+                    _fetch_cache.invalidate(p)
             return
 
-        try:
-            raw_fnames = []
-            for p in raw_list: 
-                _, after = pathutils.path_splitter(str(p), after='raw')
-                raw_fnames.append(after)
-            
-            raw_set = set(raw_fnames)  # all the raw files
-            s = set()  # all the raw files being processed
-            for func, fnames in self._processor_registry.items():
-                raw, _ = fnames 
-                for r in raw:
-                    s.add(r)
-
-            diff = list(raw_set - s)  # diff are the raw files that aren't being cleaned... we can transfer these
-            print('Raw files not being cleaned: ', diff)
-            for d in diff:
-                d_src_path = self._raw_folder / d  
-                d_dest_path = self._entrypoint_folder / d
-                shutil.copy2(d_src_path, d_dest_path)
-
-            self._do_process(self._processor_registry, self._raw_folder, self._entrypoint_folder)
-        
-        except Exception as err:
-            shutil.rmtree(self._entrypoint_folder)
-            os.makedirs(self._entrypoint_folder)
-            gk = pathlib.Path(self._entrypoint_folder ) / '.gitkeep'
-            gk.touch()
-            raise  
+        raw_set = set(raw_files)  # all the raw files
+        s = set()  # all the raw files being processed
+        patterns = []  # partitioned raw inputs
+        for func, fnames in self._processor_registry.items():
+            raw, _, _ = fnames 
+            for r in raw:
+                if pathutils.is_partitioned(r):
+                    patterns.append(r)
+                s.add(r)
+
+        # diff are the raw files that aren't being cleaned... we can transfer these
+        diff = [f for f in raw_set - s if not any(pathutils.in_partition(f, p) for p in patterns)]
+        print('Raw files not being cleaned: ', diff)
+        self._link_raw_data(diff, raw_files, force)
+
+        # outputs are staged and committed per step so a failure keeps every other step's outputs
+        self._do_process(self._processor_registry, self._raw_folder, self._entrypoint_folder, 
+            force=force, jobs=jobs, executor=executor, profile=profile, scanned=raw_files.values(), 
+            io_jobs=io_jobs, only=only)
+
+
+    def _link_raw_data(self, filenames, raw_files, force=False):
+        """ hardlink raw files into entrypoint unless they are already there. raw_files maps 
+        each raw filename to its ScannedFile.
+        """
+        for d in filenames:
+            d_dest_path = self._entrypoint_folder / d
+            if not force and _same_stat(raw_files[d], d_dest_path):  # a link or a copy2 keeps the mtime
+                continue
+            pathutils.link_or_copy(raw_files[d].path, d_dest_path)
+            _fetch_cache.invalidate(d_dest_path)
 
 
-    def update_models(self):
+    def update_models(self, force=False, jobs=1, executor='process', profile=False, io_jobs=IO_JOBS, 
+        use_store=True, share_inputs=False, sample=None, only=None):
         """ This works similar to update_entrypoint but works for models. It uses the entrypoint/ data 
-        does a lookup and pipes 
+        does a lookup and pipes. Unchanged modeling methods are skipped unless force is set.
+
+        Trained models are kept in a content addressed store in data/.localcache/model-store. A modeling 
+        method whose code, entrypoint inputs and library versions match a stored model reuses it instead 
+        of training again. The fingerprint and training time are added to the model's metadata.json. 
+        The least recently used models are deleted from the store once it holds more than 
+        MODEL_STORE_MAXBYTES. Pass use_store=False to not read or write the store.
+
+        With share_inputs and a process pool (jobs > 1) an entrypoint file used by several modeling 
+        methods is loaded once and memory mapped by the workers instead of being read by each of them. 
+        The numeric columns of these inputs are read-only so only turn it on if no method changes its 
+        inputs in place.
+
+        sample and only work as for update_entrypoint. Sampled models are written to 
+        data/.localcache/sample-models and are never added to the model store.
         """
-        
+        sampling.check_sample(sample)
         entrypoint_list = self.available_entrypoints()
         if len(entrypoint_list) == 0:
             return 
@@ -316,56 +651,169 @@ class _DataManager(object):
             print('No registered modeling methods found...')
             return
 
-        try:
-            for entry_name in entrypoint_list:  # validate extensions
-                entry_name = str(entry_name)
-                assert entry_name.endswith('.json') \
-                    or entry_name.endswith('.csv') \
-                    or entry_name.endswith('data.pkl'), f'Invalid file extension: {entry_name}'
-            
-            # NOTE we don't need the extra logic like update_entrypoint to "transfer" files that aren't being processed
-            # We assume that if you did not register entrypoint to a model then you don't want to model it  
-            self._do_process(self._modeler_registry, self._entrypoint_folder, self._models_folder)
+        for entry_name in entrypoint_list:  # validate extensions
+            entry_name = str(entry_name)
+            assert self._parsers.accepts(entry_name, 'entrypoint'), f'Invalid file extension: {entry_name}'
+        
+        # NOTE we don't need the extra logic like update_entrypoint to "transfer" files that aren't being processed
+        # We assume that if you did not register entrypoint to a model then you don't want to model it  
+        if sample is not None:
+            self._do_process(self._modeler_registry, self._entrypoint_folder, SAMPLE_MODELS_DIR, force=True, 
+                jobs=jobs, executor=executor, profile=profile, io_jobs=io_jobs, sample=sample, only=only)
+            print(f'Sampled models are in {SAMPLE_MODELS_DIR}')
+            return
+        self._do_process(self._modeler_registry, self._entrypoint_folder, self._models_folder, 
+            force=force, jobs=jobs, executor=executor, profile=profile, io_jobs=io_jobs, 
+            store=modelstore.ModelStore(MODEL_STORE_DIR, MODEL_STORE_MAXBYTES) if use_store else None, 
+            share_inputs=share_inputs, only=only)
+
 
-        except Exception as err:
-            shutil.rmtree(self._models_folder)
-            os.makedirs(self._models_folder)
-            gk = pathlib.Path(self._models_folder) / '.gitkeep'
-            gk.touch()
-            raise
+def _engine_option(engine):
+    """ pandas is stored as None so registering it explicitly doesn't change the build manifest's code hash
+    """
+    return None if engine in (None, 'pandas') else engine
 
 
-def fetch_data(filename, folder_name='entrypoint'):
-    """ Fetch a dataset from entrypoint or a model from models.
+def _with_schema(read_options, schema):
+    """ the schema of each input is passed to its parser as the schema read option
+    """
+    read_options = {f: dict(o) for f, o in (read_options or {}).items()}
+    for f, s in (schema or {}).items():
+        read_options.setdefault(f, {})['schema'] = s
+    return read_options
+
+
+def _map_io(fn, items, io_jobs=1):
+    """ map fn over items on up to io_jobs threads keeping their order. Parsing and writing 
+    mostly happens in C code (pandas, pyarrow) or waits on the disk with the GIL released so 
+    threads overlap well.
+    """
+    if io_jobs <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(io_jobs, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+
+def _read_folder(folder, parsers, folder_name, read):
+    """ read every file of a folder partition with read(path, parser) and concatenate them.
+    """
+    import pandas as pd
+    files = sorted(f.path for f in pathutils.scan(folder, accept=parsers.patterns(folder_name)))
+    if not files:
+        raise FileNotFoundError(f'Partition {folder} has no data files')
+    return pd.concat([read(f, parsers.lookup(f)) for f in files], ignore_index=True)
+
+
+def _with_partition_column(data, column, value):
+    """ add the value of a hive style partition as a column like pyarrow datasets do.
+    """
+    if column is None or not hasattr(data, 'assign') or column in data.columns:
+        return data
+    return data.assign(**{column: value})
+
+
+def _staging_folder(target_folder):
+    """ outputs are staged next to the target folder so they can be moved into it with a rename 
+    and are never discovered as entrypoint or models files.
+    """
+    target_folder = pathlib.Path(target_folder)
+    return target_folder.parent / f'.staging-{target_folder.name}'
+
+
+def _same_stat(src, dest):
+    """ True if dest exists with the same size and mtime as the ScannedFile src
+    """
+    try:
+        d = os.stat(dest)
+    except FileNotFoundError:
+        return False
+    return src.size == d.st_size and src.mtime_ns == d.st_mtime_ns
+
+
+_fetch_cache = MemoryCache(FETCH_CACHE_MAXBYTES)
+_MISSING = object()
+
+
+def fetch_data(filename, folder_name='entrypoint', use_cache=True, partitions=None, **read_options):
+    """ Fetch a dataset from entrypoint or a model from models. Any read_options are 
+    passed to the parser, ex. fetch_data('d.parquet', columns=['a', 'b'])
+
+    A partitioned dataset is fetched with the pattern it was registered with and its 
+    partitions are concatenated, ex. fetch_data('events/date=*/events.parquet'). partitions 
+    limits which ones are read, either a list of partition values or a function that takes 
+    a value and returns True to read it, ex. partitions=lambda d: d >= '2020-06-01'.
+
+    Results are kept in an in-memory LRU cache keyed on the file's path, mtime and size 
+    and the read_options so repeated fetches don't reparse the file. DataFrames come back 
+    as copies (or copy-on-write views with pandas >= 3) and arrays as read-only views so the 
+    cached value can't be changed by the caller. Models are returned as is. json documents (dicts 
+    and lists) are not cached since parsing them is faster than copying a cached one. Pass 
+    use_cache=False to skip the cache. See fetch_data.cache_info() and fetch_data.cache_clear().
     """
     from {{cookiecutter.package_name}}.registry import data_manager # lazy import singleton to avoid module issues
 
     if folder_name == 'entrypoint':
-        fpath = data_manager._entrypoint_folder / filename 
+        folder = data_manager._entrypoint_folder
     elif folder_name == 'models':
-        fpath = data_manager._models_folder / filename
+        folder = data_manager._models_folder
     else:
         raise TypeError('Can only read from entrypoint or models folders')
+    fpath = folder / filename
+
+    if pathutils.is_partitioned(filename):
+        return _fetch_partitions(folder, filename, folder_name, data_manager._parsers, 
+            partitions, use_cache, **read_options)
+    if partitions is not None:
+        raise ValueError(f'partitions given for {filename} which is not a partitioned dataset')
+    return _fetch(fpath, data_manager.get_parser(filename), use_cache, **read_options)
+
+
+def _fetch_partitions(folder, pattern, folder_name, parsers, partitions=None, use_cache=True, **read_options):
+    import pandas as pd
+    found = pathutils.find_partitions(folder, pattern)
+    if partitions is not None:
+        keep = partitions if callable(partitions) else set(partitions).__contains__
+        found = collections.OrderedDict((v, p) for v, p in found.items() if keep(v))
+    if not found:
+        raise FileNotFoundError(f'No partitions of {pattern} found in {folder}' + 
+            ('' if partitions is None else ' matching partitions'))
+    column = pathutils.partition_column(pattern)
+    read = lambda p, parser: _fetch(p, parser, use_cache, **read_options)
+    frames = []
+    for value, p in found.items():
+        data = _read_folder(p, parsers, folder_name, read) if p.is_dir() else read(p, parsers.lookup(p))
+        frames.append(_with_partition_column(data, column, value))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _fetch(fpath, parser, use_cache=True, **read_options):
+    """ read fpath with parser through the fetch_data cache
+    """
+    if not use_cache:
+        return parser.read(fpath, **read_options)
+
+    st = os.stat(fpath)
+    key = (str(fpath), st.st_mtime_ns, st.st_size, repr(sorted(read_options.items())))
+    data = _fetch_cache.get(key, _MISSING)
+    if data is _MISSING:
+        data = parser.read(fpath, **read_options)
+        if isinstance(data, collections.abc.Iterator):  # ex. a generator of json lines records can't be cached
+            return data
+        if isinstance(data, (dict, list)):  # decoding json again is faster than deep copying a cached one
+            return data
+        _fetch_cache.set(key, data, fpath, approximate_size(data, default=st.st_size))
+    return protect(data)
 
-    parser = data_manager.get_parser(filename)
-    return parser.read(fpath)
+fetch_data.cache_info = _fetch_cache.info
+fetch_data.cache_clear = _fetch_cache.clear
 
 
 def create_cache():
-    """ Configure an instance of the flask_caching.Cache for use
-    with the filesystem with reasonable defaults. We act clever and 
-    realize that flask is just an object and we can fake 
+    """ Configure a LocalCache in data/.localcache with reasonable defaults. Entries expire 
+    after a week and the cache is kept under CACHE_MAXBYTES.
     """
-    class _App(object):
-        config = {}
-
-    cache_config = {
-        'CACHE_TYPE': 'filesystem',
-        'CACHE_DEFAULT_TIMEOUT': 60 * 60 * 24 * 7,
-        'CACHE_THRESHOLD': 100,
-        'CACHE_DIR': CACHE_DIR
-    }
-    return Cache(app=_App(), with_jinja2_ext=False, config=cache_config)
+    return LocalCache(CACHE_DIR, maxbytes=CACHE_MAXBYTES, policy=CACHE_EVICTION_POLICY, 
+        default_timeout=60 * 60 * 24 * 7)
 
 
 def create_data_manager():
@@ -377,10 +825,32 @@ def create_data_manager():
 
 
 
+def _sample_option(sample, sample_frac):
+    if sample is not None and sample_frac is not None:
+        raise click.UsageError('Pass only one of --sample and --sample-frac')
+    return sample if sample is not None else sample_frac
+
+
 @click.command()
-def build_entrypoint():
-    """ Builds (or re-builds) the entrypoint folder by flushing and then 
-    running any registered cleaning methods on the raw data folder. 
+@click.option('--force', is_flag=True, default=False, 
+    help='Rerun every registered cleaning method even if nothing has changed since the last build.')
+@click.option('-j', '--jobs', type=click.INT, default=1, show_default=True,
+    help='Number of registered methods to run at the same time.')
+@click.option('--executor', type=click.Choice(['process', 'thread']), default='process', show_default=True,
+    help='Run parallel jobs on a process or thread pool.')
+@click.option('--profile', is_flag=True, default=False, 
+    help='Run each method under cProfile and save the stats to data/.localcache/build-stats/profiles.')
+@click.option('--io-jobs', type=click.INT, default=IO_JOBS, show_default=True,
+    help='Number of input or output files of a method to read or write at the same time.')
+@click.option('--sample', type=click.INT, default=None, 
+    help='Run on a sample of N rows of each input and write to data/.localcache/sample-entrypoint.')
+@click.option('--sample-frac', type=click.FLOAT, default=None, 
+    help='Run on a fraction of the rows of each input, like --sample.')
+@click.option('--only', multiple=True, 
+    help='Only run this registered method and the methods it depends on. Can be given more than once.')
+def build_entrypoint(force, jobs, executor, profile, io_jobs, sample, sample_frac, only):
+    """ Builds (or re-builds) the entrypoint folder by running any registered 
+    cleaning methods on the raw data folder. 
     """
     try:
         from .. import registry   
@@ -389,13 +859,34 @@ def build_entrypoint():
         print('Could not import data_manager from {{cookiecutter.package_name}}.registry.')
         sys.exit(1)
     
-    registry.data_manager.update_entrypoint()
+    registry.data_manager.update_entrypoint(force=force, jobs=jobs, executor=executor, profile=profile, 
+        io_jobs=io_jobs, sample=_sample_option(sample, sample_frac), only=only)
 
 
 @click.command()
-def build_models():
-    """ Builds (or rebuilds) the models folder by flushing and running 
-    any registered modeling methods on the entrypoint data.
+@click.option('--force', is_flag=True, default=False, 
+    help='Rerun every registered modeling method even if nothing has changed since the last build.')
+@click.option('-j', '--jobs', type=click.INT, default=1, show_default=True,
+    help='Number of registered methods to run at the same time.')
+@click.option('--executor', type=click.Choice(['process', 'thread']), default='process', show_default=True,
+    help='Run parallel jobs on a process or thread pool.')
+@click.option('--profile', is_flag=True, default=False, 
+    help='Run each method under cProfile and save the stats to data/.localcache/build-stats/profiles.')
+@click.option('--io-jobs', type=click.INT, default=IO_JOBS, show_default=True,
+    help='Number of input or output files of a method to read or write at the same time.')
+@click.option('--no-store', is_flag=True, default=False, 
+    help="Don't reuse or save models in the content addressed model store.")
+@click.option('--share-inputs', is_flag=True, default=False, 
+    help='Read inputs used by several methods once and share them read-only with the worker processes.')
+@click.option('--sample', type=click.INT, default=None, 
+    help='Train on a sample of N rows of each input and write to data/.localcache/sample-models.')
+@click.option('--sample-frac', type=click.FLOAT, default=None, 
+    help='Train on a fraction of the rows of each input, like --sample.')
+@click.option('--only', multiple=True, 
+    help='Only run this registered method and the methods it depends on. Can be given more than once.')
+def build_models(force, jobs, executor, profile, io_jobs, no_store, share_inputs, sample, sample_frac, only):
+    """ Builds (or rebuilds) the models folder by running any registered 
+    modeling methods on the entrypoint data.
     """
     try:
         from .. import registry      
@@ -404,4 +895,6 @@ def build_models():
         print('Could not import data_manager from {{cookiecutter.package_name}}.registry.')
         sys.exit(1)
     
-    registry.data_manager.update_models()
\ No newline at end of file
+    registry.data_manager.update_models(force=force, jobs=jobs, executor=executor, profile=profile, 
+        io_jobs=io_jobs, use_store=not no_store, share_inputs=share_inputs, 
+        sample=_sample_option(sample, sample_frac), only=only)
\ No newline at end of file
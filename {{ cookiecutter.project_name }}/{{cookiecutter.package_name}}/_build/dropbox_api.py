@@ -1,21 +1,119 @@
-import dropbox 
-from dropbox.exceptions import ApiError
-from dropbox.files import FileMetadata
-
+# the dropbox sdk is imported where it is used so the commands start (and --help prints) quickly
 from .config import DROPBOX_ACCESS_TOKEN, PROJECT_NAME,\
-     DATA_DIR, RAW_DATA_DIR, MODELS_DIR
+     DATA_DIR, RAW_DATA_DIR, MODELS_DIR, CACHE_DIR
 
 import click 
+import concurrent.futures
+import hashlib
+import json
 import os 
 import pathlib
 import logging 
 import sys
+import threading
+import time
 l = logging.getLogger(__name__)
 
+DROPBOX_HASH_BLOCKSIZE = 4 * 1024 * 1024
+UPLOAD_CHUNKSIZE = 32 * 1024 * 1024   # must be a multiple of 4MB, single uploads are limited to 150MB
+SESSIONS_FILE = CACHE_DIR / 'dropbox-sessions.json'
+BATCH_SIZE = 1000   # the most entries the batch endpoints accept in one call
+
+
+def content_hash(filepath):
+    """ Compute the dropbox content_hash of a local file: the sha256 of the concatenated 
+    sha256 digests of each 4MB block. This is compared with the remote metadata to skip 
+    files that are already in sync.
+    """
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(DROPBOX_HASH_BLOCKSIZE), b''):
+            h.update(hashlib.sha256(block).digest())
+    return h.hexdigest()
+
+
+class SyncStats(object):
+    """ Thread safe counters for a push or pull.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self.files_transferred = 0
+        self.bytes_transferred = 0
+        self.files_skipped = 0
+        self.bytes_skipped = 0
+        self.failures = []
+
+    def transferred(self, nbytes):
+        with self._lock:
+            self.files_transferred += 1
+            self.bytes_transferred += nbytes
+
+    def skipped(self, nbytes):
+        with self._lock:
+            self.files_skipped += 1
+            self.bytes_skipped += nbytes
+
+    def failed(self, path, err):
+        with self._lock:
+            self.failures.append((path, err))
+
+    def __str__(self):
+        elapsed = max(time.time() - self._start, 1e-9)
+        mb = self.bytes_transferred / 1024 ** 2
+        return (f'{self.files_transferred} files transferred ({mb:.1f} MB in {elapsed:.1f}s, {mb / elapsed:.1f} MB/s), '
+            f'{self.files_skipped} files already in sync ({self.bytes_skipped / 1024 ** 2:.1f} MB skipped), '
+            f'{len(self.failures)} failed')
+
+
+class _UploadSessions(object):
+    """ Persists open upload sessions so a large upload that was interrupted can resume from 
+    the last committed chunk instead of starting over. Keyed by local path and only reused 
+    if the file's content hash hasn't changed.
+    """
+
+    def __init__(self, filepath):
+        self._filepath = pathlib.Path(filepath)
+        self._lock = threading.Lock()
+        try:
+            with open(self._filepath, 'r') as f:
+                self._sessions = json.load(f)
+        except (OSError, ValueError):
+            self._sessions = {}
+
+    def get(self, path, chash):
+        with self._lock:
+            s = self._sessions.get(str(path))
+        return s if s is not None and s['content_hash'] == chash else None
+
+    def set(self, path, chash, session_id, offset):
+        with self._lock:
+            self._sessions[str(path)] = {'content_hash': chash, 'session_id': session_id, 'offset': offset}
+            self._save()
+
+    def drop(self, path):
+        with self._lock:
+            if self._sessions.pop(str(path), None) is not None:
+                self._save()
+
+    def _save(self):
+        self._filepath.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._filepath.with_name(self._filepath.name + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self._sessions, f)
+        os.replace(tmp, self._filepath)
+
 
 class DropboxAPI(object):
     """ A wrapper around the dropbox API. Will use the ACCESS_TOKEN 
-    provided in .env or passed in via __init__. 
+    provided in .env or passed in via __init__. An already logged in client 
+    (or a local fake with the same methods) can be passed as dbx.
+
+    Files are transferred on a pool of jobs threads. Only files whose dropbox 
+    content_hash differs from the other side are transferred, files bigger than 
+    chunksize are uploaded in resumable chunks and calls that hit rate limits, 
+    server errors or dropped connections are retried with exponential backoff.
     """ 
 
     def __init__(self, 
@@ -23,10 +121,21 @@ class DropboxAPI(object):
         root_data_dir=None,
         raw_data_dir=None, 
         models_dir=None, 
-        access_token=None):
+        access_token=None, 
+        dbx=None, 
+        jobs=8, 
+        chunksize=UPLOAD_CHUNKSIZE, 
+        retries=5, 
+        sessions_file=None):
 
         self._project_name = project_name or PROJECT_NAME
         self._access_token = access_token
+        self._dbx = dbx
+        self._jobs = jobs
+        self._chunksize = chunksize
+        self._retries = retries
+        self._sessions = _UploadSessions(sessions_file or SESSIONS_FILE)
+        self._local = threading.local()
         # these are the dropbox project path, local abspath for syncing
         self._syncable_local_subfolders = {
             'models': ('/' + self._project_name + '/models', models_dir or MODELS_DIR), 
@@ -38,8 +147,9 @@ class DropboxAPI(object):
         try:
             if self._access_token is None:
                 assert DROPBOX_ACCESS_TOKEN is not None, 'An access token was not provided.'
-                self._token = DROPBOX_ACCESS_TOKEN
-            self._dbx = dropbox.Dropbox(DROPBOX_ACCESS_TOKEN)
+                self._access_token = DROPBOX_ACCESS_TOKEN
+            import dropbox
+            self._dbx = dropbox.Dropbox(self._access_token)
        
         except AssertionError:
             raise        
@@ -54,76 +164,300 @@ class DropboxAPI(object):
         return self._dbx
 
 
+    def _client(self):
+        """ a client for the current thread. The sdk client holds a requests session which 
+        should not be shared between threads so worker threads use a clone.
+        """
+        if threading.current_thread() is threading.main_thread() or not hasattr(self._dbx, 'clone'):
+            return self._dbx
+        if getattr(self._local, 'dbx', None) is None:
+            self._local.dbx = self._dbx.clone()
+        return self._local.dbx
+
+
+    def _retry(self, fn, *args, **kwargs):
+        """ call fn retrying on transient errors with exponential backoff.
+        """
+        import requests
+        from dropbox.exceptions import RateLimitError, InternalServerError
+        for attempt in range(self._retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except (RateLimitError, InternalServerError, requests.exceptions.RequestException) as err:
+                if attempt == self._retries:
+                    raise
+                wait = getattr(err, 'backoff', None) or min(2 ** attempt, 60)
+                l.warning(f'{err!r}... retrying in {wait}s')
+                time.sleep(wait)
+
+
+    def _run(self, jobs, stats):
+        """ run (label, fn, args) jobs on the thread pool collecting any failures in stats.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(self._jobs, 1)) as pool:
+            futures = {pool.submit(fn, *args): label for label, fn, args in jobs}
+            for future in concurrent.futures.as_completed(futures):
+                err = future.exception()
+                if err is not None:
+                    l.error(f'Failed to transfer {futures[future]}: {err!r}')
+                    stats.failed(futures[future], err)
+
+
+    def list_folder(self, dbx_path, recursive=False, missing_ok=False):
+        """ yield the metadata of every entry in a folder, following the listing cursor until 
+        dropbox has no more pages. With missing_ok a folder that does not exist is empty.
+        """
+        from dropbox.exceptions import ApiError
+        dbx = self._client()
+        try:
+            res = self._retry(dbx.files_list_folder, dbx_path, recursive=recursive)
+        except ApiError as err:
+            if missing_ok and err.error.is_path() and err.error.get_path().is_not_found():
+                return
+            raise
+        yield from res.entries
+        while res.has_more:
+            res = self._retry(dbx.files_list_folder_continue, res.cursor)
+            yield from res.entries
+
+
+    def _remote_files(self, dbx_path):
+        """ map path_lower -> FileMetadata for every file below dbx_path. A folder that does 
+        not exist yet is treated as empty.
+        """
+        from dropbox.files import FileMetadata
+        entries = self.list_folder(dbx_path, recursive=True, missing_ok=True)
+        return {e.path_lower: e for e in entries if isinstance(e, FileMetadata)}
+
+
+    def _wait_for_job(self, check, launch, poll=0.5):
+        """ return the result of a batch call. Dropbox either completes the batch straight away 
+        or returns a job id that is polled with check until the job is done.
+        """
+        if launch.is_complete():
+            return launch.get_complete()
+        if not launch.is_async_job_id():
+            raise RuntimeError(f'Unexpected response from a batch call: {launch}')
+        job_id = launch.get_async_job_id()
+        while True:
+            status = self._retry(check, job_id)
+            if status.is_complete():
+                return status.get_complete()
+            if not status.is_in_progress():
+                raise RuntimeError(f'Batch job {job_id} did not complete: {status}')
+            time.sleep(poll)
+            poll = min(poll * 2, 10)
+
+
+    def _batch(self, launch, check, args, labels):
+        """ call a batch endpoint with args in groups of BATCH_SIZE. Returns the result entries 
+        in the same order as args. Entries that failed are logged with their label.
+        """
+        results = []
+        for i in range(0, len(args), BATCH_SIZE):
+            result = self._wait_for_job(check, self._retry(launch, args[i:i + BATCH_SIZE]))
+            for label, entry in zip(labels[i:i + BATCH_SIZE], result.entries):
+                if entry.is_failure():
+                    l.error(f'Batch operation failed for {label}: {entry.get_failure()}')
+            results.extend(result.entries)
+        return results
+
+
+    def delete_batch(self, paths):
+        """ delete dropbox paths with the batch endpoint. Returns the DeleteBatchResultEntry 
+        for each path.
+        """
+        from dropbox.files import DeleteArg
+        dbx = self._client()
+        paths = list(paths)
+        return self._batch(dbx.files_delete_batch, dbx.files_delete_batch_check,
+            [DeleteArg(p) for p in paths], paths)
+
+
+    def copy_batch(self, pairs, autorename=False):
+        """ copy (from_path, to_path) pairs with the batch endpoint. Returns the 
+        RelocationBatchResultEntry for each pair.
+        """
+        from dropbox.files import RelocationPath
+        dbx = self._client()
+        pairs = list(pairs)
+        return self._batch(lambda args: dbx.files_copy_batch_v2(args, autorename=autorename), 
+            dbx.files_copy_batch_check_v2, [RelocationPath(a, b) for a, b in pairs], pairs)
+
+
+    def move_batch(self, pairs, autorename=False):
+        """ move (from_path, to_path) pairs with the batch endpoint. Returns the 
+        RelocationBatchResultEntry for each pair.
+        """
+        from dropbox.files import RelocationPath
+        dbx = self._client()
+        pairs = list(pairs)
+        return self._batch(lambda args: dbx.files_move_batch_v2(args, autorename=autorename), 
+            dbx.files_move_batch_check_v2, [RelocationPath(a, b) for a, b in pairs], pairs)
+
+
     def flush_folder(self, subfolder):
         """ delete all contents of a project subfolder
         """
         dbx_path, _ = self._syncable_local_subfolders.get(subfolder) 
 
-        entries = []
-        for entry in self._dbx.files_list_folder(dbx_path).entries:
+        paths = []
+        for entry in self.list_folder(dbx_path, missing_ok=True):
             print(f'deleting from {dbx_path}...  {entry.path_lower}')
-            e = self._dbx.files_delete(entry.path_lower)
-            entries.append(e)
-        return entries
+            paths.append(entry.path_lower)
+        return self.delete_batch(paths)
+
+
+    def _upload_file(self, fpath, dbx_path, chash, size, stats):
+        """ upload a file. chash is its content hash or None if it wasn't needed to compare it with 
+        the remote copy, a chunked upload hashes it here to key its resumable session.
+        """
+        from dropbox.files import CommitInfo, WriteMode
+        dbx = self._client()
+        commit = CommitInfo(path=dbx_path, mode=WriteMode.overwrite)
+        if size <= self._chunksize:
+            with open(fpath, 'rb') as f:
+                data = f.read()
+            self._retry(dbx.files_upload, data, dbx_path, mode=WriteMode.overwrite)
+        else:
+            self._upload_session(dbx, fpath, commit, chash or content_hash(fpath), size)
+        stats.transferred(size)
+
+
+    def _upload_session(self, dbx, fpath, commit, chash, size):
+        """ upload a large file in chunks through an upload session. The session and offset 
+        are saved after every chunk so the upload can resume if it is interrupted.
+        """
+        from dropbox.exceptions import ApiError
+        from dropbox.files import UploadSessionCursor
+        session = self._sessions.get(fpath, chash)
+        with open(fpath, 'rb') as f:
+            if session is None:
+                res = self._retry(dbx.files_upload_session_start, f.read(self._chunksize))
+                session = {'session_id': res.session_id, 'offset': f.tell()}
+                self._sessions.set(fpath, chash, res.session_id, f.tell())
+            else:
+                print(f'resuming upload of {fpath} at {session["offset"]} bytes')
+
+            offset = session['offset']
+            while True:
+                f.seek(offset)
+                chunk = f.read(self._chunksize)
+                cursor = UploadSessionCursor(session_id=session['session_id'], offset=offset)
+                try:
+                    if offset + len(chunk) >= size:
+                        self._retry(dbx.files_upload_session_finish, chunk, cursor, commit)
+                        break
+                    self._retry(dbx.files_upload_session_append_v2, chunk, cursor)
+                    offset += len(chunk)
+                    self._sessions.set(fpath, chash, session['session_id'], offset)
+                except ApiError as err:
+                    error = err.error
+                    if getattr(error, 'is_lookup_failed', lambda: False)():  # finish wraps the lookup error
+                        error = error.get_lookup_failed()
+                    if getattr(error, 'is_incorrect_offset', lambda: False)():
+                        offset = error.get_incorrect_offset().correct_offset  # the server has more than we thought
+                        continue
+                    self._sessions.drop(fpath)  # expired or invalid, the next push starts over
+                    raise
+        self._sessions.drop(fpath)
 
 
     def upload_data(self, excludes=['.localcache', 'entrypoint']):
         """ Uploads any data from root of the data folder into the dropbox Apps/project/directory. Will exclude 
-        any directories given to upload_data. 
+        any directories given to upload_data. Files whose content hash matches the remote copy are skipped. 
+        Returns a SyncStats.
         """
         dbx_root, local_path = self._syncable_local_subfolders.get('root') # get the rootpath
         # print(local_path)
-        responses = []
+        remote = self._remote_files(dbx_root)
+        stats = SyncStats()
+        jobs = []
         for dn, dirs, files in os.walk(local_path):
             dirs[:] = [d for d in dirs if d not in excludes]
             for f in files:
                 fpath = dn + '/' + f 
                 dbx_path = fpath.replace(str(local_path), dbx_root)
+                size = os.path.getsize(fpath)
+                entry = remote.get(dbx_path.lower())
+                chash = None
+                if entry is not None and entry.size == size:  # only files that can match are hashed
+                    chash = content_hash(fpath)
+                    if entry.content_hash == chash:
+                        stats.skipped(size)
+                        continue
                 print('uploading...', fpath, ' to ', dbx_path)
-                with open(fpath, 'rb') as f:
-                    res = self._dbx.files_upload(f.read(), dbx_path)
-                    responses.append(res)
-        return responses
+                jobs.append((fpath, self._upload_file, (fpath, dbx_path, chash, size, stats)))
+
+        self._run(jobs, stats)
+        return stats
+
+
+    def _download_file(self, entry, p, stats):
+        tmp = pathlib.Path(str(p) + '.part')  # never leave a half written file in place of a good one
+        self._retry(self._client().files_download_to_file, str(tmp), entry.path_lower)
+        os.replace(tmp, p)
+        stats.transferred(entry.size)
 
 
     def download_data(self):
-        """ Downloads all data from the dropbox project root into the local data folder.  
+        """ Downloads all data from the dropbox project root into the local data folder. Files 
+        that already match the remote content hash are skipped so an interrupted pull picks up 
+        where it left off. Returns a SyncStats.
         """
+        from dropbox.files import FileMetadata, FolderMetadata
 
         dbx_path, local_path = self._syncable_local_subfolders.get('root') # get the paths
-        responses = []
+        stats = SyncStats()
+        jobs = []
         
-        for entry in self._dbx.files_list_folder(dbx_path, recursive=True).entries:
-            if isinstance(entry, dropbox.files.FolderMetadata):
-                p = local_path / entry.path_lower.replace('/' + self._project_name, '')[1:]
+        for entry in self.list_folder(dbx_path, recursive=True):
+            if entry.path_lower == dbx_path.lower():
+                continue
+            p = pathlib.Path(local_path) / entry.path_display[len(dbx_path) + 1:]
+
+            if isinstance(entry, FolderMetadata):
                 print('creating folder: ', p)
-                pathlib.Path(p).mkdir(parents=True, exist_ok=True)
+                p.mkdir(parents=True, exist_ok=True)
         
-            elif isinstance(entry, dropbox.files.FileMetadata):
-                p = local_path / entry.path_lower.replace('/' + self._project_name, '')[1:]
+            elif isinstance(entry, FileMetadata):
+                if p.exists() and p.stat().st_size == entry.size and content_hash(p) == entry.content_hash:
+                    stats.skipped(entry.size)
+                    continue
                 print('downloading file: ', p)
-                md = self._dbx.files_download_to_file(p, entry.path_lower)
-                responses.append((md, f'bytes downloaded: {md.size}'))
+                p.parent.mkdir(parents=True, exist_ok=True)
+                jobs.append((str(p), self._download_file, (entry, p, stats)))
+
+        self._run(jobs, stats)
+        return stats 
+
 
-        return responses 
+def _report(stats):
+    print(str(stats))
+    if stats.failures:
+        for path, err in stats.failures:
+            print(f'FAILED {path}: {err!r}')
+        sys.exit(1)
 
 
 @click.command() 
 @click.option('-n', '--project-name', type=click.STRING, 
     help='Pull files into data/raw and data/models from dropbox. If none defaults to PROJECT_NAME')
-def pull_from_dropbox(project_name):
-    client = DropboxAPI(project_name)
+@click.option('-j', '--jobs', type=click.INT, default=8, show_default=True, help='Number of files to download at once.')
+def pull_from_dropbox(project_name, jobs):
+    client = DropboxAPI(project_name, jobs=jobs)
     client.login() 
-    client.download_data()
+    _report(client.download_data())
 
 
 @click.command() 
 @click.option('-n', '--project-name', type=click.STRING, default=None,
     help='Push files into data/raw and data/models from dropbox. If none defaults to PROJECT_NAME')
-def push_to_dropbox(project_name):
-    client = DropboxAPI(project_name)
+@click.option('-j', '--jobs', type=click.INT, default=8, show_default=True, help='Number of files to upload at once.')
+def push_to_dropbox(project_name, jobs):
+    client = DropboxAPI(project_name, jobs=jobs)
     client.login()
-    client.upload_data()
+    _report(client.upload_data())
 
 
 @click.command()
@@ -0,0 +1,196 @@
+""" Execution engines decide what registered methods receive for their tabular inputs and
+how what they return is written. The default pandas engine passes DataFrames read by the
+parsers. The lazy engines pass polars LazyFrames or dask DataFrames that are only computed
+when their output is written so data bigger than memory can go through a registered method.
+"""
+from . import pathutils
+from . import compress
+from . import sampling
+
+import importlib
+
+
+def _import(module, requirement):
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError(f'This engine requires {requirement}. Install it with pip install "{requirement}"') from None
+
+
+class Engine(object):
+    """ Base class for engines. parsers is the ParserRegistry used to look up the parser of a
+    file and its suffix. Options are the read or write options given for a single file.
+    """
+    name = None
+
+    def read(self, parsers, filepath, **options):
+        return parsers.lookup(filepath).read(filepath, **options)
+
+    def write(self, parsers, filepath, data, **options):
+        parsers.lookup(filepath).write(filepath, data, **options)
+
+    def read_sample(self, parsers, filepath, sample, **options):
+        """ Read a deterministic sample of rows (see sampling). Files the parser can read in chunks
+        are streamed through the sample.
+        """
+        parser = parsers.lookup(filepath)
+        try:
+            chunks = parser.read_chunks(filepath, sampling.CHUNKSIZE, **options)
+        except TypeError:
+            return sampling.sample_data(parser.read(filepath, **options), sample)
+        return sampling.sample_chunks(chunks, sample)
+
+
+class PandasEngine(Engine):
+    name = 'pandas'
+
+
+class PolarsLazyEngine(Engine):
+    """ csv, parquet and feather inputs are scanned into polars LazyFrames and read_options are
+    passed to the scan function (ex. {'schema_overrides': {...}} for csv). Other inputs (json,
+    pickles) are read by their parsers as usual. A returned LazyFrame is executed with the
+    streaming engine straight into csv, parquet and feather outputs. Any other output is collected
+    and written by its parser as a pandas DataFrame. Compressed csv files (ex. x.csv.zst) can't be
+    scanned or sunk so they are read by the parser and converted and written from pandas. 
+    """
+    name = 'polars-lazy'
+    _scanners = {'csv': 'scan_csv', 'parquet': 'scan_parquet', 'feather': 'scan_ipc', 'arrow': 'scan_ipc'}
+    _sinks = {'csv': 'sink_csv', 'parquet': 'sink_parquet', 'feather': 'sink_ipc', 'arrow': 'sink_ipc'}
+
+    def read(self, parsers, filepath, **options):
+        pl = _import('polars', 'polars')
+        scanner = self._scanners.get(parsers.suffix(filepath))
+        if scanner is None:
+            return super().read(parsers, filepath, **options)
+        if compress.codec_of(filepath) is not None:
+            return pl.from_pandas(super().read(parsers, filepath)).lazy()
+        return getattr(pl, scanner)(str(filepath), **options)
+
+    def read_sample(self, parsers, filepath, sample, **options):
+        pl = _import('polars', 'polars')
+        data = self.read(parsers, filepath, **options)
+        if not isinstance(data, pl.LazyFrame):
+            return sampling.sample_data(data, sample)
+        return _polars_sample(pl, data, sample)
+
+    def write(self, parsers, filepath, data, **options):
+        pl = _import('polars', 'polars')
+        if isinstance(data, pl.DataFrame):
+            data = data.lazy()
+        if isinstance(data, pl.LazyFrame):
+            sink = self._sinks.get(parsers.suffix(filepath))
+            if sink is not None and compress.codec_of(filepath) is None:
+                pathutils.touch_filepath(filepath)
+                getattr(data, sink)(str(filepath), **options)
+                return
+            data = data.collect().to_pandas()
+        super().write(parsers, filepath, data, **options)
+
+
+class DaskEngine(Engine):
+    """ csv and parquet inputs are read into dask DataFrames and read_options are passed to
+    dd.read_csv or dd.read_parquet (ex. {'blocksize': '64MB'}). Other tabular inputs are read by
+    their parsers and wrapped in a single partition. A returned dask DataFrame is computed in a
+    single pass on all cores and each partition is appended to its output as soon as the ones
+    before it were written, so partitions are dropped from memory once they are written. Outputs
+    whose parser can't append (pickles, json) are computed whole. Compressed csv inputs are read
+    by their parser into a single partition.
+    """
+    name = 'dask'
+    _readers = {'csv': 'read_csv', 'parquet': 'read_parquet'}
+
+    def read(self, parsers, filepath, **options):
+        import pandas as pd
+        dd = _import('dask.dataframe', 'dask[dataframe]')
+        reader = self._readers.get(parsers.suffix(filepath))
+        if reader is not None and compress.codec_of(filepath) is None:
+            return getattr(dd, reader)(str(filepath), **options)
+        data = super().read(parsers, filepath, **options)
+        return dd.from_pandas(data, npartitions=1) if isinstance(data, pd.DataFrame) else data
+
+    def read_sample(self, parsers, filepath, sample, **options):
+        dd = _import('dask.dataframe', 'dask[dataframe]')
+        data = self.read(parsers, filepath, **options)
+        if not isinstance(data, dd.DataFrame):
+            return sampling.sample_data(data, sample)
+        return _dask_sample(data, sample)
+
+    def write(self, parsers, filepath, data, **options):
+        dd = _import('dask.dataframe', 'dask[dataframe]')
+        if isinstance(data, dd.DataFrame):
+            parser = parsers.lookup(filepath)
+            try:
+                writer = parser.chunk_writer(filepath, **options)
+            except TypeError:
+                data = data.compute()
+            else:
+                with writer:
+                    _append_partitions(data, writer)
+                return
+        super().write(parsers, filepath, data, **options)
+
+
+def _polars_sample(pl, data, sample):
+    """ sample a LazyFrame without collecting it. Every row gets a key hashed from its row number
+    and a fraction keeps the rows whose key is below it. A number of rows first finds the key of 
+    the sample's last row in a pass that only holds that many keys and then keeps the rows with
+    keys up to it. Rows keep their order in the file.
+    """
+    keyed = data.with_row_index('__row').with_columns(pl.col('__row').hash(sampling.SEED).alias('__key'))
+    if isinstance(sample, float):
+        kept = keyed if sample >= 1 else keyed.filter(pl.col('__key') < int(sample * 2 ** 64))
+    else:
+        last = keyed.select(pl.col('__key').bottom_k(sample).max()).collect().item()
+        kept = keyed.filter(pl.col('__key') <= last).head(sample) if last is not None else keyed.head(0)
+    return kept.drop('__row', '__key')
+
+
+def _key_partition(df, partition_info=None):
+    import numpy as np
+    number = partition_info['number'] if partition_info else 0
+    rng = np.random.default_rng([sampling.SEED, number])
+    return df.assign(__part=number, __row=np.arange(len(df)), __key=rng.random(len(df)))
+
+
+def _dask_sample(data, sample):
+    """ sample a dask DataFrame in a single pass. Every row gets a random key seeded by its 
+    partition so the sample is deterministic. A fraction keeps the rows whose key is below it
+    (about that share of the rows, as with pandas) and a number of rows keeps exactly the rows 
+    with the smallest keys, which only holds that many rows per partition. Rows keep their order.
+    """
+    keyed = data.map_partitions(_key_partition)
+    if isinstance(sample, float):
+        kept = keyed[keyed['__key'] < sample]
+    else:
+        kept = keyed.nsmallest(sample, '__key').map_partitions(lambda df: df.sort_values(['__part', '__row']))
+    return kept.drop(columns=['__part', '__row', '__key'])
+
+
+def _append(writer, partition, previous):
+    writer.write(partition)
+
+
+def _append_partitions(data, writer):
+    """ write the partitions of a dask DataFrame in order with one compute. Each append waits on
+    the one before it so the writes are in order, but the graph that makes the partitions (ex. a
+    shuffle or a merge) is only run once rather than once per partition.
+    """
+    import dask
+    written = None
+    for partition in data.to_delayed():
+        written = dask.delayed(_append, pure=False)(writer, partition, written)
+    if written is not None:
+        written.compute()
+
+
+ENGINES = {e.name: e for e in (PandasEngine(), PolarsLazyEngine(), DaskEngine())}
+
+
+def get_engine(name=None):
+    """ Return the engine registered under name. None is the pandas engine.
+    """
+    if name is None:
+        return ENGINES['pandas']
+    if name not in ENGINES:
+        raise ValueError(f'Unknown engine: {name}. Use any of {sorted(ENGINES)}')
+    return ENGINES[name]
@@ -0,0 +1,196 @@
+""" Per-step instrumentation for builds. Each registered step collects how long it spent
+reading each input, in the registered function and writing its outputs along with how much
+it read and wrote, how much memory its inputs take once parsed and how much its process
+grew. The parent writes these as json lines and prints a summary table at the end of the build.
+"""
+from .memcache import _types
+
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+def _maxrss():
+    """ peak resident set size of this process in bytes or 0 if it can't be measured.
+    """
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # linux reports kilobytes
+
+
+def _size(filepath):
+    try:
+        return os.path.getsize(filepath)
+    except OSError:
+        return 0
+
+
+def _memory_usage(data, deep=False):
+    """ bytes held by a pandas DataFrame or a numpy array, 0 for anything else (ex. lazy frames or models).
+    Without deep python strings in object columns are only counted as pointers, counting them in full 
+    takes seconds for millions of rows.
+    """
+    if isinstance(data, _types('pandas', 'DataFrame')):
+        return int(data.memory_usage(index=True, deep=deep).sum())
+    if isinstance(data, _types('numpy', 'ndarray')):
+        return int(data.nbytes)
+    return 0
+
+
+class StepStats(object):
+    """ Collects the timings of a single step in the process that runs it. cpu time is the cpu
+    time of that whole process so it is only exact when steps run serially or on processes.
+    The peak rss delta is how much the step raised the high water mark of its process, a step
+    that fits in memory already used by an earlier step on the same worker shows 0.
+
+    If profile_dir is given every call of the registered function is run under cProfile and
+    the stats are dumped to <profile_dir>/<step key>.prof when the step finishes.
+    """
+
+    def __init__(self, key, profile_dir=None):
+        self.key = key
+        self.profile_dir = profile_dir
+        self.read_s = {}  # input filename -> seconds spent parsing it, these overlap when inputs are read concurrently
+        self.read_wall_s = 0.0
+        self.memory_bytes = {}  # input filename -> memory used by the data read from it
+        self.func_wall_s = 0.0
+        self.func_cpu_s = 0.0
+        self.write_s = 0.0
+        self._profiler = cProfile.Profile() if profile_dir is not None else None
+        self._start = time.perf_counter()
+        self._rss = _maxrss()
+
+
+    @contextlib.contextmanager
+    def reading(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.read_s[name] = self.read_s.get(name, 0.0) + time.perf_counter() - start
+
+
+    def loaded(self, name, data):
+        """ record how much memory the data read from an input holds. Python strings are only counted
+        in full when the step is profiled since measuring them is slow.
+        """
+        self.memory_bytes[name] = _memory_usage(data, deep=self._profiler is not None)
+
+
+    @contextlib.contextmanager
+    def loading(self):
+        """ time a phase that reads one or more inputs
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.read_wall_s += time.perf_counter() - start
+
+
+    @contextlib.contextmanager
+    def writing(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.write_s += time.perf_counter() - start
+
+
+    def iter_reads(self, name, chunks):
+        """ wrap an iterator of chunks so the time spent producing each one counts as reading name.
+        """
+        chunks = iter(chunks)
+        done = object()
+        while True:
+            with self.loading(), self.reading(name):
+                chunk = next(chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+
+
+    def call(self, func, *args):
+        """ call the registered function, timing (and optionally profiling) it.
+        """
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            if self._profiler is not None:
+                return self._profiler.runcall(func, *args)
+            return func(*args)
+        finally:
+            self.func_wall_s += time.perf_counter() - wall
+            self.func_cpu_s += time.process_time() - cpu
+
+
+    def finish(self, inputs, outputs):
+        """ Return the stats as a json serializable dict. inputs and outputs map the registered
+        filenames to their paths.
+        """
+        profile = None
+        if self._profiler is not None:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profile = os.path.join(str(self.profile_dir), f'{self.key}.prof')
+            self._profiler.dump_stats(profile)
+        return {
+            'step': self.key,
+            'pid': os.getpid(),
+            'wall_s': time.perf_counter() - self._start,
+            'read_s': self.read_s,
+            'read_wall_s': self.read_wall_s,
+            'memory_bytes': self.memory_bytes,
+            'func_wall_s': self.func_wall_s,
+            'func_cpu_s': self.func_cpu_s,
+            'write_s': self.write_s,
+            'bytes_read': sum(_size(p) for p in inputs.values()),
+            'bytes_written': sum(_size(p) for p in outputs.values()),
+            'maxrss_delta_bytes': max(_maxrss() - self._rss, 0),
+            'profile': profile
+        }
+
+
+class BuildReport(object):
+    """ Appends the stats of every step to a json lines file as they finish and formats a
+    summary table of the slowest steps. The file is truncated at the start of each build.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.steps = []
+        os.makedirs(os.path.dirname(str(filepath)), exist_ok=True)
+        open(filepath, 'w').close()
+
+
+    def add(self, stats):
+        self.steps.append(stats)
+        with open(self.filepath, 'a') as f:
+            f.write(json.dumps(stats, sort_keys=True) + '\n')
+
+
+    def summary(self, limit=None):
+        """ a table of the steps that ran, slowest first.
+        """
+        mb = 1024 ** 2
+        header = ('step', 'total s', 'read s', 'func s', 'cpu s', 'write s', 'MB read', 'MB in memory', 'MB written', 
+            'rss +MB')
+        rows = []
+        for s in sorted(self.steps, key=lambda s: s['wall_s'], reverse=True)[:limit]:
+            rows.append((s['step'], f"{s['wall_s']:.2f}", f"{s['read_wall_s']:.2f}",
+                f"{s['func_wall_s']:.2f}", f"{s['func_cpu_s']:.2f}", f"{s['write_s']:.2f}",
+                f"{s['bytes_read'] / mb:.1f}", f"{sum(s.get('memory_bytes', {}).values()) / mb:.1f}", 
+                f"{s['bytes_written'] / mb:.1f}", f"{s['maxrss_delta_bytes'] / mb:.1f}"))
+        widths = [max(len(r[i]) for r in rows + [header]) for i in range(len(header))]
+        lines = ['  '.join(c.ljust(w) if i == 0 else c.rjust(w) for i, (c, w) in enumerate(zip(r, widths)))
+            for r in [header] + rows]
+        lines.insert(1, '-' * len(lines[0]))
+        lines.append(f'stats for each step are in {self.filepath}')
+        return '\n'.join(lines)
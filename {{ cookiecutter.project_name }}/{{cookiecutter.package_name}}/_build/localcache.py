@@ -0,0 +1,392 @@
+""" A disk cache for the data/.localcache folder. Values are stored content addressed
+(identical values share one file) in a format that suits them: arrow for DataFrames, npy for
+numeric arrays and pickle for everything else. A small SQLite index tracks keys, expiry and
+usage so the cache can be kept under a byte budget with LRU or LFU eviction. The API matches
+the parts of flask_caching.Cache that are used in notebooks (get/set/memoize/cached...).
+The folder and index are only opened when the cache is first read or written.
+"""
+from .memcache import _types
+
+import functools
+import hashlib
+import inspect
+import os
+import pathlib
+import pickle
+import sqlite3
+import time
+import uuid
+
+INDEX_FILENAME = 'index.sqlite3'
+POLICIES = ('lru', 'lfu')
+
+_MISSING = object()
+
+
+def _dump_arrow(value, filepath):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(value, preserve_index=True)
+    with pa.OSFile(filepath, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _load_arrow(filepath):
+    import pyarrow as pa
+    with pa.memory_map(filepath, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def _dump_npy(value, filepath):
+    import numpy as np
+    with open(filepath, 'wb') as f:
+        np.save(f, value, allow_pickle=False)
+
+
+def _load_npy(filepath):
+    import numpy as np
+    return np.load(filepath, allow_pickle=False)
+
+
+def _dump_pickle(value, filepath):
+    with open(filepath, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_pickle(filepath):
+    with open(filepath, 'rb') as f:
+        return pickle.load(f)
+
+
+_FORMATS = {
+    'arrow': (_dump_arrow, _load_arrow),
+    'npy': (_dump_npy, _load_npy),
+    'pkl': (_dump_pickle, _load_pickle)
+}
+
+
+def _formats_for(value):
+    """ the formats to try for a value in order of preference. pickle always works.
+    """
+    if isinstance(value, _types('pandas', 'DataFrame')):
+        return ('arrow', 'pkl')
+    if isinstance(value, _types('numpy', 'ndarray')) and not value.dtype.hasobject:
+        return ('npy', 'pkl')
+    return ('pkl',)
+
+
+def hash_args(*values):
+    """ A stable hash of function arguments used for memoize keys. DataFrames and arrays are
+    hashed by content, other values by their pickle (or repr if they can't be pickled).
+    """
+    h = hashlib.sha256()
+    for v in values:
+        if isinstance(v, _types('pandas', 'DataFrame', 'Series')):
+            import pandas as pd
+            h.update(pd.util.hash_pandas_object(v, index=True).values.tobytes())
+            h.update(repr(getattr(v, 'columns', v.name)).encode())
+            h.update(repr(getattr(v, 'dtypes', v.dtype)).encode())
+        elif isinstance(v, _types('numpy', 'ndarray')) and not v.dtype.hasobject:
+            import numpy as np
+            h.update(np.ascontiguousarray(v).tobytes())
+            h.update(repr((v.dtype, v.shape)).encode())
+        else:
+            try:
+                h.update(pickle.dumps(v, protocol=4))
+            except Exception:
+                h.update(repr(v).encode())
+    return h.hexdigest()
+
+
+def _file_hash(filepath, blocksize=1 << 20):
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class LocalCache(object):
+    """ A persistent key/value cache in cache_dir. maxbytes bounds the total size of the stored
+    files, least recently (policy='lru') or least frequently (policy='lfu') used keys are evicted
+    first. default_timeout is in seconds and 0 means keys never expire.
+    """
+
+    def __init__(self, cache_dir, maxbytes=5 * 1024 ** 3, policy='lru', default_timeout=0):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown eviction policy: {policy}. Use one of {POLICIES}')
+        self._dir = pathlib.Path(cache_dir)
+        self._blobs = self._dir / 'blobs'
+        self._maxbytes = maxbytes
+        self._policy = policy
+        self.default_timeout = default_timeout
+        self._opened = False
+
+
+    def _open(self):
+        """ create the folder and the index the first time the cache is used so that creating 
+        a cache (ex. importing the registry) touches nothing on disk.
+        """
+        if self._opened:
+            return
+        self._blobs.mkdir(parents=True, exist_ok=True)
+        self._opened = True
+        with self._connect() as con:
+            con.execute('''CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, blob TEXT NOT NULL, size INTEGER NOT NULL,
+                expires REAL NOT NULL, atime REAL NOT NULL, hits INTEGER NOT NULL)''')
+            con.execute('CREATE INDEX IF NOT EXISTS entries_blob ON entries (blob)')
+
+
+    def _connect(self):
+        self._open()
+        con = sqlite3.connect(str(self._dir / INDEX_FILENAME), timeout=30, isolation_level=None)
+        con.execute('PRAGMA journal_mode=WAL')
+        return _Transaction(con)
+
+
+    def _expires(self, timeout):
+        timeout = self.default_timeout if timeout is None else timeout
+        return 0 if not timeout else time.time() + timeout
+
+
+    def _store(self, value):
+        """ write a value to a temp file, then move it to a blob named by its content hash.
+        Returns the blob name and its size.
+        """
+        self._open()
+        for fmt in _formats_for(value):
+            tmp = self._blobs / f'.{uuid.uuid4().hex}.tmp'
+            try:
+                _FORMATS[fmt][0](value, str(tmp))
+            except Exception:
+                if tmp.exists():
+                    tmp.unlink()
+                if fmt == 'pkl':
+                    raise
+                continue
+            blob = f'{_file_hash(tmp)}.{fmt}'
+            size = tmp.stat().st_size
+            os.replace(tmp, self._blobs / blob)  # identical content just replaces the same bytes
+            return blob, size
+
+
+    def _get(self, key, default=_MISSING):
+        with self._connect() as con:
+            row = con.execute('SELECT blob, expires FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return default
+            blob, expires = row
+            if expires and expires < time.time():
+                self._delete(con, [key])
+                return default
+            con.execute('UPDATE entries SET atime = ?, hits = hits + 1 WHERE key = ?', (time.time(), key))
+        try:
+            return _FORMATS[blob.rsplit('.', 1)[-1]][1](str(self._blobs / blob))
+        except FileNotFoundError:  # removed from under us
+            self.delete(key)
+            return default
+
+
+    def get(self, key):
+        """ Return the value for key or None if it is missing or expired.
+        """
+        return self._get(key, None)
+
+
+    def get_many(self, *keys):
+        return [self.get(k) for k in keys]
+
+
+    def get_dict(self, *keys):
+        return dict(zip(keys, self.get_many(*keys)))
+
+
+    def has(self, key):
+        with self._connect() as con:
+            row = con.execute('SELECT expires FROM entries WHERE key = ?', (key,)).fetchone()
+        return row is not None and (not row[0] or row[0] >= time.time())
+
+
+    def set(self, key, value, timeout=None):
+        """ Store value under key. timeout is in seconds, 0 never expires and None uses the default.
+        """
+        blob, size = self._store(value)
+        now = time.time()
+        with self._connect() as con:
+            old = con.execute('SELECT blob FROM entries WHERE key = ?', (key,)).fetchone()
+            con.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, 0)',
+                (key, blob, size, self._expires(timeout), now))
+            if old is not None and old[0] != blob:
+                self._remove_orphans(con, [old[0]])
+            self._evict(con, keep=key)
+        return True
+
+
+    def add(self, key, value, timeout=None):
+        """ Like set but only if the key is not already cached.
+        """
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout=timeout)
+
+
+    def set_many(self, mapping, timeout=None):
+        for k, v in mapping.items():
+            self.set(k, v, timeout=timeout)
+        return list(mapping)
+
+
+    def delete(self, key):
+        with self._connect() as con:
+            return self._delete(con, [key]) > 0
+
+
+    def delete_many(self, *keys):
+        with self._connect() as con:
+            self._delete(con, keys)
+        return list(keys)
+
+
+    def clear(self):
+        with self._connect() as con:
+            keys = [r[0] for r in con.execute('SELECT key FROM entries')]
+            self._delete(con, keys)
+        return True
+
+
+    def _delete(self, con, keys, where='key = ?'):
+        blobs, count = set(), 0
+        for key in keys:
+            for (blob,) in con.execute(f'SELECT blob FROM entries WHERE {where}', (key,)).fetchall():
+                blobs.add(blob)
+            count += con.execute(f'DELETE FROM entries WHERE {where}', (key,)).rowcount
+        self._remove_orphans(con, blobs)
+        return count
+
+
+    def _remove_orphans(self, con, blobs):
+        for blob in blobs:
+            if con.execute('SELECT 1 FROM entries WHERE blob = ? LIMIT 1', (blob,)).fetchone() is None:
+                try:
+                    os.remove(self._blobs / blob)
+                except FileNotFoundError:
+                    pass
+
+
+    def _evict(self, con, keep=None):
+        """ drop expired keys and then the least recently/frequently used keys until the
+        stored blobs fit in maxbytes.
+        """
+        expired = [r[0] for r in con.execute(
+            'SELECT key FROM entries WHERE expires > 0 AND expires < ?', (time.time(),))]
+        self._delete(con, expired)
+
+        total = con.execute('SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT blob, size FROM entries)').fetchone()[0]
+        if total <= self._maxbytes:
+            return
+        order = 'atime' if self._policy == 'lru' else 'hits, atime'
+        for key, blob, size in con.execute(f'SELECT key, blob, size FROM entries ORDER BY {order}').fetchall():
+            if total <= self._maxbytes:
+                break
+            if key == keep:
+                continue
+            shared = con.execute('SELECT COUNT(*) FROM entries WHERE blob = ?', (blob,)).fetchone()[0]
+            self._delete(con, [key])
+            if shared == 1:
+                total -= size
+
+
+    def _memoize_prefix(self, f, make_name=None):
+        name = f'{f.__module__}.{f.__qualname__}'
+        if make_name is not None:
+            name = make_name(name)
+        return f'memoize/{name}/'
+
+
+    def _memoize_key(self, f, args, kwargs, make_name=None, args_to_ignore=None):
+        bound = inspect.signature(f).bind(*args, **kwargs)
+        bound.apply_defaults()
+        ignore = set(args_to_ignore or [])
+        values = [(k, v) for k, v in bound.arguments.items() if k not in ignore]
+        return self._memoize_prefix(f, make_name) + hash_args(*values)
+
+
+    def memoize(self, timeout=None, make_name=None, unless=None, cache_none=False, args_to_ignore=None):
+        """ Decorator that caches a function's return value keyed by the function and its
+        arguments. DataFrame and array arguments are hashed by content. The wrapped function
+        gets an uncached attribute with the original function.
+        """
+        def decorator(f):
+            @functools.wraps(f)
+            def decorated(*args, **kwargs):
+                if unless is not None and unless():
+                    return f(*args, **kwargs)
+                key = self._memoize_key(f, args, kwargs, make_name, args_to_ignore)
+                value = self._get(key)
+                if value is _MISSING or (value is None and not cache_none):
+                    value = f(*args, **kwargs)
+                    if value is not None or cache_none:
+                        self.set(key, value, timeout=timeout)
+                return value
+            decorated.uncached = f
+            decorated.cache_timeout = timeout
+            decorated.make_cache_key = lambda *a, **kw: self._memoize_key(f, a, kw, make_name, args_to_ignore)
+            return decorated
+        return decorator
+
+
+    def delete_memoized(self, f, *args, **kwargs):
+        """ Delete the cached result of a memoized function for the given arguments or every
+        cached result of the function if no arguments are given.
+        """
+        f = getattr(f, 'uncached', f)
+        with self._connect() as con:
+            if args or kwargs:
+                self._delete(con, [self._memoize_key(f, args, kwargs)])
+            else:
+                prefix = self._memoize_prefix(f).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                self._delete(con, [prefix + '%'], where="key LIKE ? ESCAPE '\\'")
+
+
+    def cached(self, timeout=None, key_prefix=None, unless=None):
+        """ Decorator that caches the result of a function without arguments under key_prefix
+        (a '%s' in it is replaced by the function name). Defaults to the function's full name.
+        """
+        def decorator(f):
+            name = f'{f.__module__}.{f.__qualname__}'
+            key = f'view/{name}' if key_prefix is None else key_prefix.replace('%s', name)
+
+            @functools.wraps(f)
+            def decorated(*args, **kwargs):
+                if unless is not None and unless():
+                    return f(*args, **kwargs)
+                value = self._get(key)
+                if value is _MISSING:
+                    value = f(*args, **kwargs)
+                    self.set(key, value, timeout=timeout)
+                return value
+            decorated.uncached = f
+            decorated.cache_timeout = timeout
+            decorated.make_cache_key = lambda *a, **kw: key
+            return decorated
+        return decorator
+
+
+class _Transaction(object):
+    """ Wraps a connection so a with block runs in a single immediate transaction and the
+    connection is closed afterwards.
+    """
+
+    def __init__(self, con):
+        self._con = con
+
+    def __enter__(self):
+        self._con.execute('BEGIN IMMEDIATE')
+        return self._con
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            self._con.execute('ROLLBACK' if exc_type is not None else 'COMMIT')
+        finally:
+            self._con.close()
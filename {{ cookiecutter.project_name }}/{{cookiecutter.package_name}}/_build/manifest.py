@@ -0,0 +1,173 @@
+""" A build manifest that lets the data manager skip registered steps whose inputs,
+code and outputs have not changed since the last successful build.
+"""
+import hashlib
+import inspect
+import json
+import os
+import pathlib
+
+MANIFEST_FILENAME = '.manifest'
+
+
+def file_hash(filepath, blocksize=1 << 20):
+    """ Return the sha256 hexdigest of a file, read in blocks so large files are
+    never fully loaded into memory.
+    """
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _folder_stat(folder):
+    """ the total size, the newest mtime of a folder (a partition) and its files and the files 
+    themselves. Adding or removing a file changes the folder's own mtime.
+    """
+    size, mtime_ns, files = 0, 0, []
+    for dn, dirs, fnames in os.walk(folder):
+        mtime_ns = max(mtime_ns, os.stat(dn).st_mtime_ns)
+        for n in fnames:
+            p = os.path.join(dn, n)
+            st = os.stat(p)
+            size += st.st_size
+            mtime_ns = max(mtime_ns, st.st_mtime_ns)
+            files.append(p)
+    return size, mtime_ns, sorted(files)
+
+
+def folder_hash(folder):
+    """ Return a sha256 of the relative paths and contents of every file below folder.
+    """
+    h = hashlib.sha256()
+    for p in _folder_stat(folder)[2]:
+        h.update(os.path.relpath(p, folder).encode())
+        h.update(file_hash(p).encode())
+    return h.hexdigest()
+
+
+def code_hash(func, *extra):
+    """ Hash the source of a registered function along with any extra values
+    (ex. the filenames it was registered with). Falls back to the bytecode if the
+    source is not available.
+    """
+    try:
+        src = inspect.getsource(func).encode()
+    except (OSError, TypeError):
+        src = func.__code__.co_code
+    h = hashlib.sha256(src)
+    h.update(json.dumps(extra, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class BuildManifest(object):
+    """ Records a fingerprint of the code, inputs and outputs of every step that ran
+    successfully into a target folder. Files are compared by size and mtime first and
+    only hashed when those change so a no-op rebuild does not read any data.
+    """
+
+    def __init__(self, folder):
+        self._path = pathlib.Path(folder) / MANIFEST_FILENAME
+        self._steps = self._load()
+        self._fingerprints = {}  # filepath -> fingerprint computed during this build
+        self._stats = {}  # filepath -> (size, mtime_ns) from a scan of the source folder
+
+
+    def _load(self):
+        try:
+            with open(self._path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+    def seed(self, files):
+        """ Reuse the size and mtime of pathutils.ScannedFiles that were just scanned instead 
+        of stating them again.
+        """
+        for f in files:
+            self._stats[str(f.path)] = (f.size, f.mtime_ns)
+
+
+    def fingerprint(self, filepath, previous=None):
+        """ Return the size, mtime and sha256 of a file. If a previous fingerprint has the
+        same size and mtime its hash is reused. Folders (partitions) are fingerprinted by the 
+        total size, newest mtime and contents of their files.
+        """
+        filepath = str(filepath)
+        if filepath in self._fingerprints:
+            return self._fingerprints[filepath]
+
+        is_folder = False
+        if filepath in self._stats:
+            size, mtime_ns = self._stats.pop(filepath)
+        elif os.path.isdir(filepath):
+            is_folder = True
+            size, mtime_ns, _ = _folder_stat(filepath)
+        else:
+            st = os.stat(filepath)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+        if previous is not None and previous.get('size') == size and previous.get('mtime_ns') == mtime_ns:
+            fp = previous
+        else:
+            fp = {'size': size, 'mtime_ns': mtime_ns, 'sha256': folder_hash(filepath) if is_folder else file_hash(filepath)}
+        self._fingerprints[filepath] = fp
+        return fp
+
+
+    def _matches(self, paths, recorded):
+        if set(paths) != set(recorded):
+            return False
+        for name, filepath in paths.items():
+            try:
+                fp = self.fingerprint(filepath, recorded[name])
+            except FileNotFoundError:
+                return False
+            if fp['sha256'] != recorded[name]['sha256']:
+                return False
+        return True
+
+
+    def is_fresh(self, key, code, inputs, outputs):
+        """ True if the step stored under key was last built with the same code and inputs
+        and its outputs are still on disk untouched. inputs and outputs map the registered
+        filenames to their full paths.
+        """
+        entry = self._steps.get(key)
+        if entry is None or entry.get('code') != code:
+            return False
+        return self._matches(inputs, entry.get('inputs', {})) \
+            and self._matches(outputs, entry.get('outputs', {}))
+
+
+    def record(self, key, code, inputs, outputs):
+        """ Store the fingerprints of a step that just ran. Outputs are always rehashed since
+        they were just rewritten.
+        """
+        for filepath in outputs.values():
+            self._fingerprints.pop(str(filepath), None)
+
+        self._steps[key] = {
+            'code': code,
+            'inputs': {name: self.fingerprint(p) for name, p in inputs.items()},
+            'outputs': {name: self.fingerprint(p) for name, p in outputs.items()}
+        }
+
+
+    def prune(self, keys):
+        """ Drop entries for steps that are no longer registered.
+        """
+        keys = set(keys)
+        self._steps = {k: v for k, v in self._steps.items() if k in keys}
+
+
+    def save(self):
+        """ Write the manifest atomically so an interrupted build never leaves a
+        half written file behind.
+        """
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._path.with_name(self._path.name + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self._steps, f, indent=2, sort_keys=True)
+        os.replace(tmp, self._path)
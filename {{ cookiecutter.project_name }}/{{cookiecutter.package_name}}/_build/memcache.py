@@ -0,0 +1,114 @@
+""" An in-process LRU cache bounded by the approximate size in bytes of the values it
+holds. Used to keep recently fetched datasets and models in memory.
+"""
+import collections
+import sys
+import threading
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'entries', 'currbytes', 'maxbytes'])
+
+
+def _types(module, *names):
+    """ the named types of a module if it was imported, otherwise (). A value can't be an instance
+    of a type from a module that was never imported so this avoids importing pandas and numpy.
+    """
+    m = sys.modules.get(module)
+    return tuple(getattr(m, n) for n in names) if m is not None else ()
+
+
+def _copy_on_write(pd):
+    return int(pd.__version__.split('.')[0]) >= 3 or getattr(pd.options.mode, 'copy_on_write', False) is True
+
+
+def approximate_size(value, default=0):
+    """ A cheap estimate of the memory held by a value. default is used for objects we can't
+    measure (ex. the size of the file the object was read from).
+    """
+    if isinstance(value, _types('pandas', 'DataFrame', 'Series')):
+        nbytes = value.memory_usage(index=True, deep=False)
+        nbytes = int(nbytes.sum()) if hasattr(nbytes, 'sum') else int(nbytes)
+        return max(nbytes, default)  # object columns are only counted as pointers
+    if isinstance(value, _types('numpy', 'ndarray')):
+        return int(value.nbytes)
+    return default
+
+
+def protect(value):
+    """ Return a version of a cached value that the caller can't use to corrupt the cache.
+    DataFrames are shallow copies when pandas has copy-on-write and deep copies otherwise and
+    arrays are read-only views. Anything else (ex. models) is returned as is.
+    """
+    if isinstance(value, _types('pandas', 'DataFrame', 'Series')):
+        return value.copy(deep=not _copy_on_write(sys.modules['pandas']))
+    if isinstance(value, _types('numpy', 'ndarray')):
+        view = value.view()
+        view.flags.writeable = False
+        return view
+    return value
+
+
+class MemoryCache(object):
+    """ A thread safe LRU cache that evicts the least recently used values once the total
+    approximate size goes over maxbytes. Every entry is tagged with the path it was read
+    from so it can be invalidated when that file is rewritten.
+    """
+
+    def __init__(self, maxbytes):
+        self._maxbytes = maxbytes
+        self._entries = collections.OrderedDict()  # key -> (value, nbytes, path)
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.RLock()
+
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+
+    def set(self, key, value, path, nbytes):
+        """ Cache a value. Values bigger than the whole budget are not cached.
+        """
+        if nbytes > self._maxbytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (value, nbytes, str(path))
+            self._bytes += nbytes
+            while self._bytes > self._maxbytes:
+                self._pop(next(iter(self._entries)))
+
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+
+    def invalidate(self, path):
+        """ Drop every entry that was read from path.
+        """
+        path = str(path)
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e[2] == path]:
+                self._pop(key)
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._hits = 0
+            self._misses = 0
+
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, len(self._entries), self._bytes, self._maxbytes)
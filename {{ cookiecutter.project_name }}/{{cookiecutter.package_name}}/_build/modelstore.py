@@ -0,0 +1,145 @@
+""" A content addressed store of trained models. Every successful modeling step is stored
+under a fingerprint of its code, the hashes of its inputs and the versions of the libraries
+it was trained with so a rebuild with the same fingerprint (ex. after switching back to a
+branch) reuses the stored files instead of training again.
+"""
+from . import pathutils
+
+import datetime
+import hashlib
+import importlib
+import json
+import os
+import pathlib
+import platform
+import shutil
+import uuid
+
+LIBRARIES = ('sklearn', 'numpy', 'scipy', 'pandas', 'joblib', 'pyarrow')
+ENTRY_FILENAME = '.entry.json'
+
+
+def library_versions():
+    """ the python version and the versions of the libraries a pickled model depends on
+    """
+    versions = {'python': platform.python_version()}
+    for name in LIBRARIES:
+        try:
+            versions[name] = getattr(importlib.import_module(name), '__version__', None)
+        except ImportError:
+            versions[name] = None
+    return versions
+
+
+def model_fingerprint(code, input_hashes, versions):
+    """ Hash a step's code hash, the sha256 of each input (a dict of filename -> hash) and the
+    library versions.
+    """
+    payload = json.dumps([code, input_hashes, versions], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def update_metadata(filepath, **fields):
+    """ Add fields to a json metadata file. The file is replaced rather than rewritten since it
+    may be hardlinked to the store.
+    """
+    with open(filepath, 'r') as f:
+        metadata = json.load(f)
+    metadata.update(fields)
+    tmp = f'{filepath}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(metadata, f)
+    os.replace(tmp, filepath)
+
+
+class ModelStore(object):
+    """ Stores the output files of a step in <folder>/<fingerprint>/ along with a small entry
+    recording the step and how long it took to train. Files are hardlinked in and out of the
+    store so neither direction copies any bytes. If maxbytes is given the least recently stored 
+    or restored entries are deleted whenever the stored files add up to more than it.
+    """
+
+    def __init__(self, folder, maxbytes=None):
+        self._folder = pathlib.Path(folder)
+        self._maxbytes = maxbytes
+
+
+    def entry(self, fingerprint):
+        """ Return the stored entry for a fingerprint or None.
+        """
+        try:
+            with open(self._folder / fingerprint / ENTRY_FILENAME, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def restore(self, fingerprint, target_folder, filenames):
+        """ Link the stored files of a fingerprint into target_folder. Returns the stored entry
+        or None if the fingerprint is not stored with all of filenames.
+        """
+        entry = self.entry(fingerprint)
+        if entry is None or not set(filenames) <= set(entry['files']):
+            return None
+        src = self._folder / fingerprint
+        for name in entry['files']:
+            pathutils.link_or_copy(src / name, pathlib.Path(target_folder) / name)
+        os.utime(src / ENTRY_FILENAME)  # the entry's mtime orders the entries for prune
+        return entry
+
+
+    def put(self, fingerprint, target_folder, filenames, **info):
+        """ Store filenames (relative to target_folder) under fingerprint. The entry is built in
+        a temporary folder and renamed into place so a partly stored model is never restored.
+        """
+        dest = self._folder / fingerprint
+        if dest.exists():
+            return
+        tmp = self._folder / f'.{uuid.uuid4().hex}.tmp'
+        try:
+            for name in filenames:
+                pathutils.link_or_copy(pathlib.Path(target_folder) / name, tmp / name)
+            entry = dict(info, fingerprint=fingerprint, files=list(filenames),
+                created=datetime.datetime.now().isoformat(timespec='seconds'))
+            with open(tmp / ENTRY_FILENAME, 'w') as f:
+                json.dump(entry, f)
+            os.rename(tmp, dest)
+        except OSError:
+            if not dest.exists():
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        if self._maxbytes is not None:
+            self.prune(self._maxbytes, keep=fingerprint)
+
+
+    def _entries(self):
+        """ the (last used, bytes, fingerprint) of every stored entry, least recently used first
+        """
+        entries = []
+        for d in self._folder.iterdir() if self._folder.exists() else []:
+            try:
+                used = (d / ENTRY_FILENAME).stat().st_mtime
+            except OSError:  # a temporary folder being stored
+                continue
+            nbytes = sum(p.stat().st_size for p in d.rglob('*') if p.is_file())
+            entries.append((used, nbytes, d.name))
+        return sorted(entries)
+
+
+    def prune(self, maxbytes, keep=None):
+        """ Delete the least recently used entries until the stored files take at most maxbytes. 
+        The entry of the fingerprint keep is never deleted. Returns the deleted fingerprints.
+        """
+        entries = self._entries()
+        total = sum(nbytes for _, nbytes, _ in entries)
+        deleted = []
+        for _, nbytes, fingerprint in entries:
+            if total <= maxbytes:
+                break
+            if fingerprint == keep:
+                continue
+            shutil.rmtree(self._folder / fingerprint, ignore_errors=True)
+            total -= nbytes
+            deleted.append(fingerprint)
+        return deleted
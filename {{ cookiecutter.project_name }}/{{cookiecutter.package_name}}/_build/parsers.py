@@ -0,0 +1,563 @@
+""" Parsers that read and write the files in the data folder and a registry that looks
+them up by file suffix. pandas, joblib and sklearn are imported by the parsers that use
+them so building the registry doesn't import them.
+"""
+from . import pathutils
+from . import compress
+from . import schema as schemas
+
+import functools
+import importlib
+import os
+import json
+import pickle
+
+JSON_BACKENDS = ('orjson', 'ujson')  # fastest first, the standard library is the fallback
+
+FOLDERS = ('raw', 'entrypoint', 'models')
+
+
+class Parser(object):
+    """ Base class for parsers. read_options and write_options are defaults that are
+    merged with any options given to a single read or write call.
+
+    Parsers that set compressible also read and write their files compressed when the 
+    filename ends in one of compress.CODECS (ex. x.csv.zst). Give compression_level in the 
+    write options to change the level from compress.DEFAULT_LEVELS.
+
+    Parsers that set typed accept a schema read option (see the schema module) that sets the 
+    columns to read and their types.
+    """
+    compressible = False
+    typed = False
+
+    def __init__(self, read_options=None, write_options=None):
+        self.read_options = read_options or {}
+        self.write_options = write_options or {}
+
+    def _read_kwargs(self, options, **defaults):
+        defaults.update(self.read_options)
+        defaults.update(options)
+        return defaults
+
+    def _write_kwargs(self, options, **defaults):
+        defaults.update(self.write_options)
+        defaults.update(options)
+        return defaults
+
+    def read(self, filepath, **options):
+        raise NotImplementedError
+
+    def write(self, filepath, data, **options):
+        raise NotImplementedError
+
+    def read_chunks(self, filepath, chunksize, **options):
+        """ Return an iterator of DataFrames with at most chunksize rows each. Only parsers 
+        for tabular formats support this.
+        """
+        raise TypeError(f'{type(self).__name__} does not support chunked reads')
+
+    def chunk_writer(self, filepath, **options):
+        """ Return a ChunkWriter that appends DataFrames to filepath one at a time.
+        """
+        raise TypeError(f'{type(self).__name__} does not support chunked writes')
+
+    def metadata_filename(self, filename):
+        """ The json metadata file written next to filename or None if the parser doesn't write one.
+        """
+        return None
+
+
+class ChunkWriter(object):
+    """ Appends DataFrames to a single file. Use as a context manager so the file is 
+    closed once the last chunk is written.
+    """
+
+    def __init__(self, filepath, **options):
+        pathutils.touch_filepath(filepath)
+        self.filepath = filepath
+        self.options = options
+        self.chunks = 0
+
+    def write(self, data):
+        self._write(_to_dataframe(data))
+        self.chunks += 1
+
+    def _write(self, df):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _CSVChunkWriter(ChunkWriter):
+
+    def __init__(self, filepath, **options):
+        level = options.pop('compression_level', None)
+        super().__init__(filepath, **options)
+        self._f = compress.open_file(filepath, 'w', level, encoding=options.get('encoding') or 'utf-8', newline='')
+
+    def _write(self, df):
+        df.to_csv(self._f, header=self.chunks == 0, **self.options)
+
+    def close(self):
+        self._f.close()
+
+
+class _JsonLinesChunkWriter(ChunkWriter):
+
+    def __init__(self, filepath, **options):
+        level = options.pop('compression_level', None)
+        super().__init__(filepath, **options)
+        self._f = compress.open_file(filepath, 'w', level, encoding='utf-8', newline='\n')
+
+    def _write(self, df):
+        lines = df.to_json(orient='records', lines=True, **self.options)
+        self._f.write(lines if not lines or lines.endswith('\n') else lines + '\n')
+
+    def close(self):
+        self._f.close()
+
+
+class _ArrowChunkWriter(ChunkWriter):
+    """ Writes chunks as record batches. The schema is taken from the first chunk and later 
+    chunks are cast to it.
+    """
+
+    def __init__(self, filepath, open_writer, **options):
+        super().__init__(filepath, **options)
+        self._open_writer = open_writer
+        self._writer = None
+        self._schema = None
+
+    def _write(self, df):
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = self._open_writer(str(self.filepath), self._schema, **self.options)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _json_loads():
+    """ loads of the fastest installed json backend
+    """
+    for name in JSON_BACKENDS:
+        try:
+            return importlib.import_module(name).loads
+        except ImportError:
+            pass
+    return json.loads
+
+
+def _loads(raw, **options):
+    """ Decode json bytes with the fastest backend. Options are only understood by the standard
+    library so they always use it, as do documents the fast backends reject (ex. NaN).
+    """
+    if not options:
+        try:
+            return _json_loads()(raw)
+        except ValueError:
+            pass
+    return json.loads(raw, **options)
+
+
+class JsonParser(Parser):
+    """ Reads json documents with orjson or ujson when one is installed and the standard library
+    otherwise. The whole file is read as bytes and decoded in one go. Writes use the standard library.
+    """
+    compressible = True
+
+    def read(self, filepath, **options):
+        with compress.open_file(filepath, 'rb') as f:
+            raw = f.read()
+        return _loads(raw, **self._read_kwargs(options))
+
+    def write(self, filepath, data, **options):
+        options = self._write_kwargs(options)
+        level = options.pop('compression_level', None)
+        pathutils.touch_filepath(filepath)
+        with compress.open_file(filepath, 'w', level) as f:
+            json.dump(data, f, **options)
+
+
+def _to_dataframe(data):
+    import pandas as pd
+    if not isinstance(data, pd.DataFrame):
+        data = pd.DataFrame.from_records(data)
+    return data
+
+
+def _read_csv(filepath, **options):
+    """ compressed files are decompressed as a stream and pandas decodes the bytes so the 
+    encoding option still applies. Chunked readers keep the stream open until they are exhausted.
+    """
+    import pandas as pd
+    if compress.codec_of(filepath) is None:
+        return pd.read_csv(filepath, **options)
+    f = compress.open_file(filepath, 'rb')
+    if options.get('chunksize') is None:
+        with f:
+            return pd.read_csv(f, **options)
+    return _closing_chunks(f, pd.read_csv(f, **options))
+
+
+def _closing_chunks(f, reader):
+    with f:
+        for chunk in reader:
+            yield chunk
+
+
+class PandasCSVParser(Parser):
+    """ Reads and writes csv files with pandas. A schema read option is turned into usecols and 
+    dtype and the file is then parsed with the pyarrow engine when possible.
+    """
+    compressible = True
+    typed = True
+
+    def read(self, filepath, **options):
+        options = self._read_kwargs(options)
+        return schemas.apply(_read_csv(filepath, **schemas.csv_options(options)), options.get('schema'))
+
+    def write(self, filepath, data, **options):
+        options = self._write_kwargs(options, index=False)
+        level = options.pop('compression_level', None)
+        pathutils.touch_filepath(filepath)
+        if compress.codec_of(filepath) is None:
+            _to_dataframe(data).to_csv(filepath, **options)
+            return
+        with compress.open_file(filepath, 'w', level, encoding=options.get('encoding') or 'utf-8', newline='') as f:
+            _to_dataframe(data).to_csv(f, **options)
+
+    def read_chunks(self, filepath, chunksize, **options):
+        options = self._read_kwargs(options, chunksize=chunksize)
+        chunks = _read_csv(filepath, **schemas.csv_options(options))
+        return (schemas.apply(chunk, options.get('schema')) for chunk in chunks)
+
+    def chunk_writer(self, filepath, **options):
+        return _CSVChunkWriter(filepath, **self._write_kwargs(options, index=False))
+
+
+def _read_json_lines(filepath, **options):
+    """ compressed files are decompressed as a stream like _read_csv
+    """
+    import pandas as pd
+    options = dict(options, lines=True)
+    if compress.codec_of(filepath) is None:
+        return pd.read_json(filepath, **options)
+    f = compress.open_file(filepath, 'r', encoding='utf-8')
+    if options.get('chunksize') is None:
+        with f:
+            return pd.read_json(f, **options)
+    return _closing_chunks(f, pd.read_json(f, **options))
+
+
+def _iter_records(filepath, **options):
+    with compress.open_file(filepath, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield _loads(line, **options)
+
+
+class JsonLinesParser(Parser):
+    """ Reads and writes newline delimited json (one record per line, ex. api dumps). Files are read 
+    into a DataFrame with pandas.read_json(lines=True) and can be streamed in chunks. Pass the read 
+    option records=True to get a generator of the decoded records instead, which holds one line in 
+    memory at a time. DataFrames are written one record per line and so are lists or generators of 
+    dicts.
+    """
+    compressible = True
+
+    def read(self, filepath, records=False, **options):
+        options = self._read_kwargs(options)
+        if records:
+            return _iter_records(filepath, **options)
+        return _read_json_lines(filepath, **options)
+
+    def write(self, filepath, data, **options):
+        options = self._write_kwargs(options)
+        if hasattr(data, 'to_json'):
+            with self.chunk_writer(filepath, **options) as writer:
+                writer.write(data)
+            return
+        level = options.pop('compression_level', None)
+        pathutils.touch_filepath(filepath)
+        with compress.open_file(filepath, 'w', level, encoding='utf-8', newline='\n') as f:
+            for record in data:
+                f.write(json.dumps(record, **options) + '\n')
+
+    def read_chunks(self, filepath, chunksize, **options):
+        options = self._read_kwargs(options, chunksize=chunksize)
+        options.pop('records', None)
+        return _read_json_lines(filepath, **options)
+
+    def chunk_writer(self, filepath, **options):
+        return _JsonLinesChunkWriter(filepath, **self._write_kwargs(options))
+
+
+def _filters_to_expression(filters):
+    """ convert filters given in the pandas/pyarrow list of tuples format into a pyarrow
+    expression. Expressions are passed through as is.
+    """
+    import pyarrow.parquet as pq
+    if filters is None or not isinstance(filters, (list, tuple)):
+        return filters
+    if hasattr(pq, 'filters_to_expression'):  # pyarrow >= 10
+        return pq.filters_to_expression(filters)
+    return pq._filters_to_expression(filters)
+
+
+def _read_batches(filepath, fmt, chunksize, columns=None, filters=None, schema=None, **options):
+    """ Stream record batches of a columnar file through pyarrow.dataset as DataFrames.
+    """
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(str(filepath), format=fmt)
+    batches = dataset.to_batches(columns=schemas.columns(schema, columns), filter=_filters_to_expression(filters), 
+        batch_size=chunksize)
+    for batch in batches:
+        yield schemas.apply(batch.to_pandas(**options), schema)
+
+
+class ParquetParser(Parser):
+    """ Reads and writes parquet files with pyarrow. Pass columns=[...] to only read some columns
+    and filters=[('col', '>', 1), ...] to push predicates down to the row groups. With a schema 
+    only its columns are read and cast to its types.
+    """
+    typed = True
+
+    def read(self, filepath, **options):
+        import pandas as pd
+        options = self._read_kwargs(options, engine='pyarrow')
+        schema = options.pop('schema', None)
+        options['columns'] = schemas.columns(schema, options.get('columns'))
+        if options.get('filters') is None:
+            options.pop('filters', None)
+        return schemas.apply(pd.read_parquet(filepath, **options), schema)
+
+    def write(self, filepath, data, **options):
+        pathutils.touch_filepath(filepath)
+        _to_dataframe(data).to_parquet(filepath, **self._write_kwargs(options, engine='pyarrow', index=False))
+
+    def read_chunks(self, filepath, chunksize, **options):
+        options = self._read_kwargs(options)
+        options.pop('engine', None)
+        return _read_batches(filepath, 'parquet', chunksize, **options)
+
+    def chunk_writer(self, filepath, **options):
+        import pyarrow.parquet as pq
+        options = self._write_kwargs(options)
+        for k in ('engine', 'index'):
+            options.pop(k, None)
+        return _ArrowChunkWriter(filepath, pq.ParquetWriter, **options)
+
+
+class FeatherParser(Parser):
+    """ Reads and writes feather (arrow ipc) files with pyarrow. Supports the same columns,
+    filters and schema options as the ParquetParser.
+    """
+    typed = True
+
+    def read(self, filepath, **options):
+        import pandas as pd
+        options = self._read_kwargs(options)
+        schema = options.pop('schema', None)
+        columns = schemas.columns(schema, options.pop('columns', None))
+        filters = options.pop('filters', None)
+        if filters is None:
+            return schemas.apply(pd.read_feather(filepath, columns=columns, **options), schema)
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(str(filepath), format='feather')
+        table = dataset.to_table(columns=columns, filter=_filters_to_expression(filters))
+        return schemas.apply(table.to_pandas(**options), schema)
+
+    def write(self, filepath, data, **options):
+        pathutils.touch_filepath(filepath)
+        _to_dataframe(data).reset_index(drop=True).to_feather(filepath, **self._write_kwargs(options))
+
+    def read_chunks(self, filepath, chunksize, **options):
+        return _read_batches(filepath, 'feather', chunksize, **self._read_kwargs(options))
+
+    def chunk_writer(self, filepath, **options):
+        import pyarrow as pa
+        return _ArrowChunkWriter(filepath, pa.ipc.new_file, **self._write_kwargs(options))
+
+
+def _joblib_dump(data, filepath, compression_level=None, **options):
+    """ dump with joblib into a temp file and move it into place. Readers may have the old 
+    file memory mapped so it must be replaced rather than truncated and rewritten.
+    """
+    import joblib
+    pathutils.touch_filepath(filepath)
+    tmp = str(filepath) + '.tmp'
+    codec = compress.codec_of(filepath)
+    if codec is None:
+        joblib.dump(data, tmp, **options)
+    else:
+        with compress.open_file(tmp, 'wb', compression_level, codec=codec) as f:
+            joblib.dump(data, f, **options)
+    os.replace(tmp, filepath)
+
+
+def _joblib_load(filepath, **options):
+    """ compressed pickles are streamed into memory so mmap_mode is ignored for them.
+    """
+    import joblib
+    if compress.codec_of(filepath) is None:
+        return joblib.load(str(filepath), **options)
+    options.pop('mmap_mode', None)
+    with compress.open_file(filepath, 'rb') as f:
+        return joblib.load(f, **options)
+
+
+class PickleParser(Parser):
+    """ Pickles are written with joblib which stores numpy arrays (including the blocks of a 
+    DataFrame) uncompressed and aligned in the file. Pass mmap_mode='r' or 'c' to read them 
+    as memory maps that are shared through the page cache instead of copied onto the heap. 
+    Plain pickles written by other tools can still be read.
+    """
+    compressible = True
+
+    def read(self, filepath, **options):
+        return _joblib_load(filepath, **self._read_kwargs(options))
+
+    def write(self, filepath, data, **options):
+        _joblib_dump(data, filepath, **self._write_kwargs(options, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class SklearnPklParser(Parser):
+    """ Models are memory mapped copy-on-write (mmap_mode='c') by default. Large arrays are 
+    shared between every process that loads the same model and are only copied if a process 
+    writes to them. Pass mmap_mode=None to load everything onto the heap. Memory mapping does 
+    not work for compressed models (x.model.pkl.zst) which are always loaded onto the heap.
+    """
+    compressible = True
+
+    def read(self, filepath, **options):
+        return _joblib_load(filepath, **self._read_kwargs(options, mmap_mode='c'))
+
+    def metadata_filename(self, filename):
+        return compress.split(filename)[0].replace('model.pkl', 'metadata.json')
+
+    def write(self, filepath, model, **options):
+        import sklearn
+        _joblib_dump(model, filepath, **self._write_kwargs(options, protocol=pickle.HIGHEST_PROTOCOL))
+        # print(filepath)
+        # NOTE this metadata will only really work with sklearn built ins
+        # other parsers need to be implemented for other libraries.
+        fpath = self.metadata_filename(filepath)
+        with open(fpath, 'w') as f:
+            json.dump({
+                'sklearn-version': sklearn.__version__,
+                'model-name': os.path.basename(str(filepath))
+            }, f)
+
+
+class ParserRegistry(object):
+    """ Maps file suffixes (ex. 'csv' or 'model.pkl') to parsers. Lookups take the longest
+    registered suffix of a filename so 'x.model.pkl' resolves to 'model.pkl' even if 'pkl'
+    is also registered. Each suffix is registered for the data folders it is allowed in
+    which is used to build the discovery patterns for those folders. Compressed files of 
+    compressible parsers (ex. 'x.csv.zst') resolve to the suffix without the codec.
+    """
+
+    def __init__(self):
+        self._parsers = {}  # suffix -> parser
+        self._folders = {}  # suffix -> folders the suffix can be discovered in
+        self._patterns = {}
+
+
+    def register(self, suffix, parser, folders=FOLDERS):
+        """ Register a parser instance for a suffix. Registering an existing suffix replaces it.
+        """
+        if not isinstance(parser, Parser):
+            raise TypeError(f'{parser!r} must be an instance of Parser')
+        unknown = set(folders) - set(FOLDERS)
+        if unknown:
+            raise ValueError(f'Unknown data folders {sorted(unknown)}. Use any of {FOLDERS}')
+        suffix = suffix.lower().lstrip('*').lstrip('.')
+        if not suffix:
+            raise ValueError('suffix must not be empty')
+        self._parsers[suffix] = parser
+        self._folders[suffix] = tuple(folders)
+        self._patterns = {}  # rebuilt on the next call to patterns
+
+
+    def _longest(self, name):
+        parts = name.split('.')
+        for i in range(1, len(parts)):   # longest first
+            s = '.'.join(parts[i:])
+            if s in self._parsers:
+                return s
+        return None
+
+
+    def suffix(self, filename):
+        """ Return the longest registered suffix of a filename or None. A codec suffix is 
+        dropped if the whole name has no registered suffix and the parser is compressible.
+        """
+        name = os.path.basename(str(filename)).lower()
+        s = self._longest(name)
+        if s is None:
+            base, codec = compress.split(name)
+            if codec is not None:
+                s = self._longest(base)
+                if s is not None and not self._parsers[s].compressible:
+                    s = None
+        return s
+
+
+    def lookup(self, filename):
+        """ Return the parser for a filename. Raises a TypeError if no suffix is registered.
+        """
+        s = self.suffix(filename)
+        if s is None:
+            raise TypeError(f'Parser extension not found for {filename}')
+        return self._parsers[s]
+
+
+    def accepts(self, filename, folder):
+        """ True if the filename has a suffix that is registered for the folder.
+        """
+        s = self.suffix(filename)
+        return s is not None and folder in self._folders[s]
+
+
+    def patterns(self, folder):
+        """ Return the glob patterns that discover files for a folder.
+        """
+        if folder not in self._patterns:
+            patterns = []
+            for s, f in self._folders.items():
+                if folder in f:
+                    patterns.append('*.' + s)
+                    if self._parsers[s].compressible:
+                        patterns.extend(f'*.{s}.{c}' for c in compress.CODECS)
+            self._patterns[folder] = sorted(patterns)
+        return self._patterns[folder]
+
+
+def create_parser_registry():
+    """ Return a registry with the built in parsers. Pickles never belong in raw/ and
+    models are only written to models/.
+    """
+    registry = ParserRegistry()
+    registry.register('json', JsonParser())
+    registry.register('jsonl', JsonLinesParser())
+    registry.register('csv', PandasCSVParser())
+    registry.register('parquet', ParquetParser())
+    registry.register('feather', FeatherParser())
+    registry.register('arrow', FeatherParser())
+    registry.register('data.pkl', PickleParser(), folders=('entrypoint', 'models'))
+    registry.register('model.pkl', SklearnPklParser(), folders=('models',))
+    return registry
@@ -2,22 +2,56 @@ import pathlib
 import os 
 import fnmatch 
 import re
+import collections
+import functools
+import shutil
+
+ScannedFile = collections.namedtuple('ScannedFile', ['path', 'size', 'mtime_ns'])
+
+
+@functools.lru_cache(maxsize=64)
+def compile_patterns(patterns):
+    """ Combine a tuple of glob patterns into a single case insensitive regex so each 
+    filename is matched once. 
+    """
+    return re.compile('|'.join(f'(?:{fnmatch.translate(p)})' for p in patterns), re.IGNORECASE)
+
+
+def scan(source_folder, accept=('*.*',)):
+    """ Lazily yield a ScannedFile for every file below source_folder whose name matches one 
+    of the glob patterns in accept. The size and mtime come from the one stat call made while 
+    scanning so change detection can use them without stating the file again. Like os.walk 
+    symlinked folders are not followed and folders that can't be read are skipped.
+    """
+    match = compile_patterns(tuple(accept)).match
+    stack = [str(source_folder)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        subdirs = []
+        with it:
+            for entry in it:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                elif match(entry.name):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:  # a broken symlink or deleted since it was listed
+                        continue
+                    yield ScannedFile(pathlib.Path(entry.path), st.st_size, st.st_mtime_ns)
+        stack.extend(reversed(subdirs))
+
 
 def build_subpaths(source_folder, accept=['*.*'], check_exists=True):
     """ For a given source_folder return full Posix paths for all 
-    subfolders/files given the regex pattern in accept. Defaults to all files.
-    """
-    subpaths = []
-    for p in os.walk(source_folder):
-        for f in p[-1]:
-            for pattern in accept:
-                if re.match(fnmatch.translate(pattern), f, re.IGNORECASE):
-                    subpaths.append(pathlib.Path(p[0])/f)
-    if check_exists:
-        for s in subpaths:
-            assert s.exists(), f'{s} does not exist'
-    
-    return subpaths
+    subfolders/files given the glob patterns in accept. Defaults to all files. 
+    Every path was found by scanning the folder so check_exists is kept only for 
+    backwards compatibility.
+    """
+    return [f.path for f in scan(source_folder, accept)]
 
 
 def posix_path_from_string(path_str, check_exists=True):
@@ -49,3 +83,97 @@ def touch_filepath(path):
     pathlib.Path(dir_).mkdir(parents=True, exist_ok=True)
 
 
+def link_or_copy(src, dest):
+    """ Hardlink src to dest so no bytes are copied, falling back to a copy that keeps the 
+    mtime if the filesystem can't link (ex. src and dest are on different devices). dest is 
+    replaced atomically. Linked files share their data so they must be replaced rather than 
+    modified in place.
+    """
+    if os.path.exists(dest) and os.path.samefile(src, dest):  # already linked, renaming a link onto itself is a no-op
+        return
+    touch_filepath(dest)
+    tmp = f'{dest}.{os.getpid()}.tmp'
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copy2(src, tmp)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+
+
+def commit_folder(staging_folder, target_folder):
+    """ Move every file below staging_folder to the same relative path below target_folder. 
+    Each file is replaced atomically so readers see either the old or the new version.
+    """
+    staging_folder = pathlib.Path(staging_folder)
+    moved = []
+    for f in scan(staging_folder, accept=('*',)):
+        dest = pathlib.Path(target_folder) / f.path.relative_to(staging_folder)
+        touch_filepath(dest)
+        os.replace(f.path, dest)
+        moved.append(dest)
+    return moved
+
+
+
+def is_partitioned(filename):
+    """ True if a registered filename names a partitioned dataset, ex. 'events/date=*/' or 'events/*.csv'
+    """
+    return '*' in str(filename)
+
+
+def check_partition_pattern(pattern):
+    """ A partition pattern has a single * that does not span folders. A trailing / makes each 
+    partition a folder (ex. 'events/date=*/') otherwise each partition is a file ('events/*.csv').
+    """
+    pattern = str(pattern)
+    if pattern.count('*') != 1:
+        raise ValueError(f'{pattern} must have exactly one * marking the partition')
+    if pattern.startswith('/'):
+        raise ValueError(f'{pattern} must be relative to the data folder')
+
+
+def partition_name(pattern, value):
+    """ the filename of one partition of a pattern without any trailing /
+    """
+    return str(pattern).replace('*', value, 1).rstrip('/')
+
+
+def partition_column(pattern):
+    """ the column of a hive style pattern ('events/date=*/' -> 'date') or None.
+    """
+    for part in str(pattern).split('/'):
+        if part.endswith('=*'):
+            return part[:-2]
+    return None
+
+
+def _partition_regex(pattern):
+    prefix, suffix = str(pattern).rstrip('/').split('*')
+    return re.compile(re.escape(prefix) + '([^/]+)' + re.escape(suffix) + ('(?:/.*)?' if str(pattern).endswith('/') else '') + '$')
+
+
+def in_partition(relpath, pattern):
+    """ True if a path relative to the data folder is (or is inside) a partition of pattern.
+    """
+    return _partition_regex(pattern).match(str(relpath)) is not None
+
+
+def find_partitions(folder, pattern):
+    """ Return an OrderedDict of partition value -> path for every partition of pattern below 
+    folder sorted by value. Hidden files and folders are never partitions.
+    """
+    check_partition_pattern(pattern)
+    folder = pathlib.Path(folder)
+    match = _partition_regex(pattern).match
+    want_dir = str(pattern).endswith('/')
+    partitions = {}
+    for p in folder.glob(str(pattern).rstrip('/')):
+        m = match(p.relative_to(folder).as_posix())
+        if m is None or m.group(1).startswith('.') or p.is_dir() != want_dir:
+            continue
+        partitions[m.group(1)] = p
+    return collections.OrderedDict(sorted(partitions.items()))
@@ -1,32 +1,122 @@
-import click 
+import click
+import concurrent.futures
+import hashlib
+import json
 import os
 import sys
-import subprocess
+import time
 
-from .config import REPORTS_DIR, NOTEBOOKS_DIR
+from .config import REPORTS_DIR, NOTEBOOKS_DIR, ENTRYPOINT_DATA_DIR, MODELS_DIR, CACHE_DIR
+from .manifest import BuildManifest
+from .scheduler import create_executor
+
+REPORTS_MANIFEST_DIR = CACHE_DIR / 'reports'  # machine specific so it's kept out of git with the cache
+
+
+def _notebook_hash(filepath):
+    """ hash the cell types and sources and the kernel of a notebook. Outputs and execution
+    counts are ignored so a notebook that was only run in jupyter is not considered changed.
+    """
+    with open(filepath, 'r') as f:
+        nb = json.load(f)
+    cells = [(c.get('cell_type'), ''.join(c.get('source', ''))) for c in nb.get('cells', [])]
+    kernel = nb.get('metadata', {}).get('kernelspec', {}).get('name')
+    return hashlib.sha256(json.dumps([kernel, cells]).encode()).hexdigest(), cells
+
+
+def _data_files():
+    """ map <folder>/<path in the folder> -> path for everything in the entrypoint and models 
+    folders so files with the same name in both folders or in different subfolders are all kept.
+    """
+    files = {}
+    for folder in (ENTRYPOINT_DATA_DIR, MODELS_DIR):
+        for dn, dirs, fnames in os.walk(folder):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for n in fnames:
+                if not n.startswith('.'):
+                    p = os.path.join(dn, n)
+                    files[folder.name + '/' + os.path.relpath(p, folder).replace(os.sep, '/')] = p
+    return files
+
+
+def _referenced_files(cells, data_files):
+    """ the data files whose name appears anywhere in the notebook's cell sources. A name can't 
+    tell which folder a notebook reads so every file with that name is referenced.
+    """
+    source = '\n'.join(s for _, s in cells)
+    return {k: p for k, p in data_files.items() if os.path.basename(p) in source}
+
+
+def _render(filepath, output_path):
+    """ execute a notebook in its own folder and write it as html. Runs in a worker process.
+    Returns the time it took in seconds.
+    """
+    import nbformat
+    from nbconvert import HTMLExporter
+    from nbconvert.preprocessors import ExecutePreprocessor
+
+    start = time.perf_counter()
+    nb = nbformat.read(filepath, as_version=4)
+    ExecutePreprocessor(timeout=None).preprocess(nb, {'metadata': {'path': os.path.dirname(filepath)}})
+    body, _ = HTMLExporter().from_notebook_node(nb)
+    tmp = output_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(body)
+    os.replace(tmp, output_path)
+    return time.perf_counter() - start
 
 
 @click.command()
-def persist_notebooks():
-    """ Use nbconvert to check notebooks into reports using html. All notebooks with the 
-    extension <name>.report.ipynb will be checked in. Note that nbconvert does not handle whitespace in 
-    the directory structure. If you need whitespaces in your folder paths, process these manually.
-    """ 
-    filepaths = [str(NOTEBOOKS_DIR / n) for n in os.listdir(NOTEBOOKS_DIR) if n.endswith('report.ipynb')]
+@click.option('--force', is_flag=True, help='Render every report even if nothing changed.')
+@click.option('-j', '--jobs', type=click.INT, default=min(4, os.cpu_count() or 1), show_default=True,
+    help='Number of notebooks to execute at once.')
+def persist_notebooks(force, jobs):
+    """ Use nbconvert to check notebooks into reports using html. All notebooks with the
+    extension <name>.report.ipynb will be checked in. A notebook is only executed again if its
+    cells or any data/entrypoint or data/models file named in its cells changed since its html
+    was last rendered.
+    """
+    filepaths = sorted(str(NOTEBOOKS_DIR / n) for n in os.listdir(NOTEBOOKS_DIR) if n.endswith('report.ipynb'))
     if len(filepaths) == 0:
         print("No ipynb filepaths found. Any notebooks you want to persist as html must end with the 'report.ipynb' extension")
         sys.exit(0)
 
+    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = BuildManifest(REPORTS_MANIFEST_DIR)
+    data_files = _data_files()
+    pending = {}
     for f in filepaths:
-        if ' ' in f:
-            print(f"""Spaces found in report filepath {f} which nbconvert cannot handle.\n 
-                Remove spaces from the filename to process or process manually.""")
-            continue 
-    
-        else:
-            print(f'Converting the following notebooks: {f}')
-            cmd = f'jupyter nbconvert {f} --to=html --execute --log-level=INFO --output-dir={REPORTS_DIR}'
-            subprocess.run(cmd, shell=True, check=True)
-
+        name = os.path.basename(f)
+        code, cells = _notebook_hash(f)
+        inputs = _referenced_files(cells, data_files)
+        outputs = {name[:-len('.ipynb')] + '.html': str(REPORTS_DIR / (name[:-len('.ipynb')] + '.html'))}
+        if not force and manifest.is_fresh(name, code, inputs, outputs):
+            print(f'Skipping {name}... unchanged since it was last rendered')
+            continue
+        pending[name] = (f, code, inputs, outputs)
 
+    failures = []
+    try:
+        with create_executor(jobs, 'process') as pool:
+            futures = {}
+            for name, (f, code, inputs, outputs) in pending.items():
+                print(f'Converting the following notebooks: {f}')
+                futures[pool.submit(_render, f, list(outputs.values())[0])] = name
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+                err = future.exception()
+                if err is not None:
+                    print(f'FAILED {name}: {err!r}')
+                    failures.append(name)
+                    continue
+                print(f'Rendered {name} in {future.result():.1f}s')
+                _, code, inputs, outputs = pending[name]
+                manifest.record(name, code, inputs, outputs)
+                manifest.save()
+    finally:
+        manifest.prune(os.path.basename(f) for f in filepaths)
+        manifest.save()
 
+    if failures:
+        print(f'{len(failures)} of {len(filepaths)} reports failed: {failures}')
+        sys.exit(1)
@@ -0,0 +1,69 @@
+""" Deterministic row samples of inputs for quick trial builds (ex. build-entrypoint --sample 10000).
+A sample is either a number of rows (an int) or a fraction of them (a float). Inputs whose parser
+can read chunks are streamed so only about the sample is ever held in memory. Rows are picked with
+a fixed seed so the same file always gives the same sample and they keep their order in the file.
+"""
+from .memcache import _types
+
+SEED = 0
+CHUNKSIZE = 100000
+
+
+def check_sample(sample):
+    """ Raise a ValueError unless sample is None, a positive number of rows or a fraction in (0, 1].
+    """
+    if sample is None:
+        return
+    if isinstance(sample, bool) or not isinstance(sample, (int, float)):
+        raise ValueError(f'sample must be a number of rows or a fraction, got {sample!r}')
+    if isinstance(sample, int) and sample < 1:
+        raise ValueError(f'sample must be at least 1 row, got {sample}')
+    if isinstance(sample, float) and not 0 < sample <= 1:
+        raise ValueError(f'A sample fraction must be in (0, 1], got {sample}')
+
+
+def sample_size(sample, nrows):
+    """ the number of rows a sample keeps out of nrows
+    """
+    if isinstance(sample, float):
+        return int(round(sample * nrows))
+    return min(sample, nrows)
+
+
+def sample_chunks(chunks, sample, seed=SEED):
+    """ Sample an iterator of DataFrames. Every row gets a random key and a fraction keeps the rows
+    whose key is below it. A number of rows keeps a reservoir of the rows with the smallest keys,
+    which is a uniform sample that holds at most that many rows plus one chunk.
+    """
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    kept, keys = [], np.empty(0)
+    for chunk in chunks:
+        k = rng.random(len(chunk))
+        if isinstance(sample, float):
+            kept.append(chunk[k < sample])
+            continue
+        kept.append(chunk)
+        keys = np.concatenate([keys, k])
+        if len(keys) > sample:
+            reservoir = pd.concat(kept)
+            rows = np.sort(np.argpartition(keys, sample)[:sample])  # sorted to keep the file order
+            kept, keys = [reservoir.iloc[rows]], keys[rows]
+    if not kept:
+        return pd.DataFrame()
+    return pd.concat(kept).reset_index(drop=True)
+
+
+def sample_data(data, sample, seed=SEED):
+    """ Sample a value that was read whole. DataFrames, arrays and lists of records are sampled by
+    row, anything else (ex. a json object or a model) is returned as is.
+    """
+    import numpy as np
+    if isinstance(data, _types('pandas', 'DataFrame')):
+        return sample_chunks([data], sample, seed)
+    if isinstance(data, (list, np.ndarray)):
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.permutation(len(data))[:sample_size(sample, len(data))])
+        return data[rows] if isinstance(data, np.ndarray) else [data[i] for i in rows]
+    return data
@@ -0,0 +1,221 @@
+""" Builds a dependency graph from the data manager registries and runs it on a pool
+of workers in topological order.
+"""
+from . import pathutils
+
+import collections
+import concurrent.futures
+import heapq
+import traceback
+
+
+class BuildError(RuntimeError):
+    """ Raised after a build finishes if any step failed. failures maps the step key to
+    the exception it raised and blocked lists the steps that never ran because something
+    upstream failed.
+    """
+    def __init__(self, message, failures, blocked):
+        super().__init__(message)
+        self.failures = failures
+        self.blocked = blocked
+
+
+class Step(object):
+    """ A node in the build graph. inputs and outputs map the registered filenames to full
+    paths. An input that is produced by another registered step and does not exist in the
+    source folder is read from the target folder instead.
+    """
+
+    def __init__(self, key, index, func, inputs, outputs, options=None):
+        self.key = key
+        self.index = index  # declaration order
+        self.func = func
+        self.inputs = inputs
+        self.outputs = outputs
+        self.options = options or {}
+        self.deps = set()
+        self.dependents = set()
+
+    def __repr__(self):
+        return f'Step({self.key})'
+
+
+def _partition_steps(k, index, func, input_filenames, output_filenames, options, source_folder, target_folder):
+    """ A registered function whose first input is a partition pattern (ex. 'events/date=*/') 
+    becomes one step per partition found in the source folder keyed '<key>[<partition>]'. The 
+    * in the first input and in every output is replaced by the partition and read_options 
+    and write_options are moved to the partition's filenames.
+    """
+    pattern = input_filenames[0]
+    column = pathutils.partition_column(pattern)
+    steps = []
+    for value, path in pathutils.find_partitions(source_folder, pattern).items():
+        names = {f: pathutils.partition_name(f, value) for f in [pattern] + list(output_filenames)}
+        inputs = collections.OrderedDict([(names[pattern], path)])
+        inputs.update((f, source_folder / f) for f in input_filenames[1:])
+        outputs = collections.OrderedDict((names[f], target_folder / names[f]) for f in output_filenames)
+        opts = dict(options, partition=[column, value])
+        for o in ('read_options', 'write_options'):
+            opts[o] = {names.get(f, f): v for f, v in options.get(o, {}).items()}
+        steps.append(Step(f'{k}[{names[pattern].rsplit("/", 1)[-1]}]', index, func, inputs, outputs, opts))
+    return steps
+
+
+def build_graph(registry, source_folder, target_folder, key=None):
+    """ Return an OrderedDict of Steps for a registry in declaration order. Edges are added
+    from a step to any step that reads one of its outputs and between steps writing the
+    same output so the later declaration still wins. Raises a ValueError on cycles. 
+    Functions registered with a partitioned input get one step per partition.
+    """
+    key = key or (lambda func: func.__qualname__)
+    steps = collections.OrderedDict()
+    producers = collections.defaultdict(list)  # output filename -> producing step keys in declaration order
+
+    for i, (func, fnames) in enumerate(registry.items()):
+        input_filenames, output_filenames, options = fnames
+        k = key(func)
+        if input_filenames and pathutils.is_partitioned(input_filenames[0]):
+            partitions = _partition_steps(k, i, func, input_filenames, output_filenames, options, 
+                source_folder, target_folder)
+        else:
+            partitions = [Step(k, i, func,
+                inputs=collections.OrderedDict((f, source_folder / f) for f in input_filenames),
+                outputs=collections.OrderedDict((f, target_folder / f) for f in output_filenames), 
+                options=options)]
+        for step in partitions:
+            steps[step.key] = step
+            for f in step.outputs:
+                producers[f].append(step.key)
+
+    for step in steps.values():
+        for f in step.inputs:
+            upstream = [p for p in producers.get(f, []) if p != step.key]
+            if upstream and not step.inputs[f].exists():   # an intermediate file from another step
+                step.inputs[f] = target_folder / f
+                step.deps.update(upstream)
+        for f in step.outputs:  # write-write ordering
+            step.deps.update(p for p in producers[f] if steps[p].index < step.index)
+
+    for step in steps.values():
+        for d in step.deps:
+            steps[d].dependents.add(step.key)
+
+    _check_cycles(steps)
+    return steps
+
+
+def upstream_of(steps, keys):
+    """ Return the steps with the given keys and every step they depend on directly or indirectly
+    in their original order. Edges to steps that were left out are dropped.
+    """
+    needed = set()
+    stack = list(keys)
+    while stack:
+        k = stack.pop()
+        if k not in needed:
+            needed.add(k)
+            stack.extend(steps[k].deps)
+    subset = collections.OrderedDict((k, s) for k, s in steps.items() if k in needed)
+    for s in subset.values():
+        s.dependents = {d for d in s.dependents if d in needed}
+    return subset
+
+
+def _check_cycles(steps):
+    indegree = {k: len(s.deps) for k, s in steps.items()}
+    queue = [k for k, n in indegree.items() if n == 0]
+    seen = 0
+    while queue:
+        k = queue.pop()
+        seen += 1
+        for d in steps[k].dependents:
+            indegree[d] -= 1
+            if indegree[d] == 0:
+                queue.append(d)
+    if seen != len(steps):
+        cycle = sorted(k for k, n in indegree.items() if n > 0)
+        raise ValueError(f'Registered steps have a circular dependency: {cycle}')
+
+
+class _SerialExecutor(concurrent.futures.Executor):
+    """ Runs submitted work inline so that jobs=1 keeps the old behavior of running
+    everything in the calling process.
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as err:
+            future.set_exception(err)
+        return future
+
+
+def create_executor(jobs=1, executor='process'):
+    """ Return an executor for the given number of jobs. Processes are used by default since
+    most registered functions are cpu bound pandas code. Registered functions must be importable
+    at module level to be sent to a process pool.
+    """
+    if jobs <= 1:
+        return _SerialExecutor()
+    if executor == 'thread':
+        return concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    elif executor == 'process':
+        return concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+    raise ValueError(f'Unknown executor: {executor}. Use process or thread.')
+
+
+def run(steps, target, jobs=1, executor='process', skip=None, on_success=None):
+    """ Execute every step in topological order calling target(step) on the pool. Ready steps
+    are started in declaration order. skip(step) is checked once a step's dependencies are done
+    and on_success(step, result) is called in this process after each step finishes. A failed
+    step blocks everything downstream of it but independent steps keep running. Raises a
+    BuildError with a report of all failures at the end.
+    """
+    remaining = {k: len(s.deps) for k, s in steps.items()}
+    ready = [(s.index, k) for k, s in steps.items() if remaining[k] == 0]
+    heapq.heapify(ready)
+    failures = collections.OrderedDict()
+    blocked = []
+    running = {}
+
+    def _release(k):
+        for d in steps[k].dependents:
+            remaining[d] -= 1
+            if remaining[d] == 0:
+                heapq.heappush(ready, (steps[d].index, d))
+
+    with create_executor(jobs, executor) as pool:
+        while ready or running:
+            while ready and len(running) < max(jobs, 1):
+                _, k = heapq.heappop(ready)
+                step = steps[k]
+                if any(d in failures or d in blocked for d in step.deps):
+                    blocked.append(k)
+                    _release(k)
+                elif skip is not None and skip(step):
+                    _release(k)
+                else:
+                    running[pool.submit(target, step)] = k
+
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                k = running.pop(future)
+                err = future.exception()
+                if err is not None:
+                    failures[k] = err
+                    print(f'FAILED {k}: {err!r}')
+                elif on_success is not None:
+                    on_success(steps[k], future.result())
+                _release(k)
+
+    if failures:
+        lines = [f'{len(failures)} of {len(steps)} registered steps failed:']
+        for k, err in failures.items():
+            lines.append(f'--- {k}')
+            lines.append(''.join(traceback.format_exception(type(err), err, err.__traceback__)).rstrip())
+        if blocked:
+            lines.append(f'Not run because an upstream step failed: {blocked}')
+        raise BuildError('\n'.join(lines), failures, blocked) from None  # the report already holds the tracebacks
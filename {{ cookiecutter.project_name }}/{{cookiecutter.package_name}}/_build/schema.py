@@ -0,0 +1,79 @@
+""" Typed schemas for tabular files. A schema maps each column to read to its type so a file is
+parsed straight into compact dtypes rather than pandas inferring int64, float64 and object for
+every column, and columns that are not in the schema are never read, ex.
+
+    {'id': 'int32', 'kind': 'category', 'amount': 'float32', 'day': 'datetime', 'note': 'string'}
+
+A type is any pandas dtype name. 'datetime' parses the column as dates. Schemas are given to
+the csv, parquet and feather parsers as the schema read option.
+"""
+import importlib
+
+DATETIME = 'datetime'
+
+# read_csv options the pyarrow engine supports, any other option falls back to the c engine
+PYARROW_CSV_OPTIONS = {'sep', 'delimiter', 'header', 'names', 'index_col', 'usecols', 'dtype', 'parse_dates',
+    'date_format', 'true_values', 'false_values', 'na_values', 'keep_default_na', 'na_filter', 'encoding',
+    'quotechar', 'escapechar', 'doublequote', 'decimal', 'dtype_backend', 'engine'}
+
+
+def check_schema(schema):
+    """ Raise a TypeError unless schema is a non empty dict of column names to type names.
+    """
+    if not isinstance(schema, dict) or not schema:
+        raise TypeError(f'A schema must be a dict of column names to types, got {schema!r}')
+    for column, dtype in schema.items():
+        if not isinstance(column, str) or not isinstance(dtype, str):
+            raise TypeError(f'A schema must map column names to type names, got {column!r}: {dtype!r}')
+
+
+def _has_pyarrow():
+    try:
+        importlib.import_module('pyarrow')
+    except ImportError:
+        return False
+    return True
+
+
+def csv_options(options):
+    """ Replace the schema in a set of read_csv options with usecols and dtype, any dtype given
+    as well is kept. Dates are left to apply since converting them after the read is much faster
+    than parse_dates. Whole file reads use the multithreaded pyarrow engine when it is installed
+    and supports every other option. Without a schema pandas has to infer the types which it
+    does differently with pyarrow so those reads keep the c engine.
+    """
+    options = dict(options)
+    schema = options.pop('schema', None)
+    if schema is None:
+        return options
+    options.setdefault('usecols', list(schema))
+    dtype = {c: t for c, t in schema.items() if t != DATETIME}
+    options['dtype'] = dict(dtype, **(options.get('dtype') or {}))
+    if 'engine' not in options and set(options) <= PYARROW_CSV_OPTIONS and _has_pyarrow():
+        options['engine'] = 'pyarrow'
+    return options
+
+
+def columns(schema, columns=None):
+    """ the columns to read from a columnar file, columns given explicitly win.
+    """
+    return list(schema) if columns is None and schema is not None else columns
+
+
+def apply(data, schema):
+    """ Cast the columns of a DataFrame to the types of the schema and parse its dates. Columns
+    that already have the right type are left alone.
+    """
+    if schema is None:
+        return data
+    import pandas as pd
+    casts = {}
+    for column, dtype in schema.items():
+        if column not in data.columns:
+            continue
+        if dtype == DATETIME:
+            if not pd.api.types.is_datetime64_any_dtype(data[column]):
+                data = data.assign(**{column: pd.to_datetime(data[column])})
+        elif data[column].dtype != dtype:
+            casts[column] = dtype
+    return data.astype(casts) if casts else data
@@ -0,0 +1,117 @@
+""" Shares the inputs of parallel steps between worker processes. An input read by more than one
+step is parsed once in the parent and written uncompressed in the Arrow IPC format to a scratch
+folder in shared memory (/dev/shm when it exists). Workers memory map that file and build their
+DataFrames on the mapped pages so nothing is pickled to the workers and however many of them
+read an input there is about one copy of it in memory.
+
+Numeric columns built on the mapped pages are read-only. Copy an input before changing its
+values in place.
+"""
+from .memcache import _types
+
+import collections
+import os
+import pathlib
+import shutil
+import tempfile
+
+SHM_DIR = '/dev/shm'
+
+
+def _scratch_root():
+    if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        return SHM_DIR
+    return tempfile.gettempdir()  # still shared through the page cache
+
+
+def dump(data, filepath):
+    """ Write a DataFrame as an uncompressed arrow file. Returns False if arrow can't hold it
+    (ex. an object column of mixed types).
+    """
+    import pyarrow as pa
+    try:
+        table = pa.Table.from_pandas(data)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        return False
+    with pa.OSFile(str(filepath), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return True
+
+
+def load(filepath):
+    """ Memory map an arrow file written by dump into a DataFrame. Columns without nulls whose
+    type numpy shares with arrow are views on the mapped pages rather than copies.
+    """
+    import pyarrow as pa
+    with pa.memory_map(str(filepath), 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def shareable(step, name):
+    """ True if a step reads its input name whole with pandas so it can use a shared copy. A
+    schema is passed in the read_options so a typed input is never shared.
+    """
+    options = step.options
+    return not (options.get('engine') or options.get('chunksize') or options.get('partition')
+        or options.get('read_options', {}).get(name))
+
+
+def step_files(step, files):
+    """ the shared files a step can use out of the files published so far
+    """
+    return {str(p): files[str(p)] for name, p in step.inputs.items()
+        if shareable(step, name) and files.get(str(p))}
+
+
+class SharedInputs(object):
+    """ Publishes the inputs of the steps of a build. Only whole DataFrame inputs read by two or
+    more steps with the default engine and no read_options, schema, chunksize or partition are
+    shared and only those steps use the shared copy, anything else is read by the worker as usual.
+    publish(step) is called in the parent before a step is submitted and files maps each published
+    input path to its arrow file (or None if it couldn't be shared).
+    """
+
+    def __init__(self, steps, parsers):
+        self._parsers = parsers
+        self._folder = None
+        counts = collections.Counter(str(p) for s in steps.values() for name, p in s.inputs.items()
+            if shareable(s, name))
+        self._candidates = {p for p, n in counts.items() if n > 1}
+        self.files = {}
+
+
+    def publish(self, step):
+        for name, p in step.inputs.items():
+            p = str(p)
+            if shareable(step, name) and p in self._candidates and p not in self.files:
+                print(f'Sharing {name} with the workers...')
+                self.files[p] = self._publish(p)
+
+
+    def _publish(self, filepath):
+        if self._folder is None:
+            self._folder = pathlib.Path(tempfile.mkdtemp(prefix='shared-inputs-', dir=_scratch_root()))
+        try:
+            data = self._parsers.lookup(filepath).read(filepath)
+        except Exception:  # let the worker read it and fail the step
+            return None
+        if not isinstance(data, _types('pandas', 'DataFrame')):
+            return None
+        target = self._folder / f'{len(self.files)}.arrow'
+        return str(target) if dump(data, target) else None
+
+
+    def close(self):
+        if self._folder is not None:
+            shutil.rmtree(self._folder, ignore_errors=True)
+            self._folder = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()